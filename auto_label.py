@@ -0,0 +1,47 @@
+import numpy as np
+from gaussian_model import hsv_features
+
+# Joint sticker labeling
+#
+# Instead of classifying every sticker on its own against a calibrated
+# color model, the HSV statistics of all 54 stickers of a scanned cube are
+# labeled together: they are clustered into six groups seeded by the six
+# centers, and every round assigns stickers to groups by a minimum-cost
+# assignment that gives each group exactly nine stickers. Colors are only
+# compared with each other within one cube, so no calibration is needed and
+# a lighting change between faces shifts all colors alike. Value is
+# weighted down against the hue/saturation plane because it varies most
+# with lighting.
+
+VALUE_WEIGHT = 0.5
+CENTER_INDICES = np.arange(4, 54, 9)
+
+def label_stickers(hsv_values, value_weight=VALUE_WEIGHT, max_iterations=10):
+    """Face index (0-5) of each of 54 stickers, given their HSV values in facelet order
+
+    The result has nine stickers of every face and each center labeled with
+    its own face, as in a cube_model facelet state.
+    """
+    # SciPy comes with scikit-learn; only this mode needs it
+    from scipy.optimize import linear_sum_assignment
+    features = hsv_features(hsv_values)
+    if len(features) != 54:
+        raise ValueError(f"Expected 54 sticker values, got {len(features)}")
+    features[:, 2] *= value_weight
+    centroids = features[CENTER_INDICES]
+    labels = None
+    for _ in range(max_iterations):
+        cost = ((features[:, np.newaxis, :] - centroids[np.newaxis]) ** 2).sum(axis=2)
+        # Centers define their face: any other label costs more than all of the rest
+        pinned = cost[CENTER_INDICES]
+        pinned[:] = cost.sum() + 1
+        pinned[np.arange(6), np.arange(6)] = 0
+        cost[CENTER_INDICES] = pinned
+        # Nine slots per face; slot j belongs to face j // 9
+        _, slots = linear_sum_assignment(np.repeat(cost, 9, axis=1))
+        new_labels = slots // 9
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        centroids = np.array([features[labels == k].mean(axis=0) for k in range(6)])
+    return labels.astype(np.uint8)
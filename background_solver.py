@@ -0,0 +1,244 @@
+import multiprocessing
+import threading
+from concurrent.futures import CancelledError
+import move_algebra
+
+# Background solving
+#
+# Searches run in a worker process, so a long search holds neither the Tk
+# loop nor the video threads (a thread would compete with them for the
+# GIL). submit() returns a SolveFuture at once; the two-phase search keeps
+# shortening its solution until its time budget is spent and every
+# improvement is published to the future, so callers can show a first
+# answer right away and a better one as it comes. Submitting a new state
+# or cancelling stops the search in flight: the two-phase search checks a
+# shared job counter between phase 2 searches, other modes cannot stop
+# midway and their worker is restarted instead. The worker is daemonic and
+# cannot start a process pool, so the optimal search runs in the worker
+# itself. Given a cache_path, the worker looks solutions up in (and adds
+# them to) that solution cache.
+
+# Two-phase searches stop early once a solution this short is found
+TARGET_LENGTH = 19
+TIMEOUT = 10.0
+
+class _JobCancelled:
+    """Whether a job has been cancelled, shared between the processes"""
+
+    def __init__(self, cancelled_through, job):
+        self.cancelled_through = cancelled_through
+        self.job = job
+
+    def is_set(self):
+        return self.cancelled_through.value >= self.job
+
+def _worker_main(requests, results, cancelled_through, mode, tables_path, cache_path):
+    """Worker process: solve requested states, reporting every improvement"""
+    import two_phase
+    from color_trainer import CubeSolver
+    cache = None
+    if cache_path is not None:
+        from solution_cache import SolutionCache
+        cache = SolutionCache(cache_path)
+    solver = CubeSolver(mode, cache=cache)
+    if mode == 'optimal':
+        import optimal_solver
+        solver.optimal_solver = optimal_solver.OptimalSolver(workers=0)
+    two_phase_solver = two_phase.TwoPhaseSolver(tables_path) if mode == 'two_phase' else None
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        job, state, target_length, timeout = request
+        if cancelled_through.value >= job:
+            results.put((job, 'cancelled', None))
+            continue
+        try:
+            solution = None
+            if solver.is_solved(state):
+                solution = []
+            elif cache is not None:
+                solution = cache.get(state, mode)
+            if solution is None and two_phase_solver is not None:
+                solution = two_phase_solver.solve(
+                    state, target_length=target_length, timeout=timeout,
+                    on_solution=lambda moves: results.put((job, 'solution', moves)),
+                    cancel=_JobCancelled(cancelled_through, job))
+                if cache is not None and solution is not None and cancelled_through.value < job:
+                    cache.put(state, solution, mode)
+            elif solution is None:
+                solution = solver.find_solution(state)
+        except Exception as e:
+            results.put((job, 'error', e))
+            continue
+        if solution is None or cancelled_through.value >= job:
+            results.put((job, 'cancelled', solution))
+        else:
+            results.put((job, 'done', solution))
+    if cache is not None:
+        cache.close()
+
+class SolveFuture:
+    """Progress and outcome of one background solve
+
+    best is the shortest solution found so far (move names, None until the
+    first one), available while the search still runs.
+    """
+
+    def __init__(self, solver, job):
+        self._solver = solver
+        self.job = job
+        self.best = None
+        self.updates = 0
+        self._state = 'running'
+        self._exception = None
+        self._condition = threading.Condition()
+
+    def _publish(self, kind, value):
+        with self._condition:
+            if self._state != 'running':
+                return
+            if kind == 'error':
+                self._exception = value
+                self._state = 'failed'
+            elif kind == 'cancelled':
+                self._state = 'cancelled'
+            else:
+                # The final report repeats the last improvement
+                if value is not None and (kind == 'solution' or self.best is None):
+                    self.best = move_algebra.simplify(value)
+                    self.updates += 1
+                if kind == 'done':
+                    self._state = 'done'
+            self._condition.notify_all()
+
+    def cancel(self):
+        """Stop the search; returns False if it had already finished"""
+        with self._condition:
+            if self._state != 'running':
+                return self._state == 'cancelled'
+        self._solver._cancel(self.job)
+        self._publish('cancelled', None)
+        return True
+
+    def cancelled(self):
+        return self._state == 'cancelled'
+
+    def running(self):
+        return self._state == 'running'
+
+    def done(self):
+        return self._state != 'running'
+
+    def result(self, timeout=None):
+        """Final solution; raises the search's error, CancelledError or TimeoutError"""
+        with self._condition:
+            if not self._condition.wait_for(self.done, timeout):
+                raise TimeoutError("Solve still running")
+            if self._state == 'cancelled':
+                raise CancelledError()
+            if self._exception is not None:
+                raise self._exception
+            return self.best
+
+    def exception(self, timeout=None):
+        with self._condition:
+            self._condition.wait_for(self.done, timeout)
+            return self._exception
+
+class BackgroundSolver:
+    def __init__(self, mode='two_phase', target_length=TARGET_LENGTH, timeout=TIMEOUT,
+                 tables_path=None, cache_path=None):
+        import two_phase
+        self.mode = mode
+        self.target_length = target_length
+        self.timeout = timeout
+        self.tables_path = tables_path or two_phase.TABLES_PATH
+        self.cache_path = cache_path
+        # Spawned rather than forked: the parent runs Tk and several threads
+        self._context = multiprocessing.get_context('spawn')
+        self._cancelled_through = self._context.RawValue('q', 0)
+        self._futures = {}
+        self._current = None
+        self._next_job = 1
+        self._lock = threading.Lock()
+        self._process = None
+        self._listener = None
+        self._start_worker()
+
+    def _start_worker(self):
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._process = self._context.Process(
+            target=_worker_main, name='solver',
+            args=(self._requests, self._results, self._cancelled_through,
+                  self.mode, self.tables_path, self.cache_path),
+            daemon=True)
+        self._process.start()
+        self._listener = threading.Thread(target=self._listen, args=(self._results,),
+                                          name='solve-results', daemon=True)
+        self._listener.start()
+
+    def _listen(self, results):
+        """Hand the worker's reports to their futures"""
+        while True:
+            message = results.get()
+            if message is None:
+                break
+            job, kind, value = message
+            with self._lock:
+                future = self._futures.get(job)
+                if kind != 'solution':
+                    self._futures.pop(job, None)
+            if future is not None:
+                future._publish(kind, value)
+
+    def submit(self, state):
+        """Start solving a facelet state, cancelling the solve in flight"""
+        with self._lock:
+            previous = self._current
+        if previous is not None:
+            previous.cancel()
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._start_worker()
+            job = self._next_job
+            self._next_job += 1
+            future = SolveFuture(self, job)
+            self._futures[job] = future
+            self._current = future
+            self._requests.put((job, state, self.target_length, self.timeout))
+        return future
+
+    def _cancel(self, job):
+        with self._lock:
+            self._cancelled_through.value = max(self._cancelled_through.value, job)
+            self._futures.pop(job, None)
+            if self._current is not None and self._current.job == job:
+                self._current = None
+            if self.mode != 'two_phase' and self._process is not None:
+                # Only the two-phase search watches the job counter
+                self._stop_worker(terminate=True)
+
+    def _stop_worker(self, terminate=False):
+        if terminate:
+            self._process.terminate()
+        else:
+            self._requests.put(None)
+        self._process.join(timeout=1.0)
+        self._results.put(None)
+        self._process = None
+
+    def close(self):
+        """Cancel the solve in flight and stop the worker"""
+        with self._lock:
+            current = self._current
+        if current is not None:
+            current.cancel()
+        with self._lock:
+            if self._process is not None:
+                self._stop_worker()
+            listener, self._listener = self._listener, None
+        # Let the listener drain its queue before the interpreter tears it down
+        if listener is not None:
+            listener.join(timeout=1.0)
@@ -0,0 +1,212 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import cube_model
+import frame_sources
+
+# Headless batch scanning
+#
+# Recorded scans (video files, frame_sources recordings or directories of
+# images) are streamed through a chain of generators: frames from the
+# source, the face colors a CubeProcessor sees in every frame, and
+# auto-capture of faces that stay unchanged for a number of frames. Six captured faces make a cube state,
+# which is optionally solved. Files are spread over a process pool and the
+# results are written as JSON lines while the files finish, so no more than
+# one frame per worker is ever held in memory.
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v',
+                    frame_sources.RECORDING_EXTENSION)
+
+def iter_frames(source, step=1, max_frames=None):
+    """Yield (index, frame) from a frame source, keeping every step-th frame"""
+    index = 0
+    try:
+        while max_frames is None or index < max_frames:
+            if index % step and hasattr(source, 'grab'):
+                # Skipped video frames are not decoded
+                if not source.grab():
+                    return
+            else:
+                ret, frame = source.read()
+                if not ret:
+                    return
+                if index % step == 0:
+                    yield index, frame
+            index += 1
+    finally:
+        source.release()
+
+def iter_face_colors(frames, processor):
+    """Yield (index, face colors) for every frame, without drawing an overlay"""
+    for index, frame in frames:
+        processor.analyze_frame(frame)
+        yield index, processor.face_colors
+
+class FaceCapture:
+    """Auto-capture of faces that stay unchanged for stable_frames frames
+
+    A face is only captured if its center color has not been captured yet,
+    so holding one face still never captures it twice. Faces are expected
+    in the solver view's U, R, F, D, L, B scanning order.
+    """
+
+    def __init__(self, stable_frames=10):
+        self.stable_frames = stable_frames
+        self.faces = []
+        self._candidate = None
+        self._count = 0
+
+    @property
+    def complete(self):
+        return len(self.faces) == 6
+
+    def update(self, face_colors):
+        """Feed one frame's face colors; returns the face if it was just captured"""
+        if len(face_colors) != 3 or any(len(row) != 3 for row in face_colors):
+            self._candidate = None
+            return None
+        key = tuple(tuple(row) for row in face_colors)
+        if key == self._candidate:
+            self._count += 1
+        else:
+            self._candidate, self._count = key, 1
+        if self._count != self.stable_frames or self.complete:
+            return None
+        if any(face[1][1] == key[1][1] for face in self.faces):
+            return None
+        face = [list(row) for row in key]
+        self.faces.append(face)
+        return face
+
+def iter_captures(observations, capture):
+    """Yield (index, face number, face) for every auto-captured face"""
+    for index, face_colors in observations:
+        face = capture.update(face_colors)
+        if face is not None:
+            yield index, len(capture.faces), face
+            if capture.complete:
+                return
+
+def expand_inputs(paths):
+    """Turn command line paths into scan sources
+
+    A directory of images is one source; any other directory contributes
+    the video files it contains. '-' reads more paths from stdin.
+    """
+    for path in paths:
+        if path == '-':
+            yield from expand_inputs(line.strip() for line in sys.stdin if line.strip())
+        elif os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            if any(name.lower().endswith(frame_sources.IMAGE_EXTENSIONS) for name in names):
+                yield path
+            else:
+                yield from (os.path.join(path, name) for name in names
+                            if name.lower().endswith(VIDEO_EXTENSIONS))
+        else:
+            yield path
+
+# Worker state, created once per pool process
+_processor = None
+_options = None
+
+def _init_worker(options):
+    global _processor, _options
+    from cube_processor import CubeProcessor
+    _options = options
+    _processor = CubeProcessor(incremental=options['incremental'],
+                               detect_cube=options['detect'], pooled=True)
+    if options['model']:
+        trainer = _processor.color_trainer
+        trainer.model_path = options['model']
+        trainer.lut_path = os.path.splitext(trainer.model_path)[0] + '_lut.npz'
+        trainer.color_lut = None
+        trainer.load_model()
+
+def scan_file(path):
+    """Scan one recording; returns its JSONL records"""
+    start = time.perf_counter()
+    records = []
+    result = {'type': 'result', 'file': path}
+    try:
+        # Recordings replay as fast as they are processed
+        source = frame_sources.open_source(path, pacing='fast')
+        if not source.isOpened():
+            raise ValueError("Could not open source")
+        _processor.cell_tracker.reset()
+        _processor.sticker_tracker.reset()
+        _processor.cube_detector.reset()
+        capture = FaceCapture(_options['stable_frames'])
+        frames = iter_frames(source, _options['step'], _options['max_frames'])
+        observations = iter_face_colors(frames, _processor)
+        if _options['emit_frames']:
+            observations = _record_frames(observations, path, records)
+        for index, number, face in iter_captures(observations, capture):
+            records.append({'type': 'capture', 'file': path, 'frame': index,
+                            'face': number, 'colors': face})
+        result['faces_captured'] = len(capture.faces)
+        if capture.complete:
+            state = cube_model.facelets_from_faces(capture.faces)
+            result['state'] = ''.join(cube_model.FACES[v] for v in state)
+            if _options['solve']:
+                solution = _processor.color_trainer.solver.find_solution(state)
+                result['solution'] = list(solution)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    records.append(result)
+    return records
+
+def _record_frames(observations, path, records):
+    for index, face_colors in observations:
+        records.append({'type': 'frame', 'file': path, 'frame': index, 'colors': face_colors})
+        yield index, face_colors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Scan recorded cube videos and image directories into cube states")
+    parser.add_argument('inputs', nargs='+',
+                        help="video files, .cfr recordings, image directories, directories of "
+                             "videos or - for stdin")
+    parser.add_argument('-o', '--output', help="JSONL output file (default: stdout)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--step', type=int, default=1, help="process every n-th frame")
+    parser.add_argument('--max-frames', type=int, help="stop reading a source after n frames")
+    parser.add_argument('--stable-frames', type=int, default=10,
+                        help="processed frames a face must stay unchanged to be captured")
+    parser.add_argument('--detect', action='store_true', help="locate the cube in the frame")
+    parser.add_argument('--no-incremental', dest='incremental', action='store_false',
+                        help="reclassify every cell of every frame")
+    parser.add_argument('--model', help="color model .npz or KNN pickle (default: cube_color_model.npz)")
+    parser.add_argument('--solve', action='store_true', help="solve every complete cube")
+    parser.add_argument('--frames', dest='emit_frames', action='store_true',
+                        help="also write the face colors of every processed frame")
+    args = parser.parse_args(argv)
+    options = {name: getattr(args, name) for name in (
+        'step', 'max_frames', 'stable_frames', 'detect', 'incremental', 'model', 'solve',
+        'emit_frames')}
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    start = time.perf_counter()
+    scanned = complete = 0
+    try:
+        with multiprocessing.Pool(max(1, args.workers), _init_worker, (options,)) as pool:
+            for records in pool.imap_unordered(scan_file, expand_inputs(args.inputs)):
+                for record in records:
+                    output.write(json.dumps(record) + '\n')
+                output.flush()
+                scanned += 1
+                complete += 'state' in records[-1]
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"Scanned {scanned} sources ({complete} complete cubes) in {elapsed:.1f} s",
+          file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
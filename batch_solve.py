@@ -0,0 +1,147 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import numpy as np
+import cube_model
+import two_phase
+
+# Bulk solving
+#
+# Reads cube states (54-letter facelet strings in U R F D L B order, as
+# written by batch_scan.py) or scramble move strings, one per line, and
+# solves them on a process pool. Every worker maps the two-phase tables
+# once when it starts, inputs are read lazily with a bounded number in
+# flight, and results stream out as JSON lines in input or completion order.
+
+def parse_state(text):
+    """Facelet state from a facelet string or a scramble applied to a solved cube"""
+    text = text.strip()
+    if len(text) == 54 and set(text) <= set(cube_model.FACES):
+        return np.array([cube_model.FACES.index(c) for c in text], dtype=np.uint8)
+    try:
+        moves = cube_model.parse_moves(text)
+    except KeyError as e:
+        raise ValueError(f"Unknown move {e.args[0]}") from None
+    return cube_model.apply_moves(cube_model.SOLVED_STATE, moves)
+
+def random_scrambles(count, length=25, seed=None):
+    """Scramble strings of random moves, no face turned twice in a row"""
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        moves = []
+        while len(moves) < length:
+            move = int(rng.integers(len(cube_model.MOVE_NAMES)))
+            if not moves or move // 3 != moves[-1] // 3:
+                moves.append(move)
+        yield ' '.join(cube_model.MOVE_NAMES[m] for m in moves)
+
+# Worker state, created once per pool process
+_solver = None
+_options = None
+
+def _init_worker(options):
+    global _solver, _options
+    _options = options
+    _solver = two_phase.TwoPhaseSolver(options['tables'])
+
+def solve_line(task):
+    """Solve one numbered input line; returns its result record"""
+    index, text = task
+    record = {'index': index, 'input': text}
+    start = time.perf_counter()
+    try:
+        state = parse_state(text)
+        if cube_model.is_solved(state):
+            solution = []
+            _solver.nodes = 0
+        else:
+            solution = _solver.solve(state, max_length=_options['max_length'],
+                                     timeout=_options['timeout'])
+        record['solution'] = ' '.join(solution)
+        record['length'] = len(solution)
+        record['nodes'] = _solver.nodes
+    except ValueError as e:
+        record['error'] = str(e)
+    record['seconds'] = time.perf_counter() - start
+    record['worker'] = os.getpid()
+    return record
+
+def _bounded(tasks, slots, stop):
+    """Hand out tasks only while a slot is free, so input is read lazily"""
+    for task in tasks:
+        while not slots.acquire(timeout=0.1):
+            if stop.is_set():
+                return
+        yield task
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve cube states in bulk")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="file of facelet strings or scrambles, one per line (default: stdin)")
+    parser.add_argument('-o', '--output', help="JSONL output file (default: stdout)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--ordered', action='store_true',
+                        help="write results in input order instead of completion order")
+    parser.add_argument('--max-length', type=int, default=22)
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help="seconds to keep shortening a solution above max length")
+    parser.add_argument('--chunk-size', type=int, default=4)
+    parser.add_argument('--tables', default=two_phase.TABLES_PATH)
+    parser.add_argument('--random', type=int, metavar='N',
+                        help="solve N random scrambles instead of reading input")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    # Build the tables once up front rather than in every worker
+    two_phase.load_tables(args.tables)
+    options = {'tables': args.tables, 'max_length': args.max_length, 'timeout': args.timeout}
+
+    if args.random is not None:
+        lines = random_scrambles(args.random, seed=args.seed)
+        input_file = None
+    else:
+        input_file = sys.stdin if args.input == '-' else open(args.input)
+        lines = (line.strip() for line in input_file)
+    tasks = ((index, line) for index, line in enumerate(lines) if line and line[0] != '#')
+    workers = max(1, args.workers)
+    slots = threading.Semaphore(workers * args.chunk_size * 4)
+    stop = threading.Event()
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    start = time.perf_counter()
+    solved = failed = moves = 0
+    per_worker = {}
+    try:
+        with multiprocessing.Pool(workers, _init_worker, (options,)) as pool:
+            imap = pool.imap if args.ordered else pool.imap_unordered
+            try:
+                for record in imap(solve_line, _bounded(tasks, slots, stop), args.chunk_size):
+                    slots.release()
+                    output.write(json.dumps(record) + '\n')
+                    if 'error' in record:
+                        failed += 1
+                    else:
+                        solved += 1
+                        moves += record['length']
+                    per_worker[record['worker']] = per_worker.get(record['worker'], 0) + 1
+            finally:
+                stop.set()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if input_file not in (None, sys.stdin):
+            input_file.close()
+
+    elapsed = time.perf_counter() - start
+    rate = solved / elapsed if elapsed > 0 else 0.0
+    print(f"Solved {solved} states ({failed} failed) in {elapsed:.2f} s: {rate:.1f} solves/s, "
+          f"mean length {moves / solved if solved else 0:.2f}, "
+          f"{workers} workers {sorted(per_worker.values(), reverse=True)}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import cube_model
+from color_trainer import MODEL_TYPES, CubeColorTrainer, CubeSolver
+from cube_processor import CubeProcessor
+from frame_sources import STICKER_BGR, SyntheticSource
+
+# Headless benchmarks
+#
+# Runs without a display or camera: frames are rendered synthetic cube
+# faces, the color model is trained on synthetic sticker samples and the
+# solver gets seeded random scrambles. Every benchmark reports latency
+# percentiles, throughput, the peak traced Python/numpy memory and the
+# memory allocated per call on top of what was already held; results
+# are written as JSON so runs of different commits can be compared with
+# --compare.
+
+RESOLUTIONS = ((320, 240), (640, 480), (1280, 720), (1920, 1080))
+PROCESSOR_CONFIGS = {
+    'batched': {},
+    'kmeans': {'extraction_mode': 'kmeans'},
+    'pooled': {'pooled': True},
+    'incremental': {'incremental': True},
+    'detect': {'detect_cube': True},
+}
+SAMPLE_COUNTS = (10, 100, 1000)
+SCRAMBLE_DEPTHS = (5, 10, 15, 20, 25)
+# Scrambles within reach of the bidirectional search
+SHORT_SCRAMBLE_DEPTHS = (4, 6, 8, 10)
+SUITES = ('frame', 'predict', 'train', 'solve', 'short_solve')
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds and throughput of a list of seconds"""
+    latencies = np.asarray(latencies)
+    p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99]) * 1000
+    return {
+        'n': len(latencies),
+        'mean_ms': latencies.mean() * 1000,
+        'p50_ms': p50, 'p90_ms': p90, 'p95_ms': p95, 'p99_ms': p99,
+        'max_ms': latencies.max() * 1000,
+        'ops_per_sec': len(latencies) / latencies.sum() if latencies.sum() > 0 else 0.0,
+    }
+
+def peak_memory(fn, calls):
+    """Peak traced allocation and mean allocation per call, in KiB, over calls calls
+
+    The allocation of a call is its peak above the memory traced before it,
+    so buffers reused from earlier calls do not count. Runs separately from
+    the timed loop since tracing slows allocations.
+    """
+    tracemalloc.start()
+    try:
+        peak = 0
+        per_call = []
+        for i in range(calls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(i)
+            call_peak = tracemalloc.get_traced_memory()[1]
+            peak = max(peak, call_peak)
+            per_call.append(call_peak - before)
+        return peak / 1024, sum(per_call) / len(per_call) / 1024
+    finally:
+        tracemalloc.stop()
+
+def run_benchmark(suite, name, params, fn, iterations, warmup=3, memory_calls=3):
+    """Time fn(i) for every iteration i and return one result record"""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    result = {'suite': suite, 'name': name, 'params': params}
+    result.update(summarize(latencies))
+    result['peak_kib'], result['alloc_kib_per_call'] = peak_memory(fn, memory_calls)
+    print(f"{suite:8} {name:32} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+          f"{result['ops_per_sec']:10.1f}/s  peak {result['peak_kib']:9.0f} KiB  "
+          f"alloc {result['alloc_kib_per_call']:9.1f} KiB/call", flush=True)
+    return result
+
+def synthetic_samples(samples_per_color, rng, noise=12):
+    """HSV training samples of the synthetic sticker colors under pixel noise"""
+    samples = {}
+    for color, bgr in STICKER_BGR.items():
+        pixels = np.clip(np.array(bgr) + rng.normal(0, noise, (samples_per_color, 3)), 0, 255)
+        hsv = cv2.cvtColor(pixels.astype(np.uint8).reshape(-1, 1, 3), cv2.COLOR_BGR2HSV)
+        samples[color] = hsv.reshape(-1, 3).astype(float)
+    return samples
+
+def make_trainer(samples_per_color, workdir, rng, compile_lut=True, model_type='gaussian'):
+    """A trainer fitted on synthetic samples, saving its files under workdir"""
+    trainer = CubeColorTrainer(model_type)
+    extension = '.npz' if model_type == 'gaussian' else '.pkl'
+    trainer.model_path = os.path.join(workdir, f'{model_type}_{samples_per_color}{extension}')
+    trainer.lut_path = os.path.splitext(trainer.model_path)[0] + '_lut.npz'
+    for color, samples in synthetic_samples(samples_per_color, rng).items():
+        trainer.add_training_samples(color, list(samples))
+    trainer.train_model(compile_lut=compile_lut)
+    return trainer
+
+def bench_frames(iterations, workdir, rng):
+    trainer = make_trainer(100, workdir, rng)
+    results = []
+    for width, height in RESOLUTIONS:
+        source = SyntheticSource(seed=1, width=width, height=height, fps=None,
+                                 frames_per_face=iterations // 6 + 1)
+        full_frames = [source.read()[1] for _ in range(iterations)]
+        # Detection needs square stickers, not a face stretched over the frame
+        source = SyntheticSource(seed=1, width=width, height=height, fps=None,
+                                 frames_per_face=iterations // 6 + 1, side=height * 2 // 3)
+        square_frames = [source.read()[1] for _ in range(iterations)]
+        for config, options in PROCESSOR_CONFIGS.items():
+            frames = square_frames if options.get('detect_cube') else full_frames
+            processor = CubeProcessor(**options)
+            processor.color_trainer = trainer
+            # Per-cell k-means takes seconds per large frame
+            runs = max(5, iterations // 10) if config == 'kmeans' else iterations
+            results.append(run_benchmark(
+                'frame', f'process_frame/{config}/{width}x{height}',
+                {'config': config, 'width': width, 'height': height},
+                lambda i: processor.process_frame(frames[i % len(frames)]), runs))
+    return results
+
+def bench_predict(iterations, workdir, rng):
+    results = []
+    queries = np.concatenate(list(synthetic_samples(iterations // 6 + 1, rng).values()))
+    rng.shuffle(queries)
+    for count in SAMPLE_COUNTS:
+        for model_type in MODEL_TYPES:
+            trainer = make_trainer(count, workdir, rng, model_type=model_type)
+            lut = trainer.color_lut
+            # The lookup table is timed once, compiled from the default model
+            backends = (model_type, 'lut') if model_type == 'gaussian' else (model_type,)
+            for backend in backends:
+                trainer.color_lut = lut if backend == 'lut' else None
+                params = {'samples_per_color': count, 'backend': backend}
+                results.append(run_benchmark(
+                    'predict', f'predict_color/{backend}/{count}', params,
+                    lambda i: trainer.predict_color(queries[i % len(queries)]), iterations))
+                results.append(run_benchmark(
+                    'predict', f'predict_colors_x9/{backend}/{count}', params,
+                    lambda i: trainer.predict_colors(queries[(i * 9) % (len(queries) - 9):][:9]),
+                    iterations))
+    return results
+
+def bench_train(iterations, workdir, rng):
+    results = []
+    for count in SAMPLE_COUNTS:
+        for model_type in MODEL_TYPES:
+            trainer = make_trainer(count, workdir, rng, compile_lut=False, model_type=model_type)
+            params = {'samples_per_color': count, 'model_type': model_type}
+            repeats = max(3, iterations // 20)
+            results.append(run_benchmark(
+                'train', f'train_model/{model_type}/{count}', params,
+                lambda i: trainer.train_model(), repeats, warmup=1, memory_calls=1))
+            results.append(run_benchmark(
+                'train', f'train_model+lut/{model_type}/{count}', params,
+                lambda i: trainer.train_model(compile_lut=True), max(2, repeats // 4),
+                warmup=1, memory_calls=1))
+            results.append(run_benchmark(
+                'train', f'load_model/{model_type}/{count}', params,
+                lambda i: trainer.load_model(), repeats, warmup=1, memory_calls=1))
+    return results
+
+def random_scramble(depth, seed):
+    """State after depth random moves that never turn the same face twice in a row"""
+    rng = np.random.default_rng(seed)
+    moves = []
+    while len(moves) < depth:
+        move = int(rng.integers(len(cube_model.MOVE_NAMES)))
+        if not moves or move // 3 != moves[-1] // 3:
+            moves.append(move)
+    return cube_model.apply_moves(cube_model.SOLVED_STATE, moves)
+
+def bench_solve(iterations, workdir, rng, mode='two_phase', depths=SCRAMBLE_DEPTHS):
+    solver = CubeSolver(mode)
+    try:
+        start = time.perf_counter()
+        # The first solve loads (or builds) the search tables
+        solver.find_solution(random_scramble(1, 0))
+        results = [{'suite': 'solve', 'name': f'load_tables/{mode}', 'params': {'mode': mode},
+                    'n': 1, 'seconds': time.perf_counter() - start}]
+        print(f"solve    load_tables/{mode:20} {results[0]['seconds']:.3f} s", flush=True)
+        scrambles = max(5, iterations // 10)
+        for depth in depths:
+            states = [random_scramble(depth, seed) for seed in range(scrambles)]
+            lengths = []
+
+            def solve(i):
+                solution = solver.find_solution(states[i % len(states)])
+                lengths.append(len(solution))
+
+            result = run_benchmark('solve', f'find_solution/{mode}/depth{depth}',
+                                   {'mode': mode, 'depth': depth}, solve, scrambles,
+                                   warmup=0, memory_calls=1)
+            result['mean_solution_length'] = float(np.mean(lengths))
+            if solver.bidirectional_solver is not None:
+                # Figures of the last solve
+                result['search_states'] = solver.bidirectional_solver.states
+                result['search_peak_kib'] = solver.bidirectional_solver.peak_bytes / 1024
+            results.append(result)
+    finally:
+        solver.close()
+    return results
+
+def bench_short_solve(iterations, workdir, rng):
+    results = []
+    for mode in ('two_phase', 'bidirectional'):
+        results.extend(bench_solve(iterations, workdir, rng, mode, SHORT_SCRAMBLE_DEPTHS))
+    return results
+
+BENCHMARKS = {'frame': bench_frames, 'predict': bench_predict,
+              'train': bench_train, 'solve': bench_solve, 'short_solve': bench_short_solve}
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def compare(results, baseline_path):
+    """Print the p50 latency change of every benchmark present in both runs"""
+    with open(baseline_path) as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get(result['name'])
+        if old is None or 'p50_ms' not in result or 'p50_ms' not in old:
+            continue
+        change = (result['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0.0
+        print(f"{result['name']:42} {old['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms "
+              f"({change:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Cubifier benchmarks")
+    parser.add_argument('--suite', action='append', choices=SUITES,
+                        help="suite to run (repeatable, default: all)")
+    parser.add_argument('--iterations', type=int, default=100,
+                        help="timed iterations per benchmark")
+    parser.add_argument('--quick', action='store_true', help="20 iterations per benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE_JSON',
+                        help="previous results file to compare against")
+    args = parser.parse_args(argv)
+    iterations = 20 if args.quick else args.iterations
+    rng = np.random.default_rng(args.seed)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for suite in args.suite or SUITES:
+            results.extend(BENCHMARKS[suite](iterations, workdir, rng))
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'iterations': iterations,
+                   'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
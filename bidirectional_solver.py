@@ -0,0 +1,207 @@
+import time
+import numpy as np
+import cube_model
+import move_algebra
+
+# Bidirectional solver
+#
+# Breadth-first search from the scrambled state and from the solved state at
+# once, always growing the side with the smaller frontier by one layer,
+# until a layer of one side meets the layers of the other. Whole layers are
+# expanded with NumPy: states are (cp, co, ep, eo) cubie arrays, children
+# skip moves that make a non-canonical sequence, and every state is packed
+# into a 64-bit key (corner permutation and twist, and the low 37 bits of
+# the edge permutation and flip) plus the remaining 3 edge bits. Layers are
+# kept as keys sorted for searchsorted, with parent index and last move to
+# rebuild the path, 18 bytes per state, and the frontier also keeps its
+# cubies. Solutions are optimal. A solution of n moves takes roughly
+# 2 * 13.35^(n/2) states: up to 10 moves take under a second, 11 moves
+# several seconds and about half a gigabyte; max_states bounds the memory.
+
+# Face turns as cubie gathers: state * move gathers the state's pieces
+MOVE_CP, MOVE_CO, MOVE_EP, MOVE_EO = (np.array([cubies[k] for cubies in cube_model.MOVE_CUBIES],
+                                               dtype=np.uint8) for k in range(4))
+# ALLOWED[last move, move]: whether move may follow last move (NO_MOVE at the start)
+ALLOWED = np.zeros((move_algebra.N_MOVES + 1, move_algebra.N_MOVES), dtype=bool)
+for _last, _moves in enumerate(move_algebra.ALLOWED_AFTER):
+    ALLOWED[_last, _moves] = True
+
+EDGE_LOW_BITS = 37
+MAX_STATES = 20_000_000
+
+# Set bits of every 12-bit mask
+_POPCOUNT = np.array([bin(i).count('1') for i in range(1 << 12)], dtype=np.int32)
+
+def _rank(perm):
+    """Lexicographic rank of every row of a permutation array
+
+    Pieces already seen are kept as a bit mask, so the number of smaller
+    pieces still to come is the value minus a popcount. 12! fits in int32.
+    """
+    n = perm.shape[1]
+    perm = np.ascontiguousarray(perm.T, dtype=np.int32)
+    rank = np.zeros(perm.shape[1], dtype=np.int32)
+    seen = np.zeros_like(rank)
+    bit = np.empty_like(rank)
+    for i in range(n - 1):
+        np.left_shift(1, perm[i], out=bit)
+        rank *= n - i
+        rank += perm[i]
+        rank -= _POPCOUNT.take(seen & (bit - 1))
+        seen |= bit
+    return rank
+
+_TWIST_WEIGHTS = 3 ** np.arange(6, -1, -1, dtype=np.int64)
+_FLIP_WEIGHTS = 2 ** np.arange(10, -1, -1, dtype=np.int64)
+
+def encode(cp, co, ep, eo):
+    """(key, extra) packing of cubie arrays; together they identify a state exactly"""
+    corners = _rank(cp).astype(np.int64) * 2187 + co[:, :7] @ _TWIST_WEIGHTS
+    edges = _rank(ep).astype(np.int64) * 2048 + eo[:, :11] @ _FLIP_WEIGHTS
+    key = (corners.astype(np.uint64) << np.uint64(EDGE_LOW_BITS)) | (
+        edges & ((1 << EDGE_LOW_BITS) - 1)).astype(np.uint64)
+    return key, (edges >> EDGE_LOW_BITS).astype(np.uint8)
+
+class _Layer:
+    """States at one distance from a search root"""
+
+    def __init__(self, key, extra, cubies, parent, move):
+        # Sorted by key
+        self.key = key
+        self.extra = extra
+        self.cubies = cubies
+        self.parent = parent
+        self.move = move
+
+    @classmethod
+    def root(cls, cubies):
+        cubies = tuple(np.array([part], dtype=np.uint8) for part in cubies)
+        return cls(*encode(*cubies), cubies, np.array([-1]),
+                   np.array([move_algebra.NO_MOVE], dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.key)
+
+    def find(self, key, extra):
+        """Index of each (key, extra) in this layer, -1 where absent"""
+        index = np.searchsorted(self.key, key)
+        found = np.full(len(key), -1, dtype=np.int64)
+        inside = index < len(self.key)
+        hit = np.zeros(len(key), dtype=bool)
+        hit[inside] = self.key[index[inside]] == key[inside]
+        exact = hit.copy()
+        exact[hit] = self.extra[index[hit]] == extra[hit]
+        found[exact] = index[exact]
+        # Keys shared by several states: look through the whole run
+        for i in np.flatnonzero(hit & ~exact):
+            for j in range(index[i], np.searchsorted(self.key, key[i], side='right')):
+                if self.extra[j] == extra[i]:
+                    found[i] = j
+                    break
+        return found
+
+    @property
+    def nbytes(self):
+        arrays = (self.key, self.extra, self.parent, self.move) + (self.cubies or ())
+        return sum(array.nbytes for array in arrays)
+
+class BidirectionalSolver:
+    def __init__(self, max_states=MAX_STATES):
+        self.max_states = max_states
+        # Figures of the last solve
+        self.states = 0
+        self.peak_bytes = 0
+        self.seconds = 0.0
+
+    def solve(self, state, max_length=14):
+        """Return a shortest solution as a list of move names, or None past max_length
+
+        Raises ValueError for states that cannot be solved and MemoryError
+        when the search would hold more than max_states states.
+        """
+        start = time.perf_counter()
+        cubies = cube_model.to_cubies(state)
+        sides = [[_Layer.root(cubies)],
+                 [_Layer.root(cube_model.to_cubies(cube_model.SOLVED_STATE))]]
+        self.states = 2
+        self.peak_bytes = 0
+        try:
+            meeting = self._meet(0, sides[0][0], sides[1])
+            while meeting is None:
+                if len(sides[0]) + len(sides[1]) - 2 >= max_length:
+                    return None
+                # Grow the side whose frontier is smaller
+                side = 0 if len(sides[0][-1]) <= len(sides[1][-1]) else 1
+                layer = self._expand(sides[side])
+                sides[side].append(layer)
+                self.states += len(layer)
+                self.peak_bytes = max(self.peak_bytes,
+                                      sum(layer.nbytes for layers in sides for layer in layers))
+                meeting = self._meet(len(sides[side]) - 1, layer, sides[1 - side])
+                if meeting is not None and side == 1:
+                    meeting = (meeting[1], meeting[0])
+            forward = self._path(sides[0], *meeting[0])
+            backward = self._path(sides[1], *meeting[1])
+            moves = forward + move_algebra.inverse(backward)
+            return [cube_model.MOVE_NAMES[m] for m in moves]
+        finally:
+            self.seconds = time.perf_counter() - start
+
+    def _expand(self, layers):
+        """Next layer of one side, without states it has already reached"""
+        frontier = layers[-1]
+        # Grouped by move, so every move is one column gather
+        moves, parents = np.nonzero(ALLOWED[frontier.move].T)
+        if self.states + len(parents) > self.max_states:
+            raise MemoryError(f"Bidirectional search would exceed {self.max_states} states")
+        moves = moves.astype(np.uint8)
+        cubies = self._children(frontier.cubies, parents, moves)
+        key, extra = encode(*cubies)
+        order = np.argsort(key)
+        key, extra = key[order], extra[order]
+        # Duplicates within the layer sit next to each other once sorted
+        keep = np.ones(len(key), dtype=bool)
+        keep[1:] = (key[1:] != key[:-1]) | (extra[1:] != extra[:-1])
+        # A neighbour of a state at distance d is at distance d - 1, d or d + 1
+        for seen in layers[-2:]:
+            kept = np.flatnonzero(keep)
+            keep[kept] = seen.find(key[kept], extra[kept]) < 0
+        order = order[keep]
+        layer = _Layer(key[keep], extra[keep], tuple(part[order] for part in cubies),
+                       parents[order], moves[order])
+        # Only the newest layer of a side is expanded again
+        frontier.cubies = None
+        return layer
+
+    @staticmethod
+    def _children(cubies, parents, moves):
+        """Cubie arrays of each parent state turned by its move, moves in ascending order"""
+        cp, co, ep, eo = cubies
+        children = tuple(np.empty((len(parents), part.shape[1]), dtype=np.uint8) for part in cubies)
+        bounds = np.searchsorted(moves, np.arange(move_algebra.N_MOVES + 1))
+        for m in range(move_algebra.N_MOVES):
+            rows = parents[bounds[m]:bounds[m + 1]]
+            done = slice(bounds[m], bounds[m + 1])
+            move_cp, move_ep = MOVE_CP[m], MOVE_EP[m]
+            children[0][done] = cp[rows][:, move_cp]
+            children[1][done] = (co[rows][:, move_cp] + MOVE_CO[m]) % 3
+            children[2][done] = ep[rows][:, move_ep]
+            children[3][done] = eo[rows][:, move_ep] ^ MOVE_EO[m]
+        return children
+
+    def _meet(self, depth, layer, other_layers):
+        """((depth, index), (other depth, other index)) of the shortest meeting, or None"""
+        for other_depth, other in enumerate(other_layers):
+            found = other.find(layer.key, layer.extra)
+            hits = np.flatnonzero(found >= 0)
+            if len(hits):
+                return (depth, int(hits[0])), (other_depth, int(found[hits[0]]))
+        return None
+
+    def _path(self, layers, depth, index):
+        """Moves from a side's root to the state at index of layer depth"""
+        moves = []
+        for layer in reversed(layers[1:depth + 1]):
+            moves.append(int(layer.move[index]))
+            index = int(layer.parent[index])
+        return moves[::-1]
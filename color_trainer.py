@@ -1,21 +1,44 @@
-import cv2
 import numpy as np
 import pickle
 import os
-from sklearn.cluster import KMeans
-from sklearn.neighbors import KNeighborsClassifier
-from collections import deque
+import hashlib
+import cube_model
+import cube_validator
+from gaussian_model import GaussianColorModel
+import move_algebra
+import two_phase
+
+# Search strategies selectable through CubeSolver.mode
+SOLVER_MODES = ('two_phase', 'optimal', 'ida', 'bidirectional')
+# Seconds the optimal search may take before the two-phase solution is used
+OPTIMAL_TIMEOUT = 30.0
+
+# Color models: incremental Gaussians saved as .npz (NumPy only), or the
+# original scikit-learn KNN saved as a pickle
+MODEL_TYPES = ('gaussian', 'knn')
+MODEL_PATHS = {'gaussian': 'cube_color_model.npz', 'knn': 'cube_color_model.pkl'}
+
+# Quantized HSV space of the color lookup table: every hue, 64 levels of
+# saturation and value
+LUT_SHAPE = (180, 64, 64)
+LUT_UNKNOWN = 255
 
 class CubeSolver:
-    def __init__(self):
-        # Move definitions
+    def __init__(self, mode='two_phase', cache=None):
+        if mode not in SOLVER_MODES:
+            raise ValueError(f"Unknown solver mode: {mode}")
+        self.mode = mode
+        # Optional SolutionCache shared by all search strategies
+        self.cache = cache
+        self.two_phase_solver = None
+        self.optimal_solver = None
+        self.optimal_timeout = OPTIMAL_TIMEOUT
+        self.bidirectional_solver = None
+        
+        # Move definitions: all 18 face turns as precomputed facelet permutations
         self.basic_moves = {
-            'R': lambda cube: self._rotate_face(cube, 'right'),
-            'L': lambda cube: self._rotate_face(cube, 'left'),
-            'U': lambda cube: self._rotate_face(cube, 'up'),
-            'D': lambda cube: self._rotate_face(cube, 'down'),
-            'F': lambda cube: self._rotate_face(cube, 'front'),
-            'B': lambda cube: self._rotate_face(cube, 'back')
+            name: (lambda cube, m=m: cube_model.apply_move(cube, m))
+            for m, name in enumerate(cube_model.MOVE_NAMES)
         }
         
         # Movement patterns for common situations
@@ -26,28 +49,83 @@ class CubeSolver:
         }
     
     def _rotate_face(self, cube_state, face):
-        """Simulate rotation of a face"""
-        state = cube_state.copy()
-        idx_map = {
-            'front': ([0,1,2], [3,4,5], [6,7,8]),
-            'right': ([2,5,8], [1,4,7], [0,3,6]),
-            'up': ([0,1,2], [3,4,5], [6,7,8]),
-            'down': ([6,7,8], [3,4,5], [0,1,2]),
-            'left': ([0,3,6], [1,4,7], [2,5,8]),
-            'back': ([2,1,0], [5,4,3], [8,7,6])
+        """Rotate a face a quarter turn clockwise"""
+        face_moves = {
+            'up': 'U', 'right': 'R', 'front': 'F',
+            'down': 'D', 'left': 'L', 'back': 'B'
         }
-        
-        indices = idx_map[face]
-        # Perform rotation logic
-        return state
+        return cube_model.apply_move(cube_state, face_moves[face])
+    
+    def to_facelets(self, cube_state):
+        """Accept either a facelet array or six scanned faces of color names"""
+        if isinstance(cube_state, np.ndarray) and cube_state.shape == (54,):
+            return cube_state.astype(np.uint8, copy=False)
+        return cube_model.facelets_from_faces(cube_state)
     
-    def find_solution(self, cube_state):
+    def find_solution(self, cube_state, mode=None):
+        """Find a solution with the given or configured search strategy"""
+        mode = mode or self.mode
+        if mode not in SOLVER_MODES:
+            raise ValueError(f"Unknown solver mode: {mode}")
+        cube_state = self.to_facelets(cube_state)
+        # Impossible states are rejected before a search can spend its budget on them
+        cube_validator.validate_state(cube_state)
+        if self.is_solved(cube_state):
+            return []
+        if self.cache is not None:
+            solution = self.cache.get(cube_state, mode)
+            if solution is not None:
+                return solution
+        solution, used_mode = self._search(cube_state, mode)
+        # A fallback's solution is stored under the strategy that found it,
+        # so it never passes for an optimal or shortest one
+        if self.cache is not None and solution is not None:
+            self.cache.put(cube_state, solution, used_mode)
+        return solution
+    
+    def _search(self, cube_state, mode):
+        """(solution, mode of the search that found it)"""
+        if mode == 'two_phase':
+            if self.two_phase_solver is None:
+                # Tables are memory-mapped (or generated once) on first use
+                self.two_phase_solver = two_phase.TwoPhaseSolver()
+            return self.two_phase_solver.solve(cube_state), mode
+        if mode == 'optimal':
+            if self.optimal_solver is None:
+                import optimal_solver
+                self.optimal_solver = optimal_solver.OptimalSolver()
+            solution = self.optimal_solver.solve(cube_state, timeout=self.optimal_timeout)
+            # Deep states are out of reach of the pure Python search
+            if solution is None:
+                return self._search(cube_state, 'two_phase')
+            return solution, mode
+        if mode == 'bidirectional':
+            if self.bidirectional_solver is None:
+                import bidirectional_solver
+                self.bidirectional_solver = bidirectional_solver.BidirectionalSolver()
+            try:
+                solution = self.bidirectional_solver.solve(cube_state)
+            except MemoryError:
+                solution = None
+            # Meant for short scrambles; longer ones go to the two-phase search
+            if solution is None:
+                return self._search(cube_state, 'two_phase')
+            return solution, mode
+        return self.find_solution_ida(cube_state), mode
+    
+    def close(self):
+        """Stop the optimal search's worker pool, if one was started"""
+        if self.optimal_solver is not None:
+            self.optimal_solver.close()
+            self.optimal_solver = None
+    
+    def find_solution_ida(self, cube_state):
         """Find solution using IDA* search"""
+        cube_state = self.to_facelets(cube_state)
         if self.is_solved(cube_state):
             return []
         
         max_depth = 20
-        moves = []
         visited = set()
         
         def ida_star(state, depth, path):
@@ -55,9 +133,12 @@ class CubeSolver:
                 return path
             if depth == 0:
                 return None
-                
-            for move in self.basic_moves:
-                new_state = self.basic_moves[move](state)
+            
+            # One gather produces all 18 successors; only those continuing a
+            # canonical sequence are searched
+            successors = cube_model.expand_batch(state[np.newaxis])[0]
+            for move in move_algebra.ALLOWED_AFTER[path[-1] if path else move_algebra.NO_MOVE]:
+                new_state = successors[move]
                 state_hash = self.hash_state(new_state)
                 
                 if state_hash not in visited:
@@ -73,39 +154,82 @@ class CubeSolver:
             visited.clear()
             solution = ida_star(cube_state, depth, [])
             if solution:
-                return solution
+                return [cube_model.MOVE_NAMES[m] for m in solution]
         
         return None
     
     def hash_state(self, state):
         """Create a unique hash for a cube state"""
-        return tuple(map(tuple, state))
+        return cube_model.state_key(state)
     
     def is_solved(self, state):
         """Check if cube is solved"""
-        for face in state:
-            if not all(x == face[0] for x in face):
-                return False
-        return True
+        return cube_model.is_solved(state)
 
 class CubeColorTrainer:
-    def __init__(self):
-        self.color_model = KNeighborsClassifier(n_neighbors=3)
+    def __init__(self, model_type='gaussian', solution_cache=None):
+        if model_type not in MODEL_TYPES:
+            raise ValueError(f"Unknown color model type: {model_type}")
+        self.model_type = model_type
+        self.color_model = self._new_model()
+        # Raw samples, kept for refitting the KNN model
         self.colors = {
             'white': [], 'yellow': [], 'red': [],
             'orange': [], 'blue': [], 'green': []
         }
-        self.model_path = 'cube_color_model.pkl'
-        self.solver = CubeSolver()
+        self.model_path = MODEL_PATHS[model_type]
+        self.lut_path = os.path.splitext(self.model_path)[0] + '_lut.npz'
+        self.color_lut = None
+        self.lut_classes = None
+        # Solutions are only cached when the caller hands in a cache
+        self.solver = CubeSolver(cache=solution_cache)
         self.current_cube_state = None
         
+    def _new_model(self):
+        if self.model_type == 'knn':
+            # scikit-learn is only imported when the KNN model is used
+            from sklearn.neighbors import KNeighborsClassifier
+            return KNeighborsClassifier(n_neighbors=3)
+        return GaussianColorModel()
+    
     def add_training_sample(self, color_name, hsv_values):
         """Add a color sample to the training data"""
+        self.add_training_samples(color_name, [hsv_values])
+    
+    def add_training_samples(self, color_name, hsv_values):
+        """Add many samples of one color; the Gaussian model absorbs them at once
+        
+        The lookup table keeps classifying with the saved model until
+        train_model saves the new one and drops it.
+        """
         if color_name in self.colors:
-            self.colors[color_name].append(hsv_values)
+            if self.model_type == 'gaussian':
+                self.color_model.partial_fit(hsv_values, [color_name] * len(hsv_values))
+            else:
+                self.colors[color_name].extend(hsv_values)
+    
+    def forget_color(self, color_name):
+        """Drop the samples of one color, e.g. before recalibrating it"""
+        if color_name in self.colors:
+            self.colors[color_name] = []
+            if self.model_type == 'gaussian':
+                self.color_model.forget(color_name)
+            self.invalidate_lookup_table()
             
-    def train_model(self):
-        """Train the color recognition model"""
+    def train_model(self, compile_lut=False):
+        """Train the color recognition model
+        
+        The Gaussian model is updated as samples arrive, so it is only saved.
+        """
+        if self.model_type == 'gaussian':
+            if not self.color_model.classes_:
+                return False
+            self.color_model.save(self.model_path)
+            self.invalidate_lookup_table()
+            if compile_lut:
+                self.compile_lookup_table()
+            return True
+        
         X = []  # Features (HSV values)
         y = []  # Labels (color names)
         
@@ -123,72 +247,207 @@ class CubeColorTrainer:
             with open(self.model_path, 'wb') as f:
                 pickle.dump(self.color_model, f)
             
+            self.invalidate_lookup_table()
+            if compile_lut:
+                self.compile_lookup_table()
             return True
         return False
     
+    def _model_fingerprint(self):
+        """Hash of the saved model file, tying a lookup table to one model"""
+        with open(self.model_path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    
+    def compile_lookup_table(self):
+        """Evaluate the trained model once over quantized HSV space and save the table"""
+        h, s, v = np.meshgrid(np.arange(LUT_SHAPE[0]),
+                              np.arange(LUT_SHAPE[1]) * 4 + 2,
+                              np.arange(LUT_SHAPE[2]) * 4 + 2, indexing='ij')
+        bin_centers = np.stack([h.ravel(), s.ravel(), v.ravel()], axis=1)
+        names = self.color_model.predict(bin_centers)
+        self.lut_classes = [str(c) for c in self.color_model.classes_]
+        class_index = {name: i for i, name in enumerate(self.lut_classes)}
+        self.color_lut = np.array([class_index[name] for name in names],
+                                  dtype=np.uint8).reshape(LUT_SHAPE)
+        np.savez(self.lut_path, lut=self.color_lut, classes=np.array(self.lut_classes),
+                 model_fingerprint=self._model_fingerprint())
+    
+    def invalidate_lookup_table(self):
+        """Drop the lookup table in memory and on disk"""
+        self.color_lut = None
+        self.lut_classes = None
+        if os.path.exists(self.lut_path):
+            os.remove(self.lut_path)
+    
+    def _load_lookup_table(self):
+        """Load the saved lookup table if it was compiled from the current model"""
+        if not os.path.exists(self.lut_path):
+            return False
+        with np.load(self.lut_path) as data:
+            if str(data['model_fingerprint']) != self._model_fingerprint():
+                return False
+            self.color_lut = data['lut']
+            self.lut_classes = [str(c) for c in data['classes']]
+        return True
+    
+    def classify_hsv(self, hsv_image):
+        """Classify any array of HSV pixels (shape (..., 3)) through the lookup table
+        
+        Returns an array of class indices into lut_classes, LUT_UNKNOWN where
+        no table is available.
+        """
+        hsv_image = np.asarray(hsv_image)
+        if self.color_lut is None:
+            return np.full(hsv_image.shape[:-1], LUT_UNKNOWN, dtype=np.uint8)
+        h = np.clip(hsv_image[..., 0], 0, LUT_SHAPE[0] - 1).astype(np.intp)
+        s = np.clip(hsv_image[..., 1], 0, 255).astype(np.intp) >> 2
+        v = np.clip(hsv_image[..., 2], 0, 255).astype(np.intp) >> 2
+        return self.color_lut[h, s, v]
+    
     def predict_color(self, hsv_values):
         """Predict the color of a given HSV value"""
+        if self.color_lut is not None:
+            return self.predict_colors(hsv_values)[0]
         try:
             hsv_values = np.array(hsv_values).reshape(1, -1)
             return self.color_model.predict(hsv_values)[0]
         except:
             return None
     
+    def predict_colors(self, hsv_values):
+        """Predict the colors of several HSV values with a single model call"""
+        hsv_values = np.asarray(hsv_values).reshape(-1, 3)
+        if self.color_lut is not None:
+            return [self.lut_classes[i] for i in self.classify_hsv(hsv_values)]
+        try:
+            return list(self.color_model.predict(hsv_values))
+        except Exception:
+            return [None] * len(hsv_values)
+    
     def load_model(self):
-        """Load a previously trained model"""
+        """Load a previously trained model
+        
+        The model type follows the file: .npz files hold a Gaussian model,
+        anything else is a pickled KNN model.
+        """
+        if (self.model_path == MODEL_PATHS['gaussian'] and not os.path.exists(self.model_path)
+                and os.path.exists(MODEL_PATHS['knn'])):
+            # Keep using a KNN model trained before the Gaussian model existed
+            self.model_path = MODEL_PATHS['knn']
+            self.lut_path = os.path.splitext(self.model_path)[0] + '_lut.npz'
         if os.path.exists(self.model_path):
-            with open(self.model_path, 'rb') as f:
-                self.color_model = pickle.load(f)
+            if self.model_path.endswith('.npz'):
+                self.model_type = 'gaussian'
+                self.color_model = GaussianColorModel.load(self.model_path)
+            else:
+                self.model_type = 'knn'
+                with open(self.model_path, 'rb') as f:
+                    self.color_model = pickle.load(f)
+            self._load_lookup_table()
             return True
         return False
     
     def update_cube_state(self, face_colors):
-        """Update the current cube state with new face colors"""
+        """Update the current cube state with new face colors
+        
+        Raises CubeStateError if the face is incomplete or contradicts the
+        faces scanned before it.
+        """
         if not self.current_cube_state:
             self.current_cube_state = []
         
         if len(self.current_cube_state) < 6:  # Not all faces scanned yet
+            cube_validator.check_faces(self.current_cube_state + [face_colors])
             self.current_cube_state.append(face_colors)
             return len(self.current_cube_state)
         
         return -1  # All faces already scanned
     
-    def get_solution_path(self):
-        """Get solution path for current cube state"""
+    def get_solution_path(self, mode=None):
+        """Get solution path for current cube state
+        
+        mode overrides the solver's search strategy, e.g. 'optimal' for a
+        shortest solution instead of the fast two-phase one.
+        """
         if self.current_cube_state and len(self.current_cube_state) == 6:
-            solution = self.solver.find_solution(self.current_cube_state)
+            try:
+                cube_state = cube_validator.validate_faces(self.current_cube_state)
+                solution = self.solver.find_solution(cube_state, mode)
+            except ValueError:
+                return None
             if solution:
                 return self.optimize_solution(solution)
         return None
     
     def optimize_solution(self, solution):
-        """Optimize the solution path by removing redundant moves"""
-        optimized = []
-        i = 0
-        while i < len(solution):
-            if i + 1 < len(solution) and solution[i] == solution[i + 1]:
-                # Two same moves = half turn
-                optimized.append(solution[i] + "2")
-                i += 2
-            elif (i + 2 < len(solution) and 
-                  solution[i] == solution[i + 1] == solution[i + 2]):
-                # Three same moves = inverse move
-                optimized.append(solution[i] + "'")
-                i += 3
-            else:
-                optimized.append(solution[i])
-                i += 1
-        return optimized
+        """Optimize the solution path by removing redundant moves
+        
+        Turns of the same face are merged and cancelled, also across a turn of
+        the opposite face, e.g. R R R -> R', R R' -> nothing, R L R -> R2 L.
+        """
+        return move_algebra.simplify(solution)
 
 def get_dominant_color(image):
-    """Extract the dominant color from an image region"""
+    """Extract the dominant color from an image region
+    
+    This is the k-means reference path of the 'kmeans' extraction mode,
+    kept for comparing accuracy and frame time with the batched extraction.
+    """
     # Reshape the image to be a list of pixels
     pixels = image.reshape(-1, 3)
     
     # Cluster the pixels
+    from sklearn.cluster import KMeans
     kmeans = KMeans(n_clusters=1, n_init=10)
     kmeans.fit(pixels)
     
     # Get the dominant color
     dominant_color = kmeans.cluster_centers_[0]
-    return dominant_color.astype(int)
\ No newline at end of file
+    return dominant_color.astype(int)
+
+def get_cell_colors(hsv_image, grid_size=3, statistic='median', trim=0.25, step=2):
+    """Extract a robust color for every cell of a grid in one NumPy pass
+    
+    Returns an array of shape (grid_size * grid_size, 3) in row-major cell
+    order. `statistic` is 'median' or 'trimmed' (mean of the central
+    1 - 2 * trim fraction of each channel); `step` subsamples the pixels of
+    every cell, which barely moves these statistics but cuts the work.
+    """
+    height, width = hsv_image.shape[:2]
+    cell_height = height // grid_size
+    cell_width = width // grid_size
+    
+    # Crop to a whole number of cells and view the grid as a cell tensor
+    cells = hsv_image[:cell_height * grid_size, :cell_width * grid_size]
+    cells = cells.reshape(grid_size, cell_height, grid_size, cell_width, 3)
+    cells = cells[:, ::step, :, ::step].transpose(0, 2, 1, 3, 4)
+    cells = cells.reshape(grid_size * grid_size, -1, 3)
+    
+    if statistic == 'median':
+        return np.median(cells, axis=1).astype(int)
+    if statistic == 'trimmed':
+        n = cells.shape[1]
+        k = min(int(n * trim), (n - 1) // 2)
+        cells = np.partition(cells, (k, n - k - 1), axis=1)
+        return cells[:, k:n - k].mean(axis=1).astype(int)
+    raise ValueError(f"Unknown cell statistic: {statistic}")
+
+def reduce_cells(planes, statistic='median', trim=0.25):
+    """get_cell_colors' statistic of an (n_cells, 3, n_pixels) array of channel planes
+    
+    Partitions the contiguous pixel axis in place instead of sorting a
+    copy, so planes must be a scratch array.
+    """
+    n = planes.shape[2]
+    if statistic == 'median':
+        middle = n // 2
+        if n % 2:
+            planes.partition(middle, axis=2)
+            return planes[:, :, middle].astype(int)
+        planes.partition((middle - 1, middle), axis=2)
+        return planes[:, :, middle - 1:middle + 1].mean(axis=2).astype(int)
+    if statistic == 'trimmed':
+        k = min(int(n * trim), (n - 1) // 2)
+        planes.partition((k, n - k - 1), axis=2)
+        return planes[:, :, k:n - k].mean(axis=2).astype(int)
+    raise ValueError(f"Unknown cell statistic: {statistic}")
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import cube_model
+
+# Shared test helpers and fixtures
+
+def scrambled(moves):
+    """Facelet state reached by applying a move string to the solved cube"""
+    return cube_model.apply_moves(cube_model.SOLVED_STATE, moves)
+
+def random_states(count, length=25, seed=0):
+    """(scramble, state) pairs of random scrambles, no face turned twice in a row"""
+    rng = np.random.default_rng(seed)
+    states = []
+    for _ in range(count):
+        moves = []
+        while len(moves) < length:
+            move = int(rng.integers(len(cube_model.MOVE_NAMES)))
+            if not moves or move // 3 != moves[-1] // 3:
+                moves.append(move)
+        scramble = ' '.join(cube_model.MOVE_NAMES[m] for m in moves)
+        states.append((scramble, scrambled(scramble)))
+    return states
+
+def assert_solves(state, solution):
+    assert cube_model.is_solved(cube_model.apply_moves(state, solution)), solution
+
+# The solvers find their tables relative to the working directory and take
+# about a minute to generate them, so tests that search run in a directory
+# of pytest's cache where the tables are written once and memory-mapped by
+# later runs.
+
+@pytest.fixture(scope='session')
+def tables_dir(request):
+    """Working directory holding the solver tables for the whole session"""
+    path = request.config.cache.mkdir('solver_tables')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(path)
+        yield path
+
+@pytest.fixture(scope='session')
+def two_phase_solver(tables_dir):
+    import two_phase
+    return two_phase.TwoPhaseSolver()
@@ -0,0 +1,213 @@
+import cv2
+import numpy as np
+
+# Cube face detection and tracking
+#
+# Detection runs on a downscaled grayscale frame: stickers are the roughly
+# square regions enclosed by edges, and the largest group of similar sized
+# squares is fitted with a (possibly rotated) 3x3 grid. Between frames the
+# grid moves with a similarity transform fitted to corner features inside
+# the face (sticker corners and edges, which unlike the flat sticker
+# centers have texture to follow) tracked with pyramidal Lucas-Kanade
+# optical flow; detection only runs again when tracking loses the face or
+# every redetect_interval frames to correct drift.
+
+class CubeDetector:
+    def __init__(self, detect_width=320, min_stickers=6, redetect_interval=30,
+                 max_features=60, min_features=12):
+        self.detect_width = detect_width
+        self.min_stickers = min_stickers
+        self.redetect_interval = redetect_interval
+        self.max_features = max_features
+        self.min_features = min_features
+        self.stickers = None      # (9, 2) sticker centers in frame coordinates
+        self.sticker_size = 0.0   # Sticker side length in frame coordinates
+        self.tracked_frames = 0
+        self.detections = 0
+        self._previous_gray = None
+        self._features = None     # Tracked points in detection coordinates
+        self._scale = 1.0
+        # Optional BufferPool (see cube_processor) the downscaled frames are made in
+        self.buffers = None
+        self._gray_slot = 0
+
+    def reset(self):
+        self.stickers = None
+        self._previous_gray = None
+        self._features = None
+
+    def _downscale(self, frame):
+        height, width = frame.shape[:2]
+        self._scale = min(1.0, self.detect_width / width)
+        size = (round(width * self._scale), round(height * self._scale))
+        if self.buffers is None:
+            if self._scale < 1.0:
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self._scale < 1.0:
+            small = self.buffers.get('detect_small', (size[1], size[0], 3))
+            cv2.resize(frame, size, dst=small, interpolation=cv2.INTER_AREA)
+            frame = small
+        # Two gray buffers in turn: the previous frame is still needed for tracking
+        self._gray_slot ^= 1
+        gray = self.buffers.get(f'detect_gray{self._gray_slot}', frame.shape[:2])
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+        return gray
+
+    def locate(self, frame):
+        """Find the cube face in a frame, tracking it from the previous frame when possible
+
+        Returns the (9, 2) sticker centers in row-major order, or None.
+        """
+        gray = self._downscale(frame)
+        stickers = None
+        if (self.stickers is not None and self._previous_gray is not None
+                and self.tracked_frames < self.redetect_interval):
+            stickers = self._track(gray)
+            if stickers is not None:
+                self.tracked_frames += 1
+        if stickers is None:
+            stickers = self._detect(gray)
+            self.tracked_frames = 0
+            self.detections += 1
+            self._features = None
+        if stickers is not None and (self._features is None
+                                     or len(self._features) < self.min_features):
+            self._features = self._find_features(gray, stickers * self._scale)
+        self._previous_gray = gray
+        self.stickers = stickers
+        return stickers
+
+    def _sticker_candidates(self, gray):
+        """Centers, sizes and angles of square regions enclosed by edges"""
+        edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 20, 60)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+        contours, _ = cv2.findContours(255 - edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        frame_area = gray.shape[0] * gray.shape[1]
+        candidates = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if not frame_area / 500 < area < frame_area / 8:
+                continue
+            (x, y), (w, h), angle = cv2.minAreaRect(contour)
+            if min(w, h) < 0.75 * max(w, h) or area < 0.8 * w * h:
+                continue
+            candidates.append((x, y, (w + h) / 2, angle % 90))
+        return np.array(candidates, dtype=np.float64).reshape(-1, 4)
+
+    @staticmethod
+    def _merge_duplicates(candidates, size):
+        """Keep one of every set of candidates closer than half a sticker
+
+        The edge ring around a sticker encloses it on both sides, so most
+        stickers are found twice with nearly the same center.
+        """
+        kept = []
+        for i in np.argsort(-candidates[:, 2]):
+            if all(np.hypot(*(candidates[i, :2] - candidates[j, :2])) >= size / 2 for j in kept):
+                kept.append(i)
+        return candidates[np.sort(kept)]
+
+    def _detect(self, gray):
+        candidates = self._sticker_candidates(gray)
+        if len(candidates) < self.min_stickers:
+            return None
+        size = np.median(candidates[:, 2])
+        candidates = candidates[(candidates[:, 2] > 0.7 * size) & (candidates[:, 2] < 1.4 * size)]
+        candidates = self._merge_duplicates(candidates, size)
+        if len(candidates) < self.min_stickers:
+            return None
+
+        # Keep the largest group of stickers that neighbour each other
+        centers = candidates[:, :2]
+        distances = np.linalg.norm(centers[:, np.newaxis] - centers[np.newaxis], axis=2)
+        linked = distances < 1.8 * size
+        group = np.zeros(len(centers), dtype=bool)
+        best_group = group
+        unvisited = np.ones(len(centers), dtype=bool)
+        while unvisited.any():
+            group = np.zeros(len(centers), dtype=bool)
+            group[np.argmax(unvisited)] = True
+            while True:
+                grown = linked[group].any(axis=0)
+                if (grown == group).all():
+                    break
+                group = grown
+            unvisited &= ~group
+            if group.sum() > best_group.sum():
+                best_group = group
+        candidates = candidates[best_group]
+        if len(candidates) < self.min_stickers:
+            return None
+
+        # Express the centers in the grid's own (unrotated) frame
+        angles = np.deg2rad(np.where(candidates[:, 3] > 45, candidates[:, 3] - 90, candidates[:, 3]))
+        angle = np.median(angles)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        origin = candidates[:, :2].mean(axis=0)
+        local = (candidates[:, :2] - origin) @ rotation
+
+        # Snap to grid cells: the spacing is the typical neighbour distance
+        distances = np.linalg.norm(local[:, np.newaxis] - local[np.newaxis], axis=2)
+        np.fill_diagonal(distances, np.inf)
+        spacing = np.median(distances.min(axis=1))
+        if not spacing > 0:
+            return None
+        columns = np.round((local[:, 0] - local[:, 0].min()) / spacing).astype(int)
+        rows = np.round((local[:, 1] - local[:, 1].min()) / spacing).astype(int)
+        if columns.max() != 2 or rows.max() != 2:
+            return None
+        if len(set(zip(rows, columns))) < self.min_stickers:
+            return None
+
+        # Least-squares fit of the grid origin and spacing along both axes
+        x_fit = np.polyfit(columns, local[:, 0], 1)
+        y_fit = np.polyfit(rows, local[:, 1], 1)
+        grid_rows, grid_columns = np.divmod(np.arange(9), 3)
+        grid = np.stack([np.polyval(x_fit, grid_columns), np.polyval(y_fit, grid_rows)], axis=1)
+        stickers = grid @ rotation.T + origin
+        self.sticker_size = np.median(candidates[:, 2]) / self._scale
+        return stickers / self._scale
+
+    def _find_features(self, gray, stickers):
+        """Corner features within the face outlined by sticker centers (detection coordinates)"""
+        spacing = self.sticker_size * self._scale
+        center = stickers.mean(axis=0)
+        # The face reaches half a sticker spacing beyond the outer centers
+        outline = center + (stickers[[0, 2, 8, 6]] - center) * 1.5
+        mask = np.zeros(gray.shape, dtype=np.uint8)
+        cv2.fillConvexPoly(mask, np.round(outline).astype(np.int32), 255)
+        return cv2.goodFeaturesToTrack(gray, self.max_features, 0.01,
+                                       max(3, int(spacing / 6)), mask=mask)
+
+    def _track(self, gray):
+        if self._features is None or len(self._features) < self.min_features:
+            return None
+        current, status, _ = cv2.calcOpticalFlowPyrLK(self._previous_gray, gray, self._features,
+                                                      None, winSize=(15, 15), maxLevel=3)
+        status = status.ravel().astype(bool)
+        if status.sum() < self.min_features:
+            return None
+        # Move the grid rigidly so a few bad points cannot distort it
+        transform, inliers = cv2.estimateAffinePartial2D(self._features[status], current[status],
+                                                         ransacReprojThreshold=2.0)
+        if transform is None or inliers.sum() < self.min_features:
+            return None
+        previous = (self.stickers * self._scale).astype(np.float32).reshape(-1, 1, 2)
+        moved = cv2.transform(previous, transform).reshape(-1, 2)
+        height, width = gray.shape
+        if (moved < 0).any() or (moved[:, 0] >= width).any() or (moved[:, 1] >= height).any():
+            return None
+        self._features = current[status][inliers.ravel().astype(bool)]
+        self.sticker_size *= np.sqrt(abs(np.linalg.det(transform[:, :2])))
+        return moved / self._scale
+
+    def sticker_patches(self, frame, fraction=0.5):
+        """Slices of the central part of every sticker, for color sampling"""
+        half = max(1, int(self.sticker_size * fraction / 2))
+        height, width = frame.shape[:2]
+        patches = []
+        for x, y in np.round(self.stickers).astype(int):
+            patches.append(frame[max(0, y - half):min(height, y + half + 1),
+                                 max(0, x - half):min(width, x + half + 1)])
+        return patches
@@ -0,0 +1,234 @@
+import numpy as np
+
+# Facelet cube model
+#
+# A cube state is a uint8 array of 54 facelets. Faces are stored in the
+# order U, R, F, D, L, B with nine facelets each, row by row, as seen when
+# looking straight at the face in the standard net:
+#
+#              U0 U1 U2
+#              U3 U4 U5
+#              U6 U7 U8
+#     L0 L1 L2 F0 F1 F2 R0 R1 R2 B0 B1 B2
+#     L3 L4 L5 F3 F4 F5 R3 R4 R5 B3 B4 B5
+#     L6 L7 L8 F6 F7 F8 R6 R7 R8 B6 B7 B8
+#              D0 D1 D2
+#              D3 D4 D5
+#              D6 D7 D8
+#
+# Every facelet holds the index (0-5) of the face whose center has its
+# color, so the solved cube is [0]*9 + [1]*9 + ... + [5]*9.
+
+FACES = 'URFDLB'
+MOVE_NAMES = [face + suffix for face in FACES for suffix in ('', '2', "'")]
+MOVE_INDEX = {name: i for i, name in enumerate(MOVE_NAMES)}
+
+SOLVED_STATE = np.repeat(np.arange(6, dtype=np.uint8), 9)
+
+# Outward normal and quarter-turn axis of each face (x right, y up, z front)
+_FACE_NORMALS = {
+    'U': (0, 1, 0), 'R': (1, 0, 0), 'F': (0, 0, 1),
+    'D': (0, -1, 0), 'L': (-1, 0, 0), 'B': (0, 0, -1)
+}
+
+def _facelet_position(face, row, col):
+    """3D position of a facelet's cubie, in {-1, 0, 1} coordinates"""
+    if face == 'U':
+        return (col - 1, 1, row - 1)
+    if face == 'R':
+        return (1, 1 - row, 1 - col)
+    if face == 'F':
+        return (col - 1, 1 - row, 1)
+    if face == 'D':
+        return (col - 1, -1, 1 - row)
+    if face == 'L':
+        return (-1, 1 - row, col - 1)
+    return (1 - col, 1 - row, -1)
+
+def _rotate(vector, axis, quarter_turns):
+    """Rotate a vector clockwise (seen from the tip of axis) in 90 degree steps"""
+    x, y, z = vector
+    for _ in range(quarter_turns % 4):
+        if axis == (1, 0, 0):
+            y, z = z, -y
+        elif axis == (-1, 0, 0):
+            y, z = -z, y
+        elif axis == (0, 1, 0):
+            z, x = x, -z
+        elif axis == (0, -1, 0):
+            z, x = -x, z
+        elif axis == (0, 0, 1):
+            x, y = y, -x
+        else:
+            x, y = -y, x
+    return (x, y, z)
+
+def _build_move_perms():
+    """Precompute the gather permutation of all 18 face turns"""
+    stickers = []
+    for face in FACES:
+        for row in range(3):
+            for col in range(3):
+                position = _facelet_position(face, row, col)
+                stickers.append((position, _FACE_NORMALS[face]))
+    sticker_index = {sticker: i for i, sticker in enumerate(stickers)}
+
+    perms = np.zeros((len(MOVE_NAMES), 54), dtype=np.intp)
+    for m, name in enumerate(MOVE_NAMES):
+        axis = _FACE_NORMALS[name[0]]
+        turns = {'': 1, '2': 2, "'": 3}[name[1:]]
+        for i, (position, normal) in enumerate(stickers):
+            if np.dot(position, axis) == 1:
+                target = (_rotate(position, axis, turns), _rotate(normal, axis, turns))
+            else:
+                target = (position, normal)
+            # The sticker at i moves to target, so target gathers from i
+            perms[m, sticker_index[target]] = i
+    return perms
+
+MOVE_PERMS = _build_move_perms()
+MOVE_PERMS.setflags(write=False)
+
+def parse_moves(moves):
+    """Convert a move string or a sequence of move names/indices to indices"""
+    if isinstance(moves, str):
+        moves = moves.split()
+    return [m if isinstance(m, (int, np.integer)) else MOVE_INDEX[m] for m in moves]
+
+def sequence_perm(moves):
+    """Compose a move sequence into a single gather permutation"""
+    perm = np.arange(54)
+    for m in parse_moves(moves):
+        perm = perm[MOVE_PERMS[m]]
+    return perm
+
+def apply_move(state, move):
+    """Apply one face turn to a facelet state"""
+    if not isinstance(move, (int, np.integer)):
+        move = MOVE_INDEX[move]
+    return state[MOVE_PERMS[move]]
+
+def apply_moves(state, moves):
+    """Apply a move sequence to a facelet state with a single gather"""
+    return state[sequence_perm(moves)]
+
+def apply_move_batch(states, move):
+    """Apply one face turn to an (N, 54) array of facelet states at once"""
+    if not isinstance(move, (int, np.integer)):
+        move = MOVE_INDEX[move]
+    return states[:, MOVE_PERMS[move]]
+
+def expand_batch(states):
+    """Apply all 18 face turns to an (N, 54) array, giving an (N, 18, 54) array"""
+    return states[:, MOVE_PERMS]
+
+def is_solved(state):
+    """Check if every face of a facelet state shows a single color"""
+    faces = np.asarray(state).reshape(-1, 6, 9)
+    return bool(np.all(faces == faces[:, :, 4:5]))
+
+def state_key(state):
+    """Compact hashable key for a facelet state"""
+    return np.asarray(state, dtype=np.uint8).tobytes()
+
+def facelets_from_faces(faces):
+    """Build a facelet state from six scanned 3x3 faces of color names
+
+    The faces must be given in U, R, F, D, L, B order, each as three rows of
+    three color names oriented as in the net above. Colors are mapped to
+    face indices through the center stickers.
+    """
+    if (len(faces) != 6 or any(len(face) != 3 for face in faces)
+            or any(len(row) != 3 for face in faces for row in face)):
+        raise ValueError("Expected six faces of 3x3 stickers")
+    centers = [face[1][1] for face in faces]
+    if len(set(centers)) != 6:
+        raise ValueError(f"Center stickers are not six distinct colors: {centers}")
+    face_of_color = {color: i for i, color in enumerate(centers)}
+    try:
+        return np.array([face_of_color[color] for face in faces for row in face
+                         for color in row], dtype=np.uint8)
+    except KeyError as e:
+        raise ValueError(f"Sticker color {e.args[0]} does not match any center") from None
+
+# Cubie model
+#
+# Corners URF UFL ULB UBR DFR DLF DBL DRB and edges UR UF UL UB DR DF DL DB
+# FR FL BL BR, each listed with the facelets it carries. The first facelet
+# of every corner is its U/D sticker and the first facelet of every edge
+# is the one used for the flip.
+
+CORNER_FACELETS = [
+    (8, 9, 20), (6, 18, 38), (0, 36, 47), (2, 45, 11),
+    (29, 26, 15), (27, 44, 24), (33, 53, 42), (35, 17, 51)
+]
+EDGE_FACELETS = [
+    (5, 10), (7, 19), (3, 37), (1, 46), (32, 16), (28, 25),
+    (30, 43), (34, 52), (23, 12), (21, 41), (50, 39), (48, 14)
+]
+CORNER_COLORS = [tuple(SOLVED_STATE[i] for i in f) for f in CORNER_FACELETS]
+EDGE_COLORS = [tuple(SOLVED_STATE[i] for i in f) for f in EDGE_FACELETS]
+
+def to_cubies(state):
+    """Convert a facelet state to (cp, co, ep, eo) lists
+
+    Raises ValueError when a corner or edge shows a color combination that
+    does not exist on a real cube.
+    """
+    state = [int(c) for c in state]
+    cp, co, ep, eo = [0] * 8, [0] * 8, [0] * 12, [0] * 12
+    for i, facelets in enumerate(CORNER_FACELETS):
+        colors = [state[f] for f in facelets]
+        for ori in range(3):
+            if colors[ori] in (0, 3):
+                break
+        else:
+            raise ValueError(f"Corner {i} has no U or D sticker: facelets {facelets}")
+        key = (colors[ori], colors[(ori + 1) % 3], colors[(ori + 2) % 3])
+        if key not in _CORNER_LOOKUP:
+            raise ValueError(f"Corner {i} has invalid colors: facelets {facelets}")
+        cp[i], co[i] = _CORNER_LOOKUP[key], ori
+    for i, facelets in enumerate(EDGE_FACELETS):
+        colors = (state[facelets[0]], state[facelets[1]])
+        if colors in _EDGE_LOOKUP:
+            ep[i], eo[i] = _EDGE_LOOKUP[colors], 0
+        elif colors[::-1] in _EDGE_LOOKUP:
+            ep[i], eo[i] = _EDGE_LOOKUP[colors[::-1]], 1
+        else:
+            raise ValueError(f"Edge {i} has invalid colors: facelets {facelets}")
+    return cp, co, ep, eo
+
+def from_cubies(cp, co, ep, eo):
+    """Convert (cp, co, ep, eo) back to a facelet state"""
+    state = SOLVED_STATE.copy()
+    for i in range(8):
+        for k in range(3):
+            state[CORNER_FACELETS[i][(k + co[i]) % 3]] = CORNER_COLORS[cp[i]][k]
+    for i in range(12):
+        for k in range(2):
+            state[EDGE_FACELETS[i][(k + eo[i]) % 2]] = EDGE_COLORS[ep[i]][k]
+    return state
+
+def permutation_parity(perm):
+    """Return 0 for an even permutation and 1 for an odd one"""
+    parity = 0
+    for i in range(len(perm)):
+        for j in range(i + 1, len(perm)):
+            if perm[i] > perm[j]:
+                parity ^= 1
+    return parity
+
+_CORNER_LOOKUP = {tuple(int(c) for c in colors): i for i, colors in enumerate(CORNER_COLORS)}
+_EDGE_LOOKUP = {tuple(int(c) for c in colors): i for i, colors in enumerate(EDGE_COLORS)}
+
+# Cubie form of the 18 face turns, as (cp, co, ep, eo) arrays
+MOVE_CUBIES = [tuple(np.array(part) for part in to_cubies(SOLVED_STATE[perm]))
+               for perm in MOVE_PERMS]
+
+# Sticker colors of the standard Western color scheme, in face order
+DEFAULT_SCHEME = ('white', 'red', 'green', 'yellow', 'orange', 'blue')
+
+def faces_from_facelets(state, scheme=DEFAULT_SCHEME):
+    """Inverse of facelets_from_faces: six 3x3 faces of color names"""
+    return [[[scheme[state[face * 9 + row * 3 + col]] for col in range(3)]
+             for row in range(3)] for face in range(6)]
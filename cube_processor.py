@@ -1,111 +1,600 @@
 import cv2
 import numpy as np
-from color_trainer import CubeColorTrainer, get_dominant_color
+import threading
+import time
+from collections import Counter, deque
+from color_trainer import CubeColorTrainer, get_dominant_color, get_cell_colors, reduce_cells
+from auto_label import label_stickers
+import cube_model
+from cube_model import FACES
+from cube_validator import CubeStateError, validate_faces
+from cube_detector import CubeDetector
+from stage_timer import StageTimer
 
-class CubeProcessor:
+# Sticker extraction engines selectable through CubeProcessor.extraction_mode
+EXTRACTION_MODES = ('batched', 'kmeans')
+
+# Side of the square sampled at the frame center for calibration, and the
+# stride through its pixels that gives the samples of one streamed frame
+CALIBRATION_PATCH = 50
+CALIBRATION_STRIDE = 40
+
+# Pixel stride within grid cells when extracting their colors
+CELL_STEP = 2
+# Side of the pixel grid sampled from every detected sticker in pooled mode
+PATCH_SAMPLES = 16
+
+class BufferPool:
+    """Arrays reused from frame to frame, reallocated only when their shape changes"""
+    
     def __init__(self):
-        self.color_trainer = CubeColorTrainer()
+        self.buffers = {}
+    
+    def get(self, name, shape, dtype=np.uint8):
+        shape = tuple(shape)
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self.buffers[name] = np.empty(shape, dtype)
+        return buffer
+    
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+class CellTracker:
+    """Per-cell state kept across frames for incremental classification
+    
+    A small downsampled signature of every cell tells whether its pixels
+    changed since the cell was last classified, so unchanged cells skip
+    extraction and prediction. The last few labels of every cell are kept
+    in a ring buffer and the majority label is reported, which stops the
+    labels from flickering between frames.
+    """
+    
+    def __init__(self, grid_size=3, signature_size=8, change_threshold=8.0,
+                 reset_threshold=40.0, history=5):
+        self.grid_size = grid_size
+        self.signature_size = signature_size
+        # Mean absolute difference (0-255) that counts as a change, and the
+        # larger one that means a different sticker and clears the votes
+        self.change_threshold = change_threshold
+        self.reset_threshold = reset_threshold
+        self.signatures = None
+        self.histories = [deque(maxlen=history) for _ in range(grid_size * grid_size)]
+        self.reclassified = 0
+    
+    def reset(self):
+        self.signatures = None
+        for history in self.histories:
+            history.clear()
+    
+    def signature(self, frame):
+        """One small signature row per cell, from a single downsampling pass"""
+        g, size = self.grid_size, self.signature_size
+        small = cv2.resize(frame, (g * size, g * size), interpolation=cv2.INTER_AREA)
+        cells = small.reshape(g, size, g, size, -1).transpose(0, 2, 1, 3, 4)
+        return cells.reshape(g * g, -1).astype(np.float32)
+    
+    def patch_signatures(self, patches):
+        """One signature row per image patch, e.g. per detected sticker"""
+        size = self.signature_size
+        small = np.empty((len(patches), size, size, 3), dtype=np.uint8)
+        for k, patch in enumerate(patches):
+            cv2.resize(patch, (size, size), dst=small[k], interpolation=cv2.INTER_AREA)
+        return small.reshape(len(patches), -1).astype(np.float32)
+    
+    def update(self, frame, classify):
+        """Return the stabilized label of every cell
+        
+        classify is called with the indices of the changed cells and must
+        return their labels in the same order.
+        """
+        return self.update_signatures(self.signature(frame), classify)
+    
+    def update_patches(self, patches, classify):
+        """update for one patch per cell, such as the stickers found by the detector"""
+        return self.update_signatures(self.patch_signatures(patches), classify)
+    
+    def update_signatures(self, signatures, classify):
+        """update with precomputed signatures, one row per cell"""
+        if self.signatures is None:
+            distance = np.full(len(signatures), np.inf)
+            self.signatures = signatures
+        else:
+            distance = np.abs(signatures - self.signatures).mean(axis=1)
+        changed = np.flatnonzero(distance > self.change_threshold)
+        if len(changed):
+            for index, label in zip(changed, classify(changed)):
+                if distance[index] > self.reset_threshold:
+                    self.histories[index].clear()
+                self.histories[index].append(label)
+            self.signatures[changed] = signatures[changed]
+        self.reclassified = len(changed)
+        return [self._vote(history) for history in self.histories]
+    
+    def _vote(self, history):
+        if not history:
+            return None
+        counts = Counter(history)
+        most = max(counts.values())
+        # Ties go to the most recent of the tied labels
+        for label in reversed(history):
+            if counts[label] == most:
+                return label
+
+class CubeProcessor:
+    def __init__(self, extraction_mode='batched', incremental=False, detect_cube=False,
+                 auto_label=False, pooled=False, background_solve=False, solution_cache=None):
+        if extraction_mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode: {extraction_mode}")
+        self.color_trainer = CubeColorTrainer(solution_cache=solution_cache)
         self.color_trainer.load_model()
         self.grid_size = 3
         self.face_colors = []
         self.current_face = 0
         self.solution_path = None
+        self.extraction_mode = extraction_mode
+        self.cell_statistic = 'median'
+        self.last_frame_time = 0.0
+        # Incremental mode only reclassifies cells whose pixels changed
+        self.incremental = incremental
+        self.cell_tracker = CellTracker(self.grid_size)
+        # The detected stickers are tracked by their slot in the face, apart
+        # from the grid cells, and forgotten whenever the face is lost
+        self.sticker_tracker = CellTracker(self.grid_size)
+        # Detection mode finds the face anywhere in the frame and samples only
+        # the sticker patches instead of splitting the whole frame into cells
+        self.detect_cube = detect_cube
+        self.cube_detector = CubeDetector()
+        # Per-stage durations, recorded only while the timer is enabled, and
+        # the (label, timer) pairs whose summaries are drawn on the video
+        self.timer = StageTimer()
+        self.timing_overlay = []
+        # Color being calibrated continuously from every frame, if any
+        self.calibrating = None
+        self.calibration_samples = 0
+        self._calibration_lock = threading.Lock()
+        # Auto-label mode skips the color model: captured faces keep the HSV
+        # values of their stickers, which are labeled together once all six
+        # faces are in
+        self.auto_label = auto_label
+        self.cell_values = None
+        self.captured_values = []
+        # Pooled mode works in preallocated buffers: only the sampled pixels
+        # of the grid cells (all, or the changed ones in incremental mode) or
+        # of the detected stickers are converted to HSV, the detector
+        # downscales into the pool and process_frame draws into a reused
+        # image, so steady-state frames allocate next to nothing
+        self.pooled = pooled
+        self.buffers = BufferPool()
+        if pooled:
+            self.cube_detector.buffers = self.buffers
+        # Background mode solves in a worker process: the overlay shows the
+        # best solution found so far and a reset cancels the search
+        self.background_solver = None
+        self.solve_future = None
+        if background_solve:
+            from background_solver import BackgroundSolver
+            self.background_solver = BackgroundSolver(
+                self.color_trainer.solver.mode,
+                cache_path=solution_cache.path if solution_cache is not None else None)
         
-    def process_frame(self, frame):
-        """Process a video frame to detect cube faces"""
+    def classify_cells(self, hsv_frame, mode=None):
+        """Return the predicted color name of every grid cell in row-major order"""
+        mode = mode or self.extraction_mode
+        if mode == 'batched':
+            # One vectorized pass over all cells and a single batched predict
+            with self.timer.stage('extract'):
+                cell_colors = get_cell_colors(hsv_frame, self.grid_size,
+                                              statistic=self.cell_statistic)
+        elif mode == 'kmeans':
+            height, width = hsv_frame.shape[:2]
+            cell_height = height // self.grid_size
+            cell_width = width // self.grid_size
+            cell_colors = []
+            with self.timer.stage('extract'):
+                for i in range(self.grid_size):
+                    for j in range(self.grid_size):
+                        cell = hsv_frame[i * cell_height:(i + 1) * cell_height,
+                                         j * cell_width:(j + 1) * cell_width]
+                        cell_colors.append(get_dominant_color(cell))
+        else:
+            raise ValueError(f"Unknown extraction mode: {mode}")
+        return self._predict(cell_colors)
+    
+    def _predict(self, cell_colors):
+        """Color names of extracted cell values; unknown (None) in auto-label mode"""
+        self.cell_values = np.asarray(cell_colors).reshape(-1, 3)
+        if self.auto_label:
+            return [None] * len(self.cell_values)
+        with self.timer.stage('predict'):
+            return self.color_trainer.predict_colors(cell_colors)
+    
+    def classify_grid_pooled(self, frame, indices=None):
+        """classify_cells, or given indices classify_cell_indices, for a BGR frame
+        
+        Only the sampled pixels of the cells are converted, in pooled buffers.
+        """
+        g = self.grid_size
+        height, width = frame.shape[:2]
+        cell_height, cell_width = height // g, width // g
+        with self.timer.stage('sample'):
+            # A strided view of the frame as a (row, column, y, x) cell tensor
+            cells = frame[:cell_height * g, :cell_width * g].reshape(
+                g, cell_height, g, cell_width, 3)[:, ::CELL_STEP, :, ::CELL_STEP].transpose(0, 2, 1, 3, 4)
+            sampled = self.buffers.get('cells_bgr', cells.shape)
+            if indices is None:
+                np.copyto(sampled, cells)
+            else:
+                slots = sampled.reshape((g * g,) + cells.shape[2:])
+                for k, index in enumerate(indices):
+                    np.copyto(slots[k], cells[divmod(int(index), g)])
+        count = g * g if indices is None else len(indices)
+        return self._classify_samples(sampled.reshape((g * g,) + cells.shape[2:]), count, 'cells')
+    
+    def classify_patches_pooled(self, patches):
+        """classify_patches on a fixed grid of pixels sampled from every patch into pooled buffers"""
+        with self.timer.stage('sample'):
+            samples = self.buffers.get('patches_bgr', (len(patches), PATCH_SAMPLES, PATCH_SAMPLES, 3))
+            for k, patch in enumerate(patches):
+                cv2.resize(patch, (PATCH_SAMPLES, PATCH_SAMPLES), dst=samples[k],
+                           interpolation=cv2.INTER_NEAREST)
+        return self._classify_samples(samples, len(patches), 'patches')
+    
+    def _classify_samples(self, samples, count, name):
+        """Classify the first count cells of a pooled (cells, y, x, 3) BGR sample array"""
+        cells, sample_height, sample_width = samples.shape[:3]
+        with self.timer.stage('hsv'):
+            # The samples side by side as one image for cvtColor
+            hsv = self.buffers.get(f'{name}_hsv', samples.shape)
+            cv2.cvtColor(samples[:count].reshape(-1, sample_width, 3), cv2.COLOR_BGR2HSV,
+                         dst=hsv[:count].reshape(-1, sample_width, 3))
+        with self.timer.stage('extract'):
+            pixels = hsv[:count].reshape(count, -1, 3).transpose(0, 2, 1)
+            planes = self.buffers.get(f'{name}_planes', (cells, 3, sample_height * sample_width))
+            np.copyto(planes[:count], pixels)
+            cell_colors = reduce_cells(planes[:count], self.cell_statistic)
+        return self._predict(cell_colors)
+    
+    def classify_patches(self, patches):
+        """Classify BGR image patches, converting only the patches to HSV"""
+        with self.timer.stage('hsv'):
+            cells = [cv2.cvtColor(patch, cv2.COLOR_BGR2HSV) for patch in patches]
+        with self.timer.stage('extract'):
+            if self.extraction_mode == 'kmeans':
+                cell_colors = [get_dominant_color(cell) for cell in cells]
+            else:
+                cell_colors = [get_cell_colors(cell, 1, statistic=self.cell_statistic)[0]
+                               for cell in cells]
+        return self._predict(cell_colors)
+    
+    def classify_cell_indices(self, frame, indices):
+        """Classify selected grid cells of a BGR frame, converting only those cells"""
         height, width = frame.shape[:2]
         cell_height = height // self.grid_size
         cell_width = width // self.grid_size
+        patches = []
+        for index in indices:
+            i, j = divmod(int(index), self.grid_size)
+            patches.append(frame[i * cell_height:(i + 1) * cell_height,
+                                 j * cell_width:(j + 1) * cell_width])
+        return self.classify_patches(patches)
+    
+    def detected_boxes(self, frame):
+        """Rectangle (x1, y1, x2, y2) around every detected sticker, or None"""
+        stickers = self.cube_detector.locate(frame)
+        if stickers is None:
+            return None
+        half = self.cube_detector.sticker_size / 2
+        return [(int(x - half), int(y - half), int(x + half), int(y + half))
+                for x, y in stickers]
+    
+    def grid_boxes(self, frame):
+        """Rectangle (x1, y1, x2, y2) of every cell of the fixed full-frame grid"""
+        height, width = frame.shape[:2]
+        cell_height = height // self.grid_size
+        cell_width = width // self.grid_size
+        return [(j * cell_width, i * cell_height, (j + 1) * cell_width, (i + 1) * cell_height)
+                for i in range(self.grid_size) for j in range(self.grid_size)]
+    
+    def compare_extraction_modes(self, frame):
+        """Run every extraction engine on one frame for accuracy and timing comparison
+        
+        Returns a dict mapping mode name to (color names, seconds taken).
+        """
+        results = {}
+        for mode in EXTRACTION_MODES:
+            start = time.perf_counter()
+            hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            color_names = self.classify_cells(hsv_frame, mode)
+            results[mode] = (color_names, time.perf_counter() - start)
+        return results
+    
+    def analyze_frame(self, frame):
+        """Classify the face in a frame and publish its colors
         
-        # Convert frame to HSV
-        hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        Returns the cell rectangles, the color name of every cell and whether
+        the face was found by the detector, for draw_overlay.
+        """
+        if self.calibrating:
+            self._stream_calibration_samples(frame)
+        with self.timer.stage('detect'):
+            boxes = self.detected_boxes(frame) if self.detect_cube else None
+        detected = boxes is not None
         
-        # Create grid overlay
-        grid_frame = frame.copy()
-        self.face_colors = []
+        pooled = self.pooled and self.extraction_mode == 'batched'
+        incremental = self.incremental and not self.auto_label
+        if detected:
+            patches = self.cube_detector.sticker_patches(frame)
+            classify_patches = self.classify_patches_pooled if pooled else self.classify_patches
+            if incremental:
+                color_names = self.sticker_tracker.update_patches(
+                    patches, lambda indices: classify_patches([patches[i] for i in indices]))
+            else:
+                color_names = classify_patches(patches)
+        else:
+            self.sticker_tracker.reset()
+            # No face found (or detection off): the face must fill the frame
+            boxes = self.grid_boxes(frame)
+            if incremental:
+                classify = ((lambda indices: self.classify_grid_pooled(frame, indices)) if pooled
+                            else (lambda indices: self.classify_cell_indices(frame, indices)))
+                color_names = self.cell_tracker.update(frame, classify)
+            elif pooled:
+                color_names = self.classify_grid_pooled(frame)
+            else:
+                # Convert frame to HSV
+                with self.timer.stage('hsv'):
+                    hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+                color_names = self.classify_cells(hsv_frame)
         
-        # Process each cell in the grid
+        face_colors = []
         for i in range(self.grid_size):
-            row_colors = []
-            for j in range(self.grid_size):
-                # Calculate cell boundaries
-                x1 = j * cell_width
-                y1 = i * cell_height
-                x2 = (j + 1) * cell_width
-                y2 = (i + 1) * cell_height
-                
-                # Extract cell region
-                cell = hsv_frame[y1:y2, x1:x2]
-                
-                # Get dominant color
-                dominant_color = get_dominant_color(cell)
-                
-                # Predict color name
-                color_name = self.color_trainer.predict_color(dominant_color)
-                
-                # Draw cell rectangle
-                cv2.rectangle(grid_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                
-                # Add text label
-                if color_name:
-                    cv2.putText(grid_frame, color_name, (x1 + 10, y1 + 30),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-                    row_colors.append(color_name)
-                
-            self.face_colors.append(row_colors)
+            row = color_names[i * self.grid_size:(i + 1) * self.grid_size]
+            face_colors.append([color_name for color_name in row if color_name])
+        # Publish in one assignment so other threads never see a partial face
+        self.face_colors = face_colors
+        return boxes, color_names, detected
+    
+    def draw_overlay(self, image, boxes, color_names, detected, scale=(1.0, 1.0)):
+        """Draw the grid, labels and status text onto image in place
+        
+        scale maps frame coordinates to image coordinates when the image is
+        a resized copy of the analyzed frame.
+        """
+        height = image.shape[0]
+        scale_x, scale_y = scale
+        if self.detect_cube and not detected:
+            cv2.putText(image, "No cube detected - fill the grid", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        
+        # Process each cell in the grid
+        for (x1, y1, x2, y2), color_name in zip(boxes, color_names):
+            x1, x2 = int(x1 * scale_x), int(x2 * scale_x)
+            y1, y2 = int(y1 * scale_y), int(y2 * scale_y)
+            
+            # Draw cell rectangle
+            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            
+            # Add text label
+            if color_name:
+                cv2.putText(image, color_name, (x1 + 10, y1 + 30),
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
         
         # Add face counter and instructions
-        cv2.putText(grid_frame, f"Face {self.current_face + 1}/6", 
+        cv2.putText(image, f"Face {self.current_face + 1}/6 ({FACES[self.current_face]})", 
                    (10, height - 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
         
         # If we have a solution, display it
+        future = self.solve_future
+        if future is not None and future.best is not None:
+            self.solution_path = future.best
         if self.solution_path:
             solution_text = " ".join(self.solution_path)
-            cv2.putText(grid_frame, f"Solution: {solution_text}", 
+            searching = " ..." if future is not None and future.running() else ""
+            cv2.putText(image, f"Solution ({len(self.solution_path)}): {solution_text}{searching}", 
                        (10, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        elif future is not None and future.running():
+            cv2.putText(image, "Solving...", (10, height - 20),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        
+        # Sampled square and sample count while calibrating
+        if self.calibrating:
+            center_x, center_y = image.shape[1] // 2, image.shape[0] // 2
+            half_x, half_y = int(CALIBRATION_PATCH * scale_x / 2), int(CALIBRATION_PATCH * scale_y / 2)
+            x1, y1, x2, y2 = center_x - half_x, center_y - half_y, center_x + half_x, center_y + half_y
+            cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 255), 2)
+            cv2.putText(image, f"Calibrating {self.calibrating}: {self.calibration_samples} samples",
+                       (x1 - 60, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 255), 2)
         
+        # Optional FPS and p50/p95 stage latencies, top right
+        lines = [line for label, timer in self.timing_overlay
+                 for line in timer.overlay_lines(label)]
+        for k, line in enumerate(lines):
+            cv2.putText(image, line, (image.shape[1] - 230, 20 + 18 * k),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+    
+    def process_frame(self, frame):
+        """Process a video frame to detect cube faces
+        
+        In pooled mode the returned image is a reused buffer, valid until
+        the next call.
+        """
+        start = time.perf_counter()
+        analysis = self.analyze_frame(frame)
+        
+        # Create grid overlay
+        with self.timer.stage('overlay'):
+            if self.pooled:
+                grid_frame = self.buffers.get('overlay', frame.shape)
+                np.copyto(grid_frame, frame)
+            else:
+                grid_frame = frame.copy()
+            self.draw_overlay(grid_frame, *analysis)
+        
+        self.last_frame_time = time.perf_counter() - start
+        self.timer.record('total', self.last_frame_time)
+        self.timer.tick()
         return grid_frame
     
+    def render_frame(self, frame, out):
+        """Process a frame and draw the result into the preallocated BGR image out
+        
+        The frame is resized straight into out and the overlay is drawn onto
+        it in place, so displaying a frame allocates no full-size images.
+        """
+        start = time.perf_counter()
+        analysis = self.analyze_frame(frame)
+        height, width = frame.shape[:2]
+        out_height, out_width = out.shape[:2]
+        with self.timer.stage('resize'):
+            if (out_height, out_width) == (height, width):
+                np.copyto(out, frame)
+            else:
+                cv2.resize(frame, (out_width, out_height), dst=out,
+                           interpolation=cv2.INTER_LINEAR)
+        with self.timer.stage('overlay'):
+            self.draw_overlay(out, *analysis, scale=(out_width / width, out_height / height))
+        self.last_frame_time = time.perf_counter() - start
+        self.timer.record('total', self.last_frame_time)
+        self.timer.tick()
+        return out
+    
     def capture_face(self):
         """Capture the current face colors and update cube state"""
+        if self.auto_label:
+            return self._capture_values()
         if len(self.face_colors) == self.grid_size:
-            face_num = self.color_trainer.update_cube_state(self.face_colors)
+            try:
+                face_num = self.color_trainer.update_cube_state(self.face_colors)
+            except CubeStateError as e:
+                return False, f"Face rejected, please rescan it. {e}"
             if face_num == 6:  # All faces captured
-                self.solution_path = self.color_trainer.get_solution_path()
+                try:
+                    validate_faces(self.color_trainer.current_cube_state)
+                except CubeStateError as e:
+                    self.current_face = face_num
+                    return False, f"Impossible cube, please reset and rescan. {e}"
                 self.current_face = 0
-                return True, "All faces captured. Solution found!"
+                return self._solve_captured()
             elif face_num > 0:
                 self.current_face = face_num
-                return True, f"Face {face_num} captured. Please show face {face_num + 1}"
+                return True, f"Face {face_num} captured. Please show face {face_num + 1} ({FACES[face_num]})"
         return False, "Invalid face detection"
     
     def reset_capture(self):
         """Reset the face capture process"""
         self.current_face = 0
-        self.solution_path = None
+        self.cancel_solve()
         self.color_trainer.current_cube_state = None
+        self.captured_values = []
         return "Capture reset. Please start with face 1"
 
-    def calibrate_color(self, frame, color_name):
-        """Calibrate a new color sample from the center of the frame"""
+    def _capture_values(self):
+        """Keep the sticker values of the current face; label all 54 after the sixth"""
+        values = self.cell_values
+        if values is None or len(values) != self.grid_size * self.grid_size:
+            return False, "Invalid face detection"
+        if len(self.captured_values) == 6:
+            return False, "All faces already captured, please reset"
+        self.captured_values.append(values.copy())
+        face_num = len(self.captured_values)
+        if face_num < 6:
+            self.current_face = face_num
+            return True, f"Face {face_num} captured. Please show face {face_num + 1} ({FACES[face_num]})"
+        state = label_stickers(np.concatenate(self.captured_values))
+        faces = cube_model.faces_from_facelets(state)
+        try:
+            validate_faces(faces)
+        except CubeStateError as e:
+            self.current_face = face_num
+            return False, f"Impossible cube, please reset and rescan. {e}"
+        self.color_trainer.current_cube_state = faces
+        self.current_face = 0
+        return self._solve_captured()
+
+    def _solve_captured(self):
+        """Solve the six captured faces, in the background if enabled"""
+        if self.background_solver is None:
+            self.solution_path = self.color_trainer.get_solution_path()
+            return True, "All faces captured. Solution found!"
+        self.cancel_solve()
+        state = validate_faces(self.color_trainer.current_cube_state)
+        self.solve_future = self.background_solver.submit(state)
+        return True, "All faces captured. Solving..."
+
+    def cancel_solve(self):
+        """Abort the background solve in flight, if any"""
+        if self.solve_future is not None:
+            self.solve_future.cancel()
+            self.solve_future = None
+        self.solution_path = None
+
+    def close(self):
+        """Stop the background solver's worker and the solver's process pool"""
+        self.cancel_solve()
+        if self.background_solver is not None:
+            self.background_solver.close()
+        self.color_trainer.solver.close()
+
+    def _calibration_box(self, frame):
+        """Rectangle (x1, y1, x2, y2) of the calibration square at the frame center"""
         height, width = frame.shape[:2]
         center_x = width // 2
         center_y = height // 2
-        sample_size = 50
+        return (center_x - CALIBRATION_PATCH // 2, center_y - CALIBRATION_PATCH // 2,
+                center_x + CALIBRATION_PATCH // 2, center_y + CALIBRATION_PATCH // 2)
+    
+    def start_calibration(self, color_name, reset=True):
+        """Stream samples of color_name from the center of every frame until stopped
         
-        # Extract center region
-        x1 = center_x - sample_size // 2
-        y1 = center_y - sample_size // 2
-        x2 = center_x + sample_size // 2
-        y2 = center_y + sample_size // 2
+        reset drops the color's earlier samples, for recalibrating it under
+        new lighting.
+        """
+        with self._calibration_lock:
+            if reset:
+                self.color_trainer.forget_color(color_name)
+            else:
+                # The model changes with every frame from here on
+                self.color_trainer.invalidate_lookup_table()
+            self.calibration_samples = 0
+            self.calibrating = color_name
+    
+    def stop_calibration(self, compile_lut=True):
+        """Stop streaming calibration and save the model
         
-        center_region = frame[y1:y2, x1:x2]
-        hsv_center = cv2.cvtColor(center_region, cv2.COLOR_BGR2HSV)
+        Returns the calibrated color and the number of samples taken.
+        """
+        with self._calibration_lock:
+            color_name, self.calibrating = self.calibrating, None
+            if color_name is not None:
+                self.color_trainer.train_model(compile_lut=compile_lut)
+            return color_name, self.calibration_samples
+    
+    def _calibration_hsv(self, frame):
+        """The calibration square converted to HSV in a pooled buffer"""
+        x1, y1, x2, y2 = self._calibration_box(frame)
+        region = frame[y1:y2, x1:x2]
+        return cv2.cvtColor(region, cv2.COLOR_BGR2HSV,
+                            dst=self.buffers.get('calibration', region.shape))
+    
+    def _stream_calibration_samples(self, frame):
+        # Copied out of the pooled buffer: the KNN trainer keeps the rows
+        samples = self._calibration_hsv(frame).reshape(-1, 3)[::CALIBRATION_STRIDE].copy()
+        with self._calibration_lock:
+            if self.calibrating:
+                self.color_trainer.add_training_samples(self.calibrating, samples)
+                self.calibration_samples += len(samples)
+    
+    def calibrate_color(self, frame, color_name):
+        """Calibrate a new color sample from the center of the frame"""
+        # Extract center region
+        hsv_center = self._calibration_hsv(frame)
         
-        # Get dominant color
-        dominant_color = get_dominant_color(hsv_center)
+        # Robust color of the square, as the stickers are read
+        sample = get_cell_colors(hsv_center, 1, statistic=self.cell_statistic)[0]
         
         # Add to training data
-        self.color_trainer.add_training_sample(color_name, dominant_color)
+        self.color_trainer.add_training_sample(color_name, sample)
         
         return True
\ No newline at end of file
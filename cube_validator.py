@@ -0,0 +1,180 @@
+import cube_model
+
+# Cube state validation
+#
+# Scanned states are checked before they reach a solver, which would
+# otherwise search until its time budget runs out on an impossible cube.
+# Faces are checked as they are captured (complete, distinct centers, at
+# most nine stickers of a color) and a complete state is checked for color
+# counts, real corner and edge color sets, duplicate pieces, corner twist,
+# edge flip and permutation parity. Errors name the suspect stickers as in
+# the net of cube_model (U0 ... B8). Pieces are looked up in the tables of
+# cube_model, so a check takes tens of microseconds.
+
+CORNER_NAMES = ('URF', 'UFL', 'ULB', 'UBR', 'DFR', 'DLF', 'DBL', 'DRB')
+EDGE_NAMES = ('UR', 'UF', 'UL', 'UB', 'DR', 'DF', 'DL', 'DB', 'FR', 'FL', 'BL', 'BR')
+
+def sticker_name(index):
+    return f"{cube_model.FACES[index // 9]}{index % 9}"
+
+class CubeStateError(ValueError):
+    """An impossible cube state; stickers lists the suspect facelet indices"""
+
+    def __init__(self, message, stickers=()):
+        self.stickers = sorted(stickers)
+        if self.stickers:
+            message += ": " + " ".join(sticker_name(i) for i in self.stickers)
+        super().__init__(message)
+
+_OPPOSITE = [(face + 3) % 6 for face in range(6)]
+
+def _find_corner(colors):
+    """(piece, orientation) of a corner's colors read clockwise, or None
+
+    Orientation k means facelet k shows the U/D color, as in cube_model.
+    """
+    for ori in range(3):
+        piece = cube_model._CORNER_LOOKUP.get(colors[ori:] + colors[:ori])
+        if piece is not None:
+            return piece, ori
+    return None
+
+def _find_edge(colors):
+    """(piece, orientation) of an edge's two colors, or None"""
+    for ori in range(2):
+        piece = cube_model._EDGE_LOOKUP.get(colors[ori:] + colors[:ori])
+        if piece is not None:
+            return piece, ori
+    return None
+
+def _piece_problem(colors):
+    """Why the colors of one corner or edge cannot belong to a real piece"""
+    for a in colors:
+        if colors.count(a) > 1:
+            return f"shows the {cube_model.FACES[a]} color twice"
+        if _OPPOSITE[a] in colors:
+            return (f"shows the opposite colors {cube_model.FACES[a]} and "
+                    f"{cube_model.FACES[_OPPOSITE[a]]}")
+    # Only left for corners: three adjacent colors in mirror-image order
+    return "has its colors in mirrored order"
+
+def _bad_piece_facelets(state):
+    """Facelets of the corners and edges whose colors match no real piece"""
+    bad = set()
+    for facelets in cube_model.CORNER_FACELETS:
+        if _find_corner(tuple(state[f] for f in facelets)) is None:
+            bad.update(facelets)
+    for facelets in cube_model.EDGE_FACELETS:
+        if _find_edge(tuple(state[f] for f in facelets)) is None:
+            bad.update(facelets)
+    return bad
+
+def check_faces(faces):
+    """Check up to six scanned faces of color names in U, R, F, D, L, B order
+
+    Catches what a single face can show to be wrong: missing stickers, a
+    center color seen on an earlier face and more than nine stickers of a
+    color. Raises CubeStateError.
+    """
+    if len(faces) > 6:
+        raise CubeStateError("More than six faces")
+    for f, face in enumerate(faces):
+        if len(face) != 3 or any(len(row) != 3 for row in face):
+            raise CubeStateError(f"Face {cube_model.FACES[f]} is not 3x3")
+    missing = [f * 9 + r * 3 + c for f, face in enumerate(faces)
+               for r, row in enumerate(face) for c, color in enumerate(row) if color is None]
+    if missing:
+        raise CubeStateError("Unreadable stickers", missing)
+    centers = {}
+    for f, face in enumerate(faces):
+        color = face[1][1]
+        if color in centers:
+            raise CubeStateError(f"Faces {cube_model.FACES[centers[color]]} and "
+                                 f"{cube_model.FACES[f]} both have a {color} center",
+                                 [centers[color] * 9 + 4, f * 9 + 4])
+        centers[color] = f
+    stickers = {}
+    for f, face in enumerate(faces):
+        for r, row in enumerate(face):
+            for c, color in enumerate(row):
+                stickers.setdefault(color, []).append(f * 9 + r * 3 + c)
+    for color, indices in stickers.items():
+        if len(indices) > 9:
+            raise CubeStateError(f"{len(indices)} {color} stickers",
+                                 [i for i in indices if i % 9 != 4])
+
+def validate_faces(faces):
+    """Facelet state of six scanned faces, raising CubeStateError if it is impossible"""
+    check_faces(faces)
+    if len(faces) != 6:
+        raise CubeStateError(f"Expected six faces, got {len(faces)}")
+    centers = {face[1][1]: f for f, face in enumerate(faces)}
+    unknown = [f * 9 + r * 3 + c for f, face in enumerate(faces)
+               for r, row in enumerate(face) for c, color in enumerate(row) if color not in centers]
+    if unknown:
+        raise CubeStateError("Sticker colors that match no center", unknown)
+    state = cube_model.facelets_from_faces(faces)
+    validate_state(state)
+    return state
+
+def validate_state(state):
+    """Raise CubeStateError unless a facelet state is a solvable cube"""
+    state = state.tolist() if hasattr(state, 'tolist') else list(state)
+    if len(state) != 54 or any(not 0 <= c < 6 for c in state):
+        raise CubeStateError("Expected 54 facelets with colors 0-5")
+    centers = state[4::9]
+    if centers != list(range(6)):
+        raise CubeStateError("Center stickers are not the six faces in order",
+                             [f * 9 + 4 for f in range(6) if centers[f] != f])
+    counts = [0] * 6
+    for c in state:
+        counts[c] += 1
+    if counts != [9] * 6:
+        extra = [c for c in range(6) if counts[c] > 9]
+        description = ", ".join(f"{counts[c]} {cube_model.FACES[c]}" for c in range(6) if counts[c] != 9)
+        suspects = [i for i, c in enumerate(state) if c in extra and i % 9 != 4]
+        # Of the stickers with a surplus color, those on impossible pieces are the likely misreads
+        on_bad_pieces = [i for i in suspects if i in _bad_piece_facelets(state)]
+        raise CubeStateError(f"Every color needs nine stickers, found {description}",
+                             on_bad_pieces or suspects)
+
+    cp, co = [0] * 8, [0] * 8
+    for i, facelets in enumerate(cube_model.CORNER_FACELETS):
+        colors = (state[facelets[0]], state[facelets[1]], state[facelets[2]])
+        found = _find_corner(colors)
+        if found is None:
+            raise CubeStateError(f"Corner {CORNER_NAMES[i]} {_piece_problem(colors)}",
+                                 facelets)
+        cp[i], co[i] = found
+    ep, eo = [0] * 12, [0] * 12
+    for i, facelets in enumerate(cube_model.EDGE_FACELETS):
+        colors = (state[facelets[0]], state[facelets[1]])
+        found = _find_edge(colors)
+        if found is None:
+            raise CubeStateError(f"Edge {EDGE_NAMES[i]} {_piece_problem(colors)}",
+                                 facelets)
+        ep[i], eo[i] = found
+
+    for kind, perm, facelets, names in (('corner', cp, cube_model.CORNER_FACELETS, CORNER_NAMES),
+                                        ('edge', ep, cube_model.EDGE_FACELETS, EDGE_NAMES)):
+        positions = {}
+        for i, piece in enumerate(perm):
+            if piece in positions:
+                j = positions[piece]
+                raise CubeStateError(f"The {names[piece]} {kind} appears at both "
+                                     f"{names[j]} and {names[i]}", facelets[j] + facelets[i])
+            positions[piece] = i
+
+    twist = sum(co) % 3
+    if twist:
+        # Any corner could be the culprit; those out of place are listed
+        raise CubeStateError("Corner twist does not add up, a twisted or misread corner among",
+                             [f for i, facelets in enumerate(cube_model.CORNER_FACELETS)
+                              if co[i] for f in facelets])
+    if sum(eo) % 2:
+        raise CubeStateError("Edge flip does not add up, a flipped or misread edge among",
+                             [f for i, facelets in enumerate(cube_model.EDGE_FACELETS)
+                              if eo[i] for f in facelets])
+    if cube_model.permutation_parity(cp) != cube_model.permutation_parity(ep):
+        raise CubeStateError("Corner and edge permutation parities differ: "
+                             "two pieces are swapped or misread")
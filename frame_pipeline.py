@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+from PIL import Image
+from stage_timer import StageTimer
+
+class LatestFrameQueue:
+    """Bounded queue where new items push out the oldest ones
+
+    A slow consumer therefore always gets the freshest frame instead of
+    working through a backlog. Dropped items are counted.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        """Queue item; returns the item it pushed out, or None"""
+        with self._condition:
+            displaced = None
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+                displaced = self._items.popleft()
+            self._items.append(item)
+            self._condition.notify()
+            return displaced
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None if nothing arrives in time"""
+        with self._condition:
+            if not self._items:
+                self._condition.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def get_nowait(self):
+        with self._condition:
+            return self._items.popleft() if self._items else None
+
+class RateCounter:
+    """Events per second over a sliding window of recent events"""
+
+    def __init__(self, window=30):
+        self._times = deque(maxlen=window)
+
+    def tick(self):
+        self._times.append(time.perf_counter())
+
+    def rate(self):
+        if len(self._times) < 2:
+            return 0.0
+        elapsed = self._times[-1] - self._times[0]
+        return (len(self._times) - 1) / elapsed if elapsed > 0 else 0.0
+
+class DisplayBuffer:
+    """Preallocated display image, reused for every frame
+    
+    processor.render_frame draws into the BGR array, which is then
+    converted into an RGBA array whose memory the PIL image shares, so a
+    persistent ImageTk.PhotoImage can be updated with paste(buffer.image).
+    """
+    
+    def __init__(self, size=(640, 480)):
+        width, height = size
+        self.size = size
+        self.bgr = np.zeros((height, width, 3), dtype=np.uint8)
+        self.rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        self.image = Image.frombuffer('RGBA', size, self.rgba, 'raw', 'RGBA', 0, 1)
+    
+    def render(self, processor, frame):
+        processor.render_frame(frame, self.bgr)
+        with processor.timer.stage('convert'):
+            cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGBA, dst=self.rgba)
+        return self
+
+class FramePipeline:
+    """Camera reader and frame processor running off the Tk thread
+
+    The reader thread pulls frames from cap into a latest-frame-wins queue;
+    the processing thread renders the newest one into a free DisplayBuffer
+    and publishes it to a second such queue. The UI picks up the newest
+    finished buffer with latest_result() and hands it back with
+    release_result() once it has been shown.
+    """
+
+    def __init__(self, cap, processor, display_size=(640, 480), timer=None):
+        self.cap = cap
+        # Camera reads are timed as stage 'read' of this timer
+        self.timer = timer or StageTimer()
+        self.processor = processor
+        self.display_size = display_size
+        self.frames = LatestFrameQueue()
+        self.results = LatestFrameQueue()
+        # One buffer being rendered, one queued and one on screen
+        self.free_buffers = queue.Queue()
+        for _ in range(3):
+            self.free_buffers.put(DisplayBuffer(display_size))
+        self.capture_rate = RateCounter()
+        self.process_rate = RateCounter()
+        self.last_frame = None
+        self.process_time = 0.0
+        self._running = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._running.is_set():
+            return
+        self._running.set()
+        self._threads = [
+            threading.Thread(target=self._read_loop, name='camera-reader', daemon=True),
+            threading.Thread(target=self._process_loop, name='frame-processor', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running.clear()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def _read_loop(self):
+        while self._running.is_set():
+            with self.timer.stage('read'):
+                ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            self.last_frame = frame
+            self.capture_rate.tick()
+            self.frames.put(frame)
+
+    def _process_loop(self):
+        while self._running.is_set():
+            frame = self.frames.get(timeout=0.1)
+            if frame is None:
+                continue
+            try:
+                buffer = self.free_buffers.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            # Everything short of updating the PhotoImage happens here
+            buffer.render(self.processor, frame)
+            self.process_time = time.perf_counter() - start
+            self.process_rate.tick()
+            displaced = self.results.put(buffer)
+            if displaced is not None:
+                self.free_buffers.put(displaced)
+
+    def latest_result(self):
+        """Newest rendered DisplayBuffer not yet taken, or None"""
+        return self.results.get_nowait()
+
+    def release_result(self, buffer):
+        """Give a buffer from latest_result back once it has been displayed"""
+        self.free_buffers.put(buffer)
+
+    def stats(self):
+        return {
+            'capture_fps': self.capture_rate.rate(),
+            'process_fps': self.process_rate.rate(),
+            'process_ms': self.process_time * 1000,
+            'capture_drops': self.frames.dropped,
+            'display_drops': self.results.dropped,
+        }
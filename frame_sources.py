@@ -0,0 +1,423 @@
+import argparse
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+import cube_model
+
+# Frame sources
+#
+# Everything that produces frames follows the cv2.VideoCapture interface:
+# read() returns (ret, frame) and release() frees the source. Besides real
+# cameras and video files this covers image directories and synthetic
+# rendered cube faces, so scanning code can run without a camera.
+#
+# Any source can be recorded to disk and replayed. A recording holds raw
+# frames with their capture timestamps in chunks: a file header (magic,
+# frame shape) and then, per chunk, a frame count, the timestamps and the
+# frames. Replay memory-maps the file, so frames are served as views of the
+# page cache without decoding or copying, either at the recorded pace or
+# as fast as they are read.
+
+# BGR values used to render synthetic stickers
+STICKER_BGR = {
+    'white': (235, 235, 235), 'yellow': (0, 220, 240), 'red': (30, 30, 200),
+    'orange': (0, 130, 255), 'blue': (190, 70, 0), 'green': (60, 170, 0)
+}
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+RECORDING_EXTENSION = '.cfr'
+RECORDING_MAGIC = b'CUBIFRM1'
+# Magic, then height, width and channels of every frame
+RECORDING_HEADER = np.dtype([('magic', 'S8'), ('shape', '<u4', 3), ('reserved', '<u4')])
+CHUNK_HEADER = np.dtype([('count', '<u8'), ('reserved', '<u8')])
+# Replay pacing: as recorded, or every frame as soon as it is read
+PACINGS = ('realtime', 'fast')
+
+def render_cube_face(face, width=640, height=480, gap=8, noise=0, rng=None, side=None):
+    """Render a 3x3 face of color names filling the frame, like a held-up cube
+
+    The stickers line up with CubeProcessor's fixed 3x3 grid and are
+    separated by black gaps. With side, the face is instead a square of
+    that many pixels centered on a gray background, as CubeDetector finds
+    it. noise adds Gaussian pixel noise of that sigma.
+    """
+    if side is None:
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        top = left = 0
+        cell_height, cell_width = height // 3, width // 3
+    else:
+        frame = np.full((height, width, 3), 90, dtype=np.uint8)
+        top, left = (height - side) // 2, (width - side) // 2
+        frame[top:top + side, left:left + side] = 0
+        cell_height = cell_width = side // 3
+    for i, row in enumerate(face):
+        for j, color in enumerate(row):
+            frame[top + i * cell_height + gap:top + (i + 1) * cell_height - gap,
+                  left + j * cell_width + gap:left + (j + 1) * cell_width - gap] = STICKER_BGR[color]
+    if noise:
+        rng = rng or np.random.default_rng()
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+def random_cube_faces(seed=None, scramble_length=25):
+    """Six faces of color names of a randomly scrambled cube"""
+    rng = np.random.default_rng(seed)
+    moves = rng.integers(0, len(cube_model.MOVE_NAMES), scramble_length)
+    return cube_model.faces_from_facelets(cube_model.apply_moves(cube_model.SOLVED_STATE, moves))
+
+class SyntheticSource:
+    """Endless rendered frames that show the six faces of a cube in turn"""
+
+    def __init__(self, faces=None, seed=0, width=640, height=480, noise=6,
+                 frames_per_face=30, fps=30, side=None):
+        """fps paces read() like a camera; None delivers frames immediately
+
+        side renders the faces as squares of that size, see render_cube_face.
+        """
+        self.faces = faces if faces is not None else random_cube_faces(seed)
+        self.width, self.height = width, height
+        self.noise = noise
+        self.frames_per_face = frames_per_face
+        self.fps = fps
+        self.frame_index = 0
+        self._next_frame_time = time.monotonic()
+        self._rng = np.random.default_rng(seed)
+        self._rendered = [render_cube_face(face, width, height, side=side) for face in self.faces]
+
+    def read(self):
+        if self.fps:
+            delay = self._next_frame_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame_time = max(self._next_frame_time, time.monotonic()) + 1 / self.fps
+        face = (self.frame_index // self.frames_per_face) % len(self._rendered)
+        self.frame_index += 1
+        frame = self._rendered[face]
+        if self.noise:
+            frame = np.clip(frame + self._rng.normal(0, self.noise, frame.shape),
+                            0, 255).astype(np.uint8)
+        else:
+            frame = frame.copy()
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+class ImageDirectorySource:
+    """Frames read from the image files of a directory in name order"""
+
+    def __init__(self, path, loop=False):
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.loop = loop
+        self.index = 0
+
+    def read(self):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self.index = 0
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return frame is not None, frame
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def release(self):
+        pass
+
+def _chunk_padding(nbytes):
+    """Bytes that keep the next chunk header 8-byte aligned"""
+    return -nbytes % 8
+
+class FrameRecorder:
+    """A source whose frames are also written to a recording as they are read
+
+    With append, frames are added to an existing recording (after its last
+    complete chunk) with timestamps continuing from its last frame, so a
+    source reopened mid-session extends its recording instead of
+    replacing it.
+    """
+
+    def __init__(self, source, path, chunk_frames=30, append=False):
+        self.source = source
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.frames_written = 0
+        self._chunk = None
+        self._timestamps = np.zeros(chunk_frames, dtype='<f8')
+        self._count = 0
+        self._start = None
+        self._time_offset = 0.0
+        if append and os.path.exists(path) and os.path.getsize(path):
+            recording = RecordingSource(path, 'fast')
+            shape, end = recording.shape, recording.nbytes
+            if len(recording):
+                # Replay continues right after the last recorded frame
+                self._time_offset = float(recording.timestamps[-1]) + 1 / 30
+            recording.release()
+            del recording
+            self._file = open(path, 'r+b')
+            self._file.truncate(end)
+            self._file.seek(end)
+            self._chunk = np.empty((chunk_frames,) + shape, dtype=np.uint8)
+        else:
+            self._file = open(path, 'wb')
+
+    def read(self):
+        ret, frame = self.source.read()
+        if ret:
+            self.write(frame)
+        return ret, frame
+
+    def write(self, frame, timestamp=None):
+        """Append a frame, stamped with the time since the first one unless given"""
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        if frame.ndim == 2:
+            frame = frame[:, :, np.newaxis]
+        if self._chunk is None:
+            header = np.zeros((), dtype=RECORDING_HEADER)
+            header['magic'] = RECORDING_MAGIC
+            header['shape'] = frame.shape
+            self._file.write(header.tobytes())
+            # Frames are collected here and written a chunk at a time
+            self._chunk = np.empty((self.chunk_frames,) + frame.shape, dtype=np.uint8)
+        if frame.shape != self._chunk.shape[1:] or frame.dtype != np.uint8:
+            raise ValueError(f"Recording holds {self._chunk.shape[1:]} uint8 frames, "
+                             f"got {frame.shape} {frame.dtype}")
+        self._chunk[self._count] = frame
+        if timestamp is None:
+            timestamp = now - self._start + self._time_offset
+        self._timestamps[self._count] = timestamp
+        self._count += 1
+        self.frames_written += 1
+        if self._count == self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Write the frames collected so far as one chunk"""
+        if not self._count:
+            return
+        header = np.zeros((), dtype=CHUNK_HEADER)
+        header['count'] = self._count
+        self._file.write(header.tobytes())
+        self._file.write(self._timestamps[:self._count].tobytes())
+        frames = self._chunk[:self._count]
+        self._file.write(frames.data)
+        self._file.write(bytes(_chunk_padding(frames.nbytes)))
+        self._file.flush()
+        self._count = 0
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def release(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+        self.source.release()
+
+class RecordingSource:
+    """Frames replayed from a recording, at the recorded pace or as fast as read
+
+    Frames are read-only views of the memory-mapped file, valid until
+    release(). A recording cut short, e.g. by a crash, replays up to its
+    last complete chunk.
+    """
+
+    def __init__(self, path, pacing='realtime', loop=False):
+        if pacing not in PACINGS:
+            raise ValueError(f"Unknown pacing: {pacing}")
+        self.path = path
+        self.pacing = pacing
+        self.loop = loop
+        self.frame_index = 0
+        self._memory = np.memmap(path, dtype=np.uint8, mode='r')
+        header = np.frombuffer(self._memory, dtype=RECORDING_HEADER, count=1)[0]
+        if header['magic'] != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        self.shape = tuple(int(n) for n in header['shape'])
+        frame_bytes = int(np.prod(self.shape))
+        # Index of the chunks: frame views and timestamps without reading any pixels
+        self._chunks = []
+        timestamps = []
+        offset = self.nbytes = RECORDING_HEADER.itemsize
+        while offset + CHUNK_HEADER.itemsize <= len(self._memory):
+            count = int(np.frombuffer(self._memory, dtype=CHUNK_HEADER, count=1,
+                                      offset=offset)[0]['count'])
+            offset += CHUNK_HEADER.itemsize
+            end = offset + count * (8 + frame_bytes)
+            if end > len(self._memory):
+                break
+            timestamps.append(np.frombuffer(self._memory, dtype='<f8', count=count, offset=offset))
+            frames = self._memory[offset + count * 8:end].reshape((count,) + self.shape)
+            self._chunks.append(frames[..., 0] if self.shape[2] == 1 else frames)
+            offset = end + _chunk_padding(count * frame_bytes)
+            # Bytes up to the end of the last complete chunk
+            self.nbytes = min(offset, len(self._memory))
+        self.timestamps = np.concatenate(timestamps) if timestamps else np.zeros(0)
+        self._chunk_starts = np.cumsum([0] + [len(frames) for frames in self._chunks])
+        self._clock_start = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def duration(self):
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) else 0.0
+
+    def frame(self, index):
+        """Frame at an index, regardless of the replay position"""
+        chunk = int(np.searchsorted(self._chunk_starts, index, side='right')) - 1
+        return self._chunks[chunk][index - self._chunk_starts[chunk]]
+
+    def _advance(self):
+        """Index of the next frame, waiting for its time in realtime pacing; None at the end"""
+        if self.frame_index >= len(self):
+            if not self.loop or not len(self):
+                return None
+            self.frame_index = 0
+            self._clock_start = None
+        index = self.frame_index
+        self.frame_index += 1
+        if self.pacing == 'realtime':
+            now = time.monotonic()
+            if self._clock_start is None:
+                self._clock_start = now - self.timestamps[index]
+            delay = self._clock_start + self.timestamps[index] - now
+            if delay > 0:
+                time.sleep(delay)
+        return index
+
+    def grab(self):
+        return self._advance() is not None
+
+    def read(self):
+        index = self._advance()
+        if index is None:
+            return False, None
+        return True, self.frame(index)
+
+    def isOpened(self):
+        return self._memory is not None
+
+    def release(self):
+        self._chunks = []
+        self._memory = None
+
+def open_source(spec, pacing='realtime', record_to=None, append=False):
+    """Open a frame source from a spec
+
+    An int (or digit string) is a camera index, 'synthetic' or
+    'synthetic:<seed>' a SyntheticSource, a directory an
+    ImageDirectorySource, a .cfr file a RecordingSource replayed with the
+    given pacing and anything else a video file path. record_to wraps the
+    source in a FrameRecorder writing (or with append, appending) to that
+    path.
+    """
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        source = cv2.VideoCapture(int(spec))
+    elif spec == 'synthetic' or spec.startswith('synthetic:'):
+        seed = spec.partition(':')[2]
+        source = SyntheticSource(seed=int(seed) if seed else 0)
+    elif os.path.isdir(spec):
+        source = ImageDirectorySource(spec)
+    elif spec.lower().endswith(RECORDING_EXTENSION):
+        source = RecordingSource(spec, pacing)
+    else:
+        source = cv2.VideoCapture(spec)
+    if record_to is not None:
+        source = FrameRecorder(source, record_to, append=append)
+    return source
+
+def record(spec, path, frames=None, seconds=None):
+    """Record frames of a source until it ends or a frame or time limit is reached"""
+    recorder = FrameRecorder(open_source(spec), path)
+    start = time.monotonic()
+    try:
+        while frames is None or recorder.frames_written < frames:
+            if seconds is not None and time.monotonic() - start >= seconds:
+                break
+            ret, _ = recorder.read()
+            if not ret:
+                break
+    finally:
+        recorder.release()
+    return recorder.frames_written
+
+def replay(path, pacing='fast', pooled=True, detect_cube=False, incremental=False):
+    """Run a recording through a CubeProcessor with its stage timer enabled
+
+    Returns the timer summary, the frames processed and the wall time.
+    """
+    from cube_processor import CubeProcessor
+    from stage_timer import StageTimer
+    source = RecordingSource(path, pacing)
+    processor = CubeProcessor(pooled=pooled, detect_cube=detect_cube, incremental=incremental)
+    # Room for a sample of every frame
+    processor.timer = StageTimer(max(len(source), 2), enabled=True)
+    start = time.perf_counter()
+    frames = 0
+    try:
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            processor.process_frame(frame)
+            frames += 1
+    finally:
+        source.release()
+    return processor.timer.summary(), frames, time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record frame sources and replay recordings")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help="record a source to a .cfr file")
+    record_parser.add_argument('source', help="camera index, video, image directory or synthetic")
+    record_parser.add_argument('output')
+    record_parser.add_argument('--frames', type=int, help="stop after n frames")
+    record_parser.add_argument('--seconds', type=float, help="stop after n seconds")
+    info_parser = commands.add_parser('info', help="describe a recording")
+    info_parser.add_argument('recording')
+    replay_parser = commands.add_parser('replay', help="profile frame processing on a recording")
+    replay_parser.add_argument('recording')
+    replay_parser.add_argument('--pacing', choices=PACINGS, default='fast')
+    replay_parser.add_argument('--detect', action='store_true', help="locate the cube in the frame")
+    replay_parser.add_argument('--incremental', action='store_true',
+                               help="reclassify only the cells that changed")
+    replay_parser.add_argument('--unpooled', dest='pooled', action='store_false',
+                               help="allocate working images per frame")
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        if args.frames is None and args.seconds is None and not os.path.exists(args.source):
+            parser.error("a live source needs --frames or --seconds")
+        count = record(args.source, args.output, args.frames, args.seconds)
+        print(f"Recorded {count} frames to {args.output}")
+    elif args.command == 'info':
+        source = RecordingSource(args.recording)
+        rate = (len(source) - 1) / source.duration if source.duration else 0.0
+        print(json.dumps({'frames': len(source), 'shape': source.shape,
+                          'chunks': len(source._chunks), 'seconds': source.duration,
+                          'fps': rate, 'bytes': os.path.getsize(args.recording)}))
+        source.release()
+    else:
+        summary, frames, elapsed = replay(args.recording, args.pacing, args.pooled,
+                                          args.detect, args.incremental)
+        summary.update({'frames': frames, 'seconds': elapsed,
+                        'replay_fps': frames / elapsed if elapsed else 0.0})
+        print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import numpy as np
+
+# Incremental color model
+#
+# Every color is a Gaussian over HSV samples, kept as a running count, mean
+# and scatter matrix that absorb new samples in batches without revisiting
+# old ones. Hue is circular (red sits at both ends of OpenCV's 0-179
+# range), so samples are modelled in the cone coordinates
+# (s * cos(hue), s * sin(hue), v). A variance floor keeps colors with few
+# samples well-defined; with a single sample per color the model acts as a
+# nearest-centroid classifier. The model is saved as a small .npz file and
+# needs nothing beyond NumPy to load and predict.
+
+# Samples classified per chunk in predict, bounding temporary memory
+PREDICT_CHUNK = 65536
+
+def hsv_features(hsv_values):
+    """Cone coordinates of HSV values (OpenCV ranges), shape (n, 3)"""
+    hsv = np.asarray(hsv_values, dtype=np.float64).reshape(-1, 3)
+    angle = hsv[:, 0] * (np.pi / 90)
+    return np.stack([hsv[:, 1] * np.cos(angle), hsv[:, 1] * np.sin(angle), hsv[:, 2]], axis=1)
+
+class GaussianColorModel:
+    def __init__(self, variance_floor=25.0):
+        self.variance_floor = variance_floor
+        self.classes_ = []
+        self.counts = np.zeros(0)
+        self.means = np.zeros((0, 3))
+        self.scatters = np.zeros((0, 3, 3))
+        self._precisions = None
+        self._log_dets = None
+
+    def _class_index(self, name):
+        if name not in self.classes_:
+            self.classes_.append(name)
+            self.counts = np.append(self.counts, 0.0)
+            self.means = np.vstack([self.means, np.zeros((1, 3))])
+            self.scatters = np.concatenate([self.scatters, np.zeros((1, 3, 3))])
+        return self.classes_.index(name)
+
+    def partial_fit(self, hsv_values, labels):
+        """Add samples (HSV values with their color names) to the model"""
+        features = hsv_features(hsv_values)
+        labels = np.asarray(labels)
+        for name in np.unique(labels):
+            batch = features[labels == name]
+            k = self._class_index(str(name))
+            n_old, n_new = self.counts[k], len(batch)
+            batch_mean = batch.mean(axis=0)
+            deviations = batch - batch_mean
+            # Merge the batch's mean and scatter into the running ones
+            delta = batch_mean - self.means[k]
+            total = n_old + n_new
+            self.means[k] += delta * (n_new / total)
+            self.scatters[k] += deviations.T @ deviations + np.outer(delta, delta) * (n_old * n_new / total)
+            self.counts[k] = total
+        self._precisions = None
+        return self
+
+    def forget(self, name):
+        """Drop all samples of one color"""
+        if name in self.classes_:
+            k = self.classes_.index(name)
+            del self.classes_[k]
+            self.counts = np.delete(self.counts, k)
+            self.means = np.delete(self.means, k, axis=0)
+            self.scatters = np.delete(self.scatters, k, axis=0)
+            self._precisions = None
+
+    def covariances(self):
+        dof = np.maximum(self.counts - 1, 1)[:, np.newaxis, np.newaxis]
+        return self.scatters / dof + np.eye(3) * self.variance_floor
+
+    def _prepare(self):
+        covariances = self.covariances()
+        self._precisions = np.linalg.inv(covariances)
+        self._log_dets = np.linalg.slogdet(covariances)[1]
+
+    def predict(self, hsv_values):
+        """Most likely color name of every HSV value, in one vectorized pass"""
+        if not self.classes_:
+            raise ValueError("Color model has no samples")
+        if self._precisions is None:
+            self._prepare()
+        features = hsv_features(hsv_values)
+        best = np.empty(len(features), dtype=np.intp)
+        for start in range(0, len(features), PREDICT_CHUNK):
+            chunk = features[start:start + PREDICT_CHUNK]
+            deviations = chunk[:, np.newaxis, :] - self.means[np.newaxis]
+            # Negative log-likelihood up to a constant, equal priors
+            distances = np.einsum('nki,kij,nkj->nk', deviations, self._precisions, deviations)
+            best[start:start + PREDICT_CHUNK] = np.argmin(distances + self._log_dets, axis=1)
+        return np.array(self.classes_)[best]
+
+    def save(self, path):
+        np.savez(path, classes=np.array(self.classes_), counts=self.counts, means=self.means,
+                 scatters=self.scatters, variance_floor=self.variance_floor)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            model = cls(float(data['variance_floor']))
+            model.classes_ = [str(c) for c in data['classes']]
+            model.counts = data['counts']
+            model.means = data['means']
+            model.scatters = data['scatters']
+        return model
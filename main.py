@@ -1,15 +1,35 @@
+import time
+STARTUP_START = time.perf_counter()
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
-import cv2
+import json
+import threading
 from PIL import Image, ImageTk
-import time
-import os
 from datetime import datetime
-from cube_processor import CubeProcessor
+from solve_history import SolveHistory, format_time, open_database
+
+# OpenCV, NumPy and the scanning modules take a large share of startup, so
+# they are imported by load_vision_modules when the login page is up
+cv2 = None
+CubeProcessor = DisplayBuffer = FramePipeline = MultiSourceScanner = None
+StageTimer = dump_samples = frame_sources = SolutionCache = None
+
+def load_vision_modules():
+    """Import OpenCV and the scanning modules into this module's namespace"""
+    global cv2, CubeProcessor, DisplayBuffer, FramePipeline, MultiSourceScanner
+    global StageTimer, dump_samples, frame_sources, SolutionCache
+    import cv2
+    import frame_sources
+    from cube_processor import CubeProcessor
+    from frame_pipeline import DisplayBuffer, FramePipeline
+    from multi_camera import MultiSourceScanner
+    from solution_cache import SolutionCache
+    from stage_timer import StageTimer, dump_samples
 
 class CubifierApp:
-    def __init__(self, root):
+    def __init__(self, root, camera_source=0, replay_pacing='realtime', record_path=None):
         self.root = root
         self.root.title("Cubifier")
         self.root.geometry("800x800")
@@ -17,17 +37,123 @@ class CubifierApp:
         # Initialize instance variables
         self.timer_window = None
         self.cap = None
+        # Frame source of the solver view (a frame_sources.open_source spec:
+        # camera index, video, recording...), the pacing of replayed
+        # recordings and a file the camera frames are recorded to, if any;
+        # reopening the source appends to the recording started first
+        self.camera_source = camera_source
+        self.replay_pacing = replay_pacing
+        self.record_path = record_path
+        self.recording_started = False
         self.timer_running = False
         self.start_time = 0
         self.time_var = tk.StringVar(value="0:00.00")
+        self.timer_stats_var = tk.StringVar(value="")
+        # Refresh period of the running timer display; the solve time itself
+        # comes from perf_counter at start and stop
+        self.timer_refresh_ms = 30
+        self.db = None
+        self.solve_history = None
         self.logo_path = "Screenshot 2025-02-08 002811.png"  # Store path as class variable
         self.cube_processor = None
+        self.solution_cache = None
         self.video_label = None
+        # Persistent PhotoImage of the video label, updated in place with paste
+        self.video_photo = None
+        self.display_buffer = None
+        # Camera read and display timings; enabled with the timing overlay
+        self.stage_timer = None
+        self.show_timing = False
+        # Heavy modules and the color model load in the background after
+        # login, or when first needed if preloading is off
+        self.preload_after_login = True
+        self.preload_thread = None
+        self.preload_error = None
+        # Seconds from process start to startup milestones
+        self.startup_times = {}
+        # Calibrate from every frame until the color's button is pressed again
+        self.continuous_calibration = tk.BooleanVar(value=True)
+        # Label the 54 captured stickers together instead of using the color model
+        self.auto_label_colors = tk.BooleanVar(value=False)
+        # Capture and processing run on worker threads unless disabled
+        self.use_pipeline = True
+        self.pipeline = None
+        self.pipeline_stats_var = tk.StringVar(value="")
+        # Frame sources scanned side by side on the multi-camera page
+        self.multi_sources = [0, 1]
+        self.multi_scanner = None
+        self.multi_status_var = tk.StringVar(value="")
         
         # Initialize database and UI
         self.create_database()
         self.root.after(1, self.set_app_icon)
         self.show_login_page()
+        self.root.bind('<Map>', self._on_first_map, add='+')
+    
+    def mark_startup(self, milestone):
+        """Record the first time a startup milestone is reached"""
+        if milestone not in self.startup_times:
+            self.startup_times[milestone] = time.perf_counter() - STARTUP_START
+    
+    def _on_first_map(self, event):
+        if event.widget is self.root:
+            self.mark_startup('first_window')
+            self.root.unbind('<Map>')
+    
+    def report_startup(self):
+        """Print the startup milestones and append them to startup_times.jsonl"""
+        report = dict(self.startup_times, preloaded=self.preload_after_login,
+                      timestamp=datetime.now().isoformat(timespec='seconds'))
+        print("Startup: " + ", ".join(f"{name} {seconds:.3f} s"
+                                      for name, seconds in self.startup_times.items()))
+        try:
+            with open('startup_times.jsonl', 'a') as f:
+                f.write(json.dumps(report) + '\n')
+        except OSError:
+            pass
+    
+    def start_preload(self):
+        """Load the vision modules and color model on a background thread"""
+        if self.preload_thread is None and self.cube_processor is None:
+            self.preload_thread = threading.Thread(target=self._preload, name='preload',
+                                                   daemon=True)
+            self.preload_thread.start()
+    
+    def _preload(self):
+        try:
+            load_vision_modules()
+            self.mark_startup('modules_loaded')
+            self.cube_processor = self.new_cube_processor()
+            self.mark_startup('processor_ready')
+        except Exception as e:
+            self.preload_error = e
+    
+    def new_cube_processor(self):
+        """The solver view's processor, solving through the app's solution cache"""
+        if self.solution_cache is None:
+            self.solution_cache = SolutionCache()
+        return CubeProcessor(incremental=True, detect_cube=True, pooled=True,
+                             background_solve=True, solution_cache=self.solution_cache)
+    
+    def ensure_vision_loaded(self):
+        """Make the vision modules, color model and stage timer available
+        
+        Waits for a running preload, or loads everything now if none ran.
+        """
+        if self.preload_thread is not None:
+            self.preload_thread.join()
+            self.preload_thread = None
+            if self.preload_error is not None:
+                error, self.preload_error = self.preload_error, None
+                raise error
+        if cv2 is None:
+            load_vision_modules()
+            self.mark_startup('modules_loaded')
+        if self.cube_processor is None:
+            self.cube_processor = self.new_cube_processor()
+            self.mark_startup('processor_ready')
+        if self.stage_timer is None:
+            self.stage_timer = StageTimer()
         
 
 
@@ -48,11 +174,9 @@ class CubifierApp:
             return None
 
     def create_database(self):
-        with sqlite3.connect('cubifier.db') as conn:
-            c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS users
-                        (username TEXT PRIMARY KEY, password TEXT)''')
-            conn.commit()
+        # One connection for the whole session, shared with the solve history
+        self.db = open_database('cubifier.db')
+        self.solve_history = SolveHistory(self.db)
 
     def show_login_page(self):
         self.clear_window()
@@ -121,6 +245,7 @@ class CubifierApp:
         
         ttk.Button(nav_frame, text="Virtual Reality", command=self.show_vr_cube).pack(side='left', padx=10)
         ttk.Button(nav_frame, text="Cube Solver Assistant", command=self.show_cube_solver).pack(side='left', padx=10)
+        ttk.Button(nav_frame, text="Multi-Camera Scan", command=self.show_multi_scanner).pack(side='left', padx=10)
         ttk.Button(nav_frame, text="Timer", command=self.show_timer).pack(side='left', padx=10)
         ttk.Button(nav_frame, text="Logout", command=self.logout).pack(side='right', padx=10)
         #Music button
@@ -160,17 +285,19 @@ class CubifierApp:
                                command=self.show_home_page)
         back_button.pack(anchor='nw', pady=(0, 10))
         
+        # Modules and cube processor come from the preload, or load now
+        self.ensure_vision_loaded()
+        
         # Initialize video capture
+        self.stop_multi_scanner()
         if self.cap is None:
-            self.cap = cv2.VideoCapture(0)
-        
-        # Initialize cube processor if needed
-        if self.cube_processor is None:
-            self.cube_processor = CubeProcessor()
+            self.cap = self.open_camera()
         
         # Create video frame
         self.video_label = ttk.Label(solver_frame)
         self.video_label.pack(pady=10)
+        self.video_photo = None
+        ttk.Label(solver_frame, textvariable=self.pipeline_stats_var).pack()
         
         # Create control buttons
         control_frame = ttk.Frame(solver_frame)
@@ -188,6 +315,13 @@ class CubifierApp:
                                                                           column=i%3, 
                                                                           padx=5, 
                                                                           pady=5)
+        ttk.Checkbutton(calibration_frame, text="Continuous (press again to stop)",
+                       variable=self.continuous_calibration).grid(row=2, column=0,
+                                                                  columnspan=3, pady=5)
+        self.cube_processor.auto_label = self.auto_label_colors.get()
+        ttk.Checkbutton(calibration_frame, text="Auto-label colors (no calibration)",
+                       variable=self.auto_label_colors,
+                       command=self.toggle_auto_label).grid(row=3, column=0, columnspan=3, pady=5)
         
         # Training and control buttons
         button_frame = ttk.Frame(control_frame)
@@ -197,15 +331,90 @@ class CubifierApp:
                   command=self.train_color_model).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Reset Camera", 
                   command=self.reset_camera).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Timing Overlay", 
+                  command=self.toggle_timing_overlay).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Dump Timings", 
+                  command=self.dump_timings).pack(side='left', padx=5)
         
         # Start video update
+        if self.use_pipeline:
+            self.start_pipeline()
         self.update_video()
 
+    def show_multi_scanner(self):
+        self.clear_window()
+        
+        scanner_frame = ttk.Frame(self.root, padding="20")
+        scanner_frame.pack(fill='both', expand=True)
+        
+        ttk.Button(scanner_frame, text="Back to Home", 
+                  command=self.show_home_page).pack(anchor='nw', pady=(0, 10))
+        
+        self.ensure_vision_loaded()
+        
+        # The scanner opens the cameras itself, so free the single camera
+        self.stop_pipeline()
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        
+        self.stop_multi_scanner()
+        self.multi_scanner = MultiSourceScanner(self.multi_sources)
+        try:
+            self.multi_scanner.start()
+        except RuntimeError as e:
+            self.stop_multi_scanner()
+            messagebox.showerror("Error", str(e))
+            return
+        
+        self.multi_video_label = ttk.Label(scanner_frame)
+        self.multi_video_label.pack(pady=10)
+        ttk.Label(scanner_frame, textvariable=self.multi_status_var, 
+                 justify='left').pack(pady=5)
+        
+        button_frame = ttk.Frame(scanner_frame)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Capture All", 
+                  command=self.multi_scanner.capture_all).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Reset All", 
+                  command=self.multi_scanner.reset_all).pack(side='left', padx=5)
+        
+        self.update_multi_scanner()
+
+    def update_multi_scanner(self):
+        if self.multi_scanner is None:
+            return
+        if not self.multi_video_label.winfo_exists():
+            self.stop_multi_scanner()
+            return
+        
+        if self.multi_scanner.poll():
+            image = ImageTk.PhotoImage(Image.fromarray(
+                cv2.cvtColor(self.multi_scanner.tiled_frame(), cv2.COLOR_BGR2RGB)))
+            self.multi_video_label.configure(image=image)
+            self.multi_video_label.image = image
+        
+        lines = []
+        stats = self.multi_scanner.stats()
+        for source_id, spec in enumerate(self.multi_sources):
+            message = self.multi_scanner.messages.get(source_id)
+            status = message[1] if message else ""
+            lines.append(f"Source {spec}: {stats[source_id]['dropped']} frames dropped. {status}")
+        self.multi_status_var.set("\n".join(lines))
+        
+        self.root.after(15, self.update_multi_scanner)
+
+    def stop_multi_scanner(self):
+        if self.multi_scanner is not None:
+            self.multi_scanner.stop()
+            self.multi_scanner = None
+
     def show_timer(self):
         if self.timer_window is None or not self.timer_window.winfo_exists():
             self.timer_window = tk.Toplevel(self.root)
             self.timer_window.title("Cubifier Timer")
-            self.timer_window.geometry("300x150")
+            self.timer_window.geometry("420x190")
+            self.timer_window.protocol("WM_DELETE_WINDOW", self.close_timer)
             
             time_label = ttk.Label(self.timer_window, textvariable=self.time_var, 
                                  font=('Helvetica', 24))
@@ -215,68 +424,176 @@ class CubifierApp:
                                         text="Press SPACE to start/stop", 
                                         font=('Helvetica', 12))
             instruction_label.pack()
+
+            ttk.Label(self.timer_window, textvariable=self.timer_stats_var,
+                      font=('Helvetica', 10)).pack(pady=10)
+            self.timer_stats_var.set(self.solve_history.stats.summary())
             
             self.timer_window.bind('<space>', self.toggle_timer)
             self.timer_window.focus_set()
 
+    def start_pipeline(self):
+        self.stop_pipeline()
+        self.pipeline = FramePipeline(self.cap, self.cube_processor, timer=self.stage_timer)
+        self.pipeline.start()
+
+    def stop_pipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
     def update_video(self):
-        if self.cap is not None and self.video_label is not None:
-            ret, frame = self.cap.read()
+        if self.pipeline is not None and self.video_label is not None:
+            # Only blit the newest finished frame; all heavy work is off-thread
+            buffer = self.pipeline.latest_result()
+            if buffer is not None:
+                self.show_display_buffer(buffer)
+                self.pipeline.release_result(buffer)
+            stats = self.pipeline.stats()
+            self.pipeline_stats_var.set(
+                f"Capture {stats['capture_fps']:.1f} fps | "
+                f"Process {stats['process_fps']:.1f} fps ({stats['process_ms']:.0f} ms) | "
+                f"Dropped {stats['capture_drops']} captured, {stats['display_drops']} processed")
+        elif self.cap is not None and self.video_label is not None:
+            with self.stage_timer.stage('read'):
+                ret, frame = self.cap.read()
             if ret:
-                # Process frame
-                processed_frame = self.cube_processor.process_frame(frame)
-                
-                # Convert to PhotoImage
-                image = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-                image = Image.fromarray(image)
-                # Resize image to fit the window better
-                image = image.resize((640, 480), Image.LANCZOS)
-                image = ImageTk.PhotoImage(image)
-                
-                # Update label
-                self.video_label.configure(image=image)
-                self.video_label.image = image
+                # Process frame straight into the reused 640x480 display buffer
+                if self.display_buffer is None:
+                    self.display_buffer = DisplayBuffer((640, 480))
+                self.show_display_buffer(self.display_buffer.render(self.cube_processor, frame))
         
         # Schedule next update if video label still exists
         if self.video_label is not None and self.video_label.winfo_exists():
             self.root.after(10, self.update_video)
+        else:
+            self.stop_pipeline()
+
+    def show_display_buffer(self, buffer):
+        """Show a rendered DisplayBuffer, pasting into the label's persistent PhotoImage"""
+        with self.stage_timer.stage('display'):
+            if self.video_photo is None:
+                self.video_photo = ImageTk.PhotoImage(buffer.image)
+                self.video_label.configure(image=self.video_photo)
+            else:
+                self.video_photo.paste(buffer.image)
+        self.stage_timer.tick()
+        if 'first_video_frame' not in self.startup_times:
+            self.mark_startup('first_video_frame')
+            self.report_startup()
+
+    def toggle_timing_overlay(self):
+        """Turn stage timing and its FPS/latency overlay on or off"""
+        self.show_timing = not self.show_timing
+        self.stage_timer.enabled = self.show_timing
+        if self.cube_processor is not None:
+            self.cube_processor.timer.enabled = self.show_timing
+            self.cube_processor.timing_overlay = (
+                [('Process', self.cube_processor.timer), ('Display', self.stage_timer)]
+                if self.show_timing else [])
+
+    def dump_timings(self):
+        """Write the collected stage samples to timestamped CSV and JSON files"""
+        timers = {'app': self.stage_timer}
+        if self.cube_processor is not None:
+            timers['processor'] = self.cube_processor.timer
+        if not any(timer.rings for timer in timers.values()):
+            messagebox.showinfo("Timings", "No timings recorded. Turn on the timing overlay first.")
+            return
+        stem = f"timings_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        dump_samples(timers, stem + '.csv')
+        dump_samples(timers, stem + '.json')
+        messagebox.showinfo("Timings", f"Timings saved to {stem}.csv and {stem}.json")
 
     def calibrate_color(self, color_name):
-        if self.cap is not None:
+        if self.continuous_calibration.get():
+            self.toggle_stream_calibration(color_name)
+            return
+        if self.pipeline is not None:
+            # The reader thread owns the camera; use its latest frame
+            frame = self.pipeline.last_frame
+            ret = frame is not None
+        elif self.cap is not None:
             ret, frame = self.cap.read()
-            if ret:
-                self.cube_processor.calibrate_color(frame, color_name)
-                messagebox.showinfo("Calibration", 
-                                  f"{color_name.capitalize()} color calibrated successfully!")
+        else:
+            ret = False
+        if ret:
+            self.cube_processor.calibrate_color(frame, color_name)
+            messagebox.showinfo("Calibration", 
+                              f"{color_name.capitalize()} color calibrated successfully!")
+
+    def toggle_stream_calibration(self, color_name):
+        """Start streaming samples of a color, or stop and save the one running"""
+        if self.cube_processor.calibrating:
+            calibrated, samples = self.cube_processor.stop_calibration()
+            messagebox.showinfo("Calibration",
+                              f"{calibrated.capitalize()} calibrated from {samples} samples")
+            if calibrated == color_name:
+                return
+        self.cube_processor.start_calibration(color_name)
+
+    def toggle_auto_label(self):
+        self.cube_processor.auto_label = self.auto_label_colors.get()
+        self.cube_processor.reset_capture()
 
     def train_color_model(self):
-        if self.cube_processor.color_trainer.train_model():
+        if self.cube_processor.color_trainer.train_model(compile_lut=True):
             messagebox.showinfo("Training", "Color model trained successfully!")
         else:
             messagebox.showerror("Error", "No training data available!")
 
     def reset_camera(self):
+        restart_pipeline = self.pipeline is not None
+        self.stop_pipeline()
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        self.cap = self.open_camera()
+        if restart_pipeline:
+            self.start_pipeline()
+
+    def open_camera(self):
+        """Open the solver view's frame source, recording it if requested"""
+        source = frame_sources.open_source(self.camera_source, self.replay_pacing,
+                                           self.record_path, append=self.recording_started)
+        self.recording_started = self.record_path is not None
+        return source
+
+    def release_camera(self):
+        """Stop the pipeline and release the frame source, flushing a recording"""
+        self.stop_pipeline()
         if self.cap is not None:
             self.cap.release()
             self.cap = None
-        self.cap = cv2.VideoCapture(0)
 
     def toggle_timer(self, event):
         if not self.timer_running:
-            self.start_time = time.time()
+            self.start_time = time.perf_counter()
             self.timer_running = True
             self.update_timer()
         else:
+            elapsed = time.perf_counter() - self.start_time
             self.timer_running = False
+            self.time_var.set(format_time(elapsed))
+            self.record_solve(elapsed)
 
     def update_timer(self):
-        if self.timer_running and hasattr(self, 'timer_window') and self.timer_window.winfo_exists():
-            elapsed = time.time() - self.start_time
-            minutes = int(elapsed // 60)
-            seconds = int(elapsed % 60)
-            hundredths = int((elapsed * 100) % 100)
-            self.time_var.set(f"{minutes}:{seconds:02d}.{hundredths:02d}")
-            self.root.after(10, self.update_timer)
+        if self.timer_running and self.timer_window is not None and self.timer_window.winfo_exists():
+            self.time_var.set(format_time(time.perf_counter() - self.start_time))
+            self.root.after(self.timer_refresh_ms, self.update_timer)
+
+    def record_solve(self, seconds):
+        improved = self.solve_history.record(seconds)
+        summary = self.solve_history.stats.summary()
+        if improved:
+            summary += "\nNew best: " + ", ".join(improved)
+        self.timer_stats_var.set(summary)
+
+    def close_timer(self):
+        self.timer_running = False
+        self.solve_history.flush()
+        self.timer_window.destroy()
+        self.timer_window = None
 
     def login(self):
         username = self.username_entry.get()
@@ -286,14 +603,16 @@ class CubifierApp:
             messagebox.showerror("Error", "Please fill in all fields")
             return
             
-        with sqlite3.connect('cubifier.db') as conn:
-            c = conn.cursor()
-            c.execute("SELECT * FROM users WHERE username=? AND password=?", 
-                     (username, password))
-            if c.fetchone():
-                self.show_home_page()
-            else:
-                messagebox.showerror("Error", "Invalid username or password")
+        c = self.db.execute("SELECT * FROM users WHERE username=? AND password=?", 
+                            (username, password))
+        if c.fetchone():
+            self.solve_history.load_user(username)
+            self.mark_startup('login')
+            if self.preload_after_login:
+                self.start_preload()
+            self.show_home_page()
+        else:
+            messagebox.showerror("Error", "Invalid username or password")
 
     def signup(self):
         username = self.new_username_entry.get()
@@ -303,18 +622,18 @@ class CubifierApp:
             messagebox.showerror("Error", "Please fill in all fields")
             return
             
-        with sqlite3.connect('cubifier.db') as conn:
-            c = conn.cursor()
-            try:
-                c.execute("INSERT INTO users VALUES (?, ?)", (username, password))
-                conn.commit()
-                messagebox.showinfo("Success", "Account created successfully!")
-                self.show_login_page()
-            except sqlite3.IntegrityError:
-                messagebox.showerror("Error", "Username already exists")
+        try:
+            with self.db:
+                self.db.execute("INSERT INTO users VALUES (?, ?)", (username, password))
+            messagebox.showinfo("Success", "Account created successfully!")
+            self.show_login_page()
+        except sqlite3.IntegrityError:
+            messagebox.showerror("Error", "Username already exists")
 
     def logout(self):
         # Clean up resources
+        self.stop_pipeline()
+        self.stop_multi_scanner()
         if self.cap is not None:
             self.cap.release()
             self.cap = None
@@ -324,6 +643,7 @@ class CubifierApp:
             self.timer_window = None
         
         self.timer_running = False
+        self.solve_history.flush()
         self.show_login_page()
 
     def clear_window(self):
@@ -332,10 +652,33 @@ class CubifierApp:
 
     def __del__(self):
         # Cleanup when the application is closed
-        if self.cap is not None:
-            self.cap.release()
+        self.stop_multi_scanner()
+        self.release_camera()
+        if self.cube_processor is not None:
+            self.cube_processor.close()
+        if self.solution_cache is not None:
+            self.solution_cache.close()
+        if self.db is not None:
+            self.solve_history.flush()
+            self.db.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cubifier")
+    parser.add_argument('--source', default='0',
+                        help="camera index, video file, image directory, .cfr recording "
+                             "or synthetic (default: camera 0)")
+    parser.add_argument('--record', metavar='PATH',
+                        help="record the solver view's frames to a .cfr file")
+    parser.add_argument('--fast-replay', dest='replay_pacing', action='store_const',
+                        const='fast', default='realtime',
+                        help="replay a recording as fast as frames are processed")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
+    args = parse_args()
     root = tk.Tk()
-    app = CubifierApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = CubifierApp(root, args.source, args.replay_pacing, args.record)
+    root.mainloop()
+    # Frames and solves still buffered when the window was closed
+    app.release_camera()
+    app.solve_history.flush()
\ No newline at end of file
@@ -0,0 +1,201 @@
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+import frame_sources
+
+# Multi-source scanning
+#
+# Every source gets its own worker process holding a CubeProcessor, so
+# several cubes (or several views of one cube) are processed in parallel.
+# Frames travel through shared memory: each source has a small ring of
+# frame slots for camera frames and a matching ring for the processed
+# overlays, and only slot numbers and face colors go through the queues.
+
+SLOTS = 2
+
+def _worker_main(source_id, shape, input_name, output_name, tasks, results):
+    """Worker process: process frames from shared memory with a CubeProcessor"""
+    from cube_processor import CubeProcessor
+    processor = CubeProcessor(pooled=True)
+    input_memory = shared_memory.SharedMemory(name=input_name)
+    output_memory = shared_memory.SharedMemory(name=output_name)
+    inputs = np.ndarray((SLOTS,) + shape, dtype=np.uint8, buffer=input_memory.buf)
+    outputs = np.ndarray((SLOTS,) + shape, dtype=np.uint8, buffer=output_memory.buf)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            if task[0] == 'frame':
+                _, slot, sequence = task
+                start = time.perf_counter()
+                outputs[slot] = processor.process_frame(inputs[slot])
+                results.put(('frame', source_id, slot, sequence, processor.face_colors,
+                             time.perf_counter() - start))
+            elif task[0] == 'capture':
+                success, message = processor.capture_face()
+                results.put(('capture', source_id, success, message, processor.solution_path))
+            elif task[0] == 'reset':
+                results.put(('reset', source_id, True, processor.reset_capture(), None))
+    finally:
+        del inputs, outputs
+        input_memory.close()
+        output_memory.close()
+
+class _SourceChannel:
+    """Parent-side state of one source: camera, shared buffers and worker"""
+
+    def __init__(self, source_id, source, results):
+        self.source_id = source_id
+        self.source = source
+        ret, frame = source.read()
+        if not ret:
+            raise RuntimeError(f"Source {source_id} did not deliver a frame")
+        self.shape = frame.shape
+        size = SLOTS * frame.nbytes
+        self.input_memory = shared_memory.SharedMemory(create=True, size=size)
+        self.output_memory = shared_memory.SharedMemory(create=True, size=size)
+        self.inputs = np.ndarray((SLOTS,) + self.shape, dtype=np.uint8,
+                                 buffer=self.input_memory.buf)
+        self.outputs = np.ndarray((SLOTS,) + self.shape, dtype=np.uint8,
+                                  buffer=self.output_memory.buf)
+        self.free_slots = queue.Queue()
+        for slot in range(SLOTS):
+            self.free_slots.put(slot)
+        self.tasks = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_worker_main, name=f'cube-worker-{source_id}', daemon=True,
+            args=(source_id, self.shape, self.input_memory.name, self.output_memory.name,
+                  self.tasks, results))
+        self.sequence = 0
+        self.dropped = 0
+        self.pending_frame = frame
+
+    def submit(self, frame):
+        """Copy a frame into a free slot and hand it to the worker, or drop it"""
+        try:
+            slot = self.free_slots.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return
+        if frame.shape != self.shape:
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
+        self.inputs[slot] = frame
+        self.sequence += 1
+        self.tasks.put(('frame', slot, self.sequence))
+
+    def close(self):
+        self.tasks.put(None)
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.source.release()
+        del self.inputs, self.outputs
+        for memory in (self.input_memory, self.output_memory):
+            memory.close()
+            memory.unlink()
+
+class MultiSourceScanner:
+    """Scan cube faces from several frame sources at once
+
+    sources are specs for frame_sources.open_source (camera indices, video
+    files, image directories, 'synthetic:<seed>') or already opened
+    sources. Call poll() regularly to collect finished frames; latest maps
+    each source index to its newest overlay frame, face colors and timing,
+    and messages to the (success, message, solution) of its last command.
+    """
+
+    def __init__(self, sources):
+        self.source_specs = list(sources)
+        self.channels = []
+        self.latest = {}
+        self.messages = {}
+        self._results = multiprocessing.Queue()
+        self._running = threading.Event()
+        self._readers = []
+
+    def start(self):
+        for source_id, spec in enumerate(self.source_specs):
+            source = frame_sources.open_source(spec) if isinstance(spec, (int, str)) else spec
+            channel = _SourceChannel(source_id, source, self._results)
+            channel.process.start()
+            self.channels.append(channel)
+        self._running.set()
+        for channel in self.channels:
+            channel.submit(channel.pending_frame)
+            reader = threading.Thread(target=self._read_loop, args=(channel,),
+                                      name=f'source-reader-{channel.source_id}', daemon=True)
+            reader.start()
+            self._readers.append(reader)
+
+    def _read_loop(self, channel):
+        while self._running.is_set():
+            ret, frame = channel.source.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            channel.submit(frame)
+
+    def poll(self, timeout=0.0):
+        """Collect finished results; returns the ids of sources with new frames"""
+        updated = set()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                result = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return updated
+            kind, source_id = result[0], result[1]
+            channel = self.channels[source_id]
+            if kind == 'frame':
+                _, _, slot, sequence, face_colors, seconds = result
+                self.latest[source_id] = {
+                    'frame': channel.outputs[slot].copy(),
+                    'face_colors': face_colors,
+                    'sequence': sequence,
+                    'process_time': seconds,
+                }
+                channel.free_slots.put(slot)
+                updated.add(source_id)
+            else:
+                self.messages[source_id] = result[2:]
+            # Block only for the first result, then drain what is queued
+            deadline = time.monotonic()
+
+    def capture_all(self):
+        """Ask every worker to capture the face it currently sees"""
+        for channel in self.channels:
+            channel.tasks.put(('capture',))
+
+    def reset_all(self):
+        for channel in self.channels:
+            channel.tasks.put(('reset',))
+
+    def tiled_frame(self, tile_size=(320, 240)):
+        """All latest overlays side by side in one image, for display"""
+        columns = min(len(self.channels), 2) or 1
+        rows = (len(self.channels) + columns - 1) // columns
+        width, height = tile_size
+        canvas = np.zeros((rows * height, columns * width, 3), dtype=np.uint8)
+        for source_id, result in self.latest.items():
+            row, column = divmod(source_id, columns)
+            canvas[row * height:(row + 1) * height, column * width:(column + 1) * width] = \
+                cv2.resize(result['frame'], tile_size, interpolation=cv2.INTER_AREA)
+        return canvas
+
+    def stats(self):
+        return {channel.source_id: {'submitted': channel.sequence, 'dropped': channel.dropped}
+                for channel in self.channels}
+
+    def stop(self):
+        self._running.clear()
+        for reader in self._readers:
+            reader.join(timeout=1.0)
+        self._readers = []
+        for channel in self.channels:
+            channel.close()
+        self.channels = []
@@ -0,0 +1,381 @@
+import multiprocessing
+import os
+import time
+import numpy as np
+import cube_model
+import move_algebra
+import table_store
+import two_phase
+
+# Optimal solver
+#
+# IDA* in the face-turn metric, guided by the maximum of three pattern
+# databases: all corners (8! * 3^7 entries) and two groups of six edges
+# (12!/6! * 2^6 entries each). Every database stores the exact distance of
+# its sub-problem in 4 bits per entry, so the three of them take ~86 MB;
+# with the edge move tables stored next to them the file is ~147 MB.
+# They are generated once, stored with table_store and memory-mapped, which
+# lets every worker process share one read-only copy through the page cache.
+#
+# The top levels of the search tree are split into independent subtrees
+# that a multiprocessing pool explores in parallel; as soon as one worker
+# finds a solution at the current threshold the others are cancelled.
+# Being pure Python, the search is only practical for states up to roughly
+# 12-14 moves from solved; deeper states need far more nodes, so a solve
+# can be given a time budget after which it gives up. Workers are spawned
+# rather than forked, since the app's process runs Tk and camera threads.
+
+PDB_VERSION = 1
+PDB_PATH = f'optimal_pdb_v{PDB_VERSION}.bin'
+
+N_MOVES = two_phase.N_MOVES
+N_TWIST = two_phase.N_TWIST
+N_EDGE_PERM = 12 * 11 * 10 * 9 * 8 * 7  # Ordered positions of six edges
+N_EDGE_ORI = 64
+EDGE_GROUPS = (tuple(range(6)), tuple(range(6, 12)))
+
+UNVISITED = 15
+SPLIT_DEPTH = 2       # Tree levels expanded by the parent before dispatching
+CANCEL_INTERVAL = 4096  # Nodes between checks of the cancel flag
+
+# Edge group coordinates
+
+def encode_edge_positions(positions):
+    """Rank ordered positions of six distinct edges (one set per row)"""
+    positions = np.atleast_2d(positions)
+    index = np.zeros(len(positions), dtype=np.int64)
+    for i in range(6):
+        smaller = (positions[:, :i] < positions[:, i:i + 1]).sum(axis=1)
+        index = index * (12 - i) + positions[:, i] - smaller
+    return index
+
+def decode_edge_positions(index):
+    """Inverse of encode_edge_positions"""
+    index = np.asarray(index, dtype=np.int64)
+    digits = np.zeros((len(index), 6), dtype=np.int64)
+    for i in range(5, -1, -1):
+        index, digits[:, i] = np.divmod(index, 12 - i)
+    used = np.zeros((len(digits), 12), dtype=bool)
+    positions = np.zeros_like(digits)
+    rows = np.arange(len(digits))
+    for i in range(6):
+        free_rank = np.cumsum(~used, axis=1) - 1
+        positions[:, i] = np.argmax((free_rank == digits[:, i:i + 1]) & ~used, axis=1)
+        used[rows, positions[:, i]] = True
+    return positions
+
+def edge_group_coord(ep, eo, group):
+    """Combined position and orientation index of one edge group"""
+    ep, eo = list(ep), list(eo)
+    positions = [ep.index(edge) for edge in group]
+    orientation = 0
+    for position in positions:
+        orientation = orientation * 2 + eo[position]
+    return int(encode_edge_positions(positions)[0]) * N_EDGE_ORI + orientation
+
+def _edge_move_tables():
+    """Move tables for the position index and orientation bits of an edge group"""
+    positions = decode_edge_positions(np.arange(N_EDGE_PERM))
+    bit_values = 2 ** np.arange(5, -1, -1)
+    perm_move = np.zeros((N_EDGE_PERM, N_MOVES), dtype=np.int32)
+    flip_move = np.zeros((N_EDGE_PERM, N_MOVES), dtype=np.uint8)
+    for m in range(N_MOVES):
+        move_perm, move_ori = cube_model.MOVE_CUBIES[m][2:]
+        # The edge at position p moves to the position q with move_perm[q] == p
+        destination = np.argsort(move_perm)
+        new_positions = destination[positions]
+        perm_move[:, m] = encode_edge_positions(new_positions)
+        flip_move[:, m] = move_ori[new_positions] @ bit_values
+    return perm_move, flip_move
+
+# Pattern database generation
+
+def _breadth_first_distances(size, expand, start=0, chunk_size=1 << 18):
+    """Distance from start for every index of a coordinate space
+
+    expand maps an array of indices to an (n, 18) array of successors.
+    Frontiers are expanded in chunks to bound peak memory.
+    """
+    distance = np.full(size, UNVISITED, dtype=np.uint8)
+    distance[start] = 0
+    depth = 0
+    while True:
+        frontier = np.flatnonzero(distance == depth)
+        if not len(frontier):
+            return distance
+        for offset in range(0, len(frontier), chunk_size):
+            successors = expand(frontier[offset:offset + chunk_size]).ravel()
+            successors = successors[distance[successors] == UNVISITED]
+            distance[successors] = depth + 1
+        depth += 1
+
+def pack_nibbles(distance):
+    """Pack an array of values below 16 into 4 bits per entry"""
+    if len(distance) % 2:
+        distance = np.append(distance, UNVISITED).astype(np.uint8)
+    return (distance[0::2] | (distance[1::2] << 4)).astype(np.uint8)
+
+def build_pattern_databases():
+    """Generate the corner and edge pattern databases"""
+    moves = two_phase.load_tables()
+    corners_move = np.asarray(moves['corners_move'], dtype=np.int64)
+    twist_move = np.asarray(moves['twist_move'], dtype=np.int64)
+
+    def expand_corners(index):
+        corners, twist = np.divmod(index, N_TWIST)
+        return corners_move[corners] * N_TWIST + twist_move[twist]
+
+    corner_pdb = _breadth_first_distances(two_phase.N_CORNERS * N_TWIST, expand_corners)
+
+    perm_move, flip_move = _edge_move_tables()
+    tables = {
+        'corner_pdb': pack_nibbles(corner_pdb),
+        'edge_perm_move': perm_move,
+        'edge_flip_move': flip_move,
+    }
+    del corner_pdb
+    perm_move = perm_move.astype(np.int64)
+
+    def expand_edges(index):
+        perm, orientation = np.divmod(index, N_EDGE_ORI)
+        return perm_move[perm] * N_EDGE_ORI + (orientation[:, np.newaxis] ^ flip_move[perm])
+
+    for i, group in enumerate(EDGE_GROUPS):
+        goal = int(encode_edge_positions(list(group))[0]) * N_EDGE_ORI
+        distance = _breadth_first_distances(N_EDGE_PERM * N_EDGE_ORI, expand_edges, goal)
+        tables[f'edge_pdb_{i}'] = pack_nibbles(distance)
+    return tables
+
+def load_pattern_databases(path=PDB_PATH):
+    """Memory-map the pattern databases, generating and saving them on first use"""
+    tables = table_store.open_tables(path, PDB_VERSION)
+    if tables is None:
+        tables = build_pattern_databases()
+        try:
+            table_store.write_tables(path, tables, PDB_VERSION)
+        except OSError:
+            return tables
+        tables = table_store.open_tables(path, PDB_VERSION) or tables
+    return tables
+
+# Search
+
+class _Search:
+    """Depth-first search of one subtree, bounded by a cost threshold"""
+
+    def __init__(self, pdb_path, cancel_event=None):
+        moves = two_phase.load_tables()
+        pdbs = load_pattern_databases(pdb_path)
+        flat = lambda table: memoryview(np.ascontiguousarray(table).reshape(-1))
+        self._corners_move = flat(moves['corners_move'])
+        self._twist_move = flat(moves['twist_move'])
+        self._edge_perm_move = flat(pdbs['edge_perm_move'])
+        self._edge_flip_move = flat(pdbs['edge_flip_move'])
+        self._corner_pdb = flat(pdbs['corner_pdb'])
+        self._edge_pdbs = [flat(pdbs['edge_pdb_0']), flat(pdbs['edge_pdb_1'])]
+        self._cancel_event = cancel_event
+        # time.monotonic() after which the search gives up, if any
+        self.deadline = None
+        self.nodes = 0
+
+    def _stopped(self):
+        return ((self._cancel_event is not None and self._cancel_event.is_set())
+                or (self.deadline is not None and time.monotonic() > self.deadline))
+
+    def heuristic(self, coords):
+        corners, twist, edges_0, edges_1 = coords
+        index = corners * N_TWIST + twist
+        h = (self._corner_pdb[index >> 1] >> ((index & 1) << 2)) & 15
+        h_0 = (self._edge_pdbs[0][edges_0 >> 1] >> ((edges_0 & 1) << 2)) & 15
+        h_1 = (self._edge_pdbs[1][edges_1 >> 1] >> ((edges_1 & 1) << 2)) & 15
+        return max(h, h_0, h_1)
+
+    def apply_move(self, coords, m):
+        corners, twist, edges_0, edges_1 = coords
+        return (self._corners_move[corners * N_MOVES + m],
+                self._twist_move[twist * N_MOVES + m],
+                self._move_edges(edges_0, m), self._move_edges(edges_1, m))
+
+    def _move_edges(self, edges, m):
+        i = (edges >> 6) * N_MOVES + m
+        return (self._edge_perm_move[i] << 6) | ((edges & 63) ^ self._edge_flip_move[i])
+
+    def search(self, coords, prefix, threshold):
+        """Look for a solution of exactly threshold moves starting with prefix
+
+        Returns the solution as move indices, or None. Raises _Cancelled when
+        the shared cancel event is set or the deadline has passed.
+        """
+        self.nodes = 0
+        if self._stopped():
+            raise _Cancelled()
+        for m in prefix:
+            coords = self.apply_move(coords, m)
+        self._path = list(prefix)
+        if self._dfs(*coords, threshold - len(prefix)):
+            return list(self._path)
+        return None
+
+    def _dfs(self, corners, twist, edges_0, edges_1, togo):
+        self.nodes += 1
+        if self.nodes % CANCEL_INTERVAL == 0 and self._stopped():
+            raise _Cancelled()
+        # Inlined heuristic: the maximum of the three nibble-packed databases
+        index = corners * N_TWIST + twist
+        if (self._corner_pdb[index >> 1] >> ((index & 1) << 2)) & 15 > togo:
+            return False
+        edge_pdb_0, edge_pdb_1 = self._edge_pdbs
+        if (edge_pdb_0[edges_0 >> 1] >> ((edges_0 & 1) << 2)) & 15 > togo:
+            return False
+        if (edge_pdb_1[edges_1 >> 1] >> ((edges_1 & 1) << 2)) & 15 > togo:
+            return False
+        if togo == 0:
+            return True
+        corners_move, twist_move = self._corners_move, self._twist_move
+        edge_perm_move, edge_flip_move = self._edge_perm_move, self._edge_flip_move
+        path = self._path
+        corners_row, twist_row = corners * N_MOVES, twist * N_MOVES
+        edges_0_row, edges_1_row = (edges_0 >> 6) * N_MOVES, (edges_1 >> 6) * N_MOVES
+        orientation_0, orientation_1 = edges_0 & 63, edges_1 & 63
+        for m in move_algebra.ALLOWED_AFTER[path[-1] if path else move_algebra.NO_MOVE]:
+            path.append(m)
+            if self._dfs(corners_move[corners_row + m], twist_move[twist_row + m],
+                         (edge_perm_move[edges_0_row + m] << 6)
+                         | (orientation_0 ^ edge_flip_move[edges_0_row + m]),
+                         (edge_perm_move[edges_1_row + m] << 6)
+                         | (orientation_1 ^ edge_flip_move[edges_1_row + m]),
+                         togo - 1):
+                return True
+            path.pop()
+        return False
+
+class _Cancelled(Exception):
+    pass
+
+# Worker process state, set up once per process by the pool initializer
+_worker_search = None
+
+def _init_worker(pdb_path, cancel_event):
+    global _worker_search
+    _worker_search = _Search(pdb_path, cancel_event)
+
+def _search_subtree(task):
+    coords, prefix, threshold = task
+    start = time.perf_counter()
+    try:
+        solution = _worker_search.search(coords, prefix, threshold)
+    except _Cancelled:
+        solution = None
+    return solution, _worker_search.nodes, time.perf_counter() - start, os.getpid()
+
+def cube_coords(state):
+    """Corner and edge group coordinates of a facelet state"""
+    cubies = cube_model.to_cubies(state)
+    two_phase.check_solvable(cubies)
+    cp, co, ep, eo = cubies
+    return (int(two_phase.corners_coord(cp)[0]), int(two_phase.twist_coord(co)[0]),
+            edge_group_coord(ep, eo, EDGE_GROUPS[0]), edge_group_coord(ep, eo, EDGE_GROUPS[1]))
+
+class OptimalSolver:
+    def __init__(self, pdb_path=PDB_PATH, workers=None):
+        """workers is the pool size; 0 searches in the calling process"""
+        self.pdb_path = pdb_path
+        self.workers = os.cpu_count() if workers is None else workers
+        # Build the tables up front so workers only ever map them
+        self._search = _Search(pdb_path)
+        self._pool = None
+        self._cancel_event = None
+        self.worker_stats = {}
+
+    def _get_pool(self):
+        if self._pool is None:
+            context = multiprocessing.get_context('spawn')
+            self._cancel_event = context.Event()
+            self._pool = context.Pool(self.workers, initializer=_init_worker,
+                                      initargs=(self.pdb_path, self._cancel_event))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def solve(self, state, max_depth=20, timeout=None):
+        """Return a shortest solution as a list of move names
+
+        Returns None past max_depth, or when no solution was found within
+        timeout seconds. Raises ValueError for states that cannot be solved.
+        """
+        coords = cube_coords(state)
+        self.worker_stats = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._search.deadline = deadline
+        threshold = self._search.heuristic(coords)
+        try:
+            while threshold <= max_depth:
+                if self.workers and threshold > SPLIT_DEPTH:
+                    solution = self._parallel_search(coords, threshold, deadline)
+                else:
+                    start = time.perf_counter()
+                    solution = self._search.search(coords, [], threshold)
+                    self._record(os.getpid(), self._search.nodes, time.perf_counter() - start)
+                if solution is not None:
+                    return [cube_model.MOVE_NAMES[m] for m in solution]
+                threshold += 1
+        except _Cancelled:
+            pass
+        return None
+
+    def _parallel_search(self, coords, threshold, deadline=None):
+        """Search the subtrees on the pool; raises _Cancelled past the deadline"""
+        pool = self._get_pool()
+        self._cancel_event.clear()
+        tasks = [(coords, prefix, threshold) for prefix in self._prefixes(coords, threshold)]
+        solution = None
+        timed_out = False
+        results = pool.imap_unordered(_search_subtree, tasks)
+        while True:
+            remaining = None if deadline is None or timed_out else max(0.0, deadline - time.monotonic())
+            try:
+                result, nodes, seconds, pid = results.next(remaining)
+            except StopIteration:
+                break
+            except multiprocessing.TimeoutError:
+                # Workers notice the event within CANCEL_INTERVAL nodes
+                timed_out = True
+                self._cancel_event.set()
+                continue
+            self._record(pid, nodes, seconds)
+            if result is not None and solution is None:
+                solution = result
+                self._cancel_event.set()
+        if solution is None and timed_out:
+            raise _Cancelled()
+        return solution
+
+    def _prefixes(self, coords, threshold):
+        """Move sequences of SPLIT_DEPTH moves whose subtrees may hold a solution"""
+        prefixes = [([], coords)]
+        for depth in range(SPLIT_DEPTH):
+            expanded = []
+            for prefix, prefix_coords in prefixes:
+                last = prefix[-1] if prefix else move_algebra.NO_MOVE
+                for m in move_algebra.ALLOWED_AFTER[last]:
+                    new_coords = self._search.apply_move(prefix_coords, m)
+                    if depth + 1 + self._search.heuristic(new_coords) <= threshold:
+                        expanded.append((prefix + [m], new_coords))
+            prefixes = expanded
+        return [prefix for prefix, _ in prefixes]
+
+    def _record(self, pid, nodes, seconds):
+        stats = self.worker_stats.setdefault(pid, {'nodes': 0, 'seconds': 0.0})
+        stats['nodes'] += nodes
+        stats['seconds'] += seconds
+        stats['nodes_per_sec'] = stats['nodes'] / stats['seconds'] if stats['seconds'] else 0.0
+
+    def report(self):
+        """Human readable nodes/sec per worker for the last solve"""
+        return '\n'.join(f"worker {pid}: {stats['nodes']} nodes in {stats['seconds']:.2f}s "
+                         f"({stats['nodes_per_sec']:.0f} nodes/sec)"
+                         for pid, stats in sorted(self.worker_stats.items()))
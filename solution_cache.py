@@ -0,0 +1,147 @@
+import itertools
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+import cube_model
+
+# Solution cache
+#
+# A cube held in another orientation, or its mirror image, is the same
+# problem as the original: the state is a conjugate under one of the 48
+# symmetries of the cube, which move the stickers and, because facelets hold
+# the index of the face whose center they match, relabel the colors with the
+# faces. (Another color scheme needs nothing extra: facelets_from_faces
+# already names colors by their centers.) Solutions are stored under the
+# smallest of the 48 conjugates and mapped back through the symmetry that
+# produced it. Recent entries are kept in an LRU dictionary in front of an
+# SQLite table, so solutions survive restarts.
+
+SOLUTION_CACHE_PATH = 'solution_cache.db'
+
+def _build_symmetries():
+    """Facelet gathers, face maps and move maps of the 48 cube symmetries"""
+    stickers = []
+    for face in cube_model.FACES:
+        for row in range(3):
+            for col in range(3):
+                stickers.append((cube_model._facelet_position(face, row, col),
+                                 cube_model._FACE_NORMALS[face]))
+    sticker_index = {sticker: i for i, sticker in enumerate(stickers)}
+    face_index = {cube_model._FACE_NORMALS[face]: f for f, face in enumerate(cube_model.FACES)}
+
+    gathers, face_maps, move_maps = [], [], []
+    for axes in itertools.permutations(range(3)):
+        for signs in itertools.product((1, -1), repeat=3):
+            def transform(v):
+                return tuple(signs[i] * v[axes[i]] for i in range(3))
+            # Determinant of the signed permutation matrix: mirrors reverse turns
+            inversions = sum(axes[i] > axes[j] for i in range(3) for j in range(i + 1, 3))
+            mirror = (-1) ** inversions * signs[0] * signs[1] * signs[2] < 0
+            gather = np.zeros(54, dtype=np.intp)
+            for i, (position, normal) in enumerate(stickers):
+                gather[sticker_index[(transform(position), transform(normal))]] = i
+            face_map = np.array([face_index[transform(cube_model._FACE_NORMALS[face])]
+                                 for face in cube_model.FACES], dtype=np.uint8)
+            move_map = [face_map[m // 3] * 3 + (2 - m % 3 if mirror and m % 3 != 1 else m % 3)
+                        for m in range(len(cube_model.MOVE_NAMES))]
+            gathers.append(gather)
+            face_maps.append(face_map)
+            move_maps.append(move_map)
+    return np.array(gathers), np.array(face_maps), np.array(move_maps)
+
+SYM_GATHERS, SYM_FACE_MAPS, SYM_MOVE_MAPS = _build_symmetries()
+# Index of the symmetry undoing each one
+SYM_INVERSE = [next(j for j in range(48) if (SYM_GATHERS[i][SYM_GATHERS[j]] == np.arange(54)).all())
+               for i in range(48)]
+
+def conjugates(state):
+    """All 48 symmetric versions of a facelet state, shape (48, 54)"""
+    state = np.asarray(state, dtype=np.uint8)
+    return np.take_along_axis(SYM_FACE_MAPS, state[SYM_GATHERS].astype(np.intp), axis=1)
+
+def canonical_form(state):
+    """(key, symmetry) of the smallest conjugate of a state and the symmetry giving it"""
+    keys = [row.tobytes() for row in conjugates(state)]
+    sym = min(range(len(keys)), key=keys.__getitem__)
+    return keys[sym], sym
+
+def map_solution(moves, sym):
+    """A solution of a state mapped to the solution of its conjugate under sym"""
+    move_map = SYM_MOVE_MAPS[sym]
+    return [cube_model.MOVE_NAMES[move_map[m]] for m in cube_model.parse_moves(moves)]
+
+class SolutionCache:
+    def __init__(self, path=SOLUTION_CACHE_PATH, capacity=1024):
+        self.path = path
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        # Scanning may run on worker threads
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('''CREATE TABLE IF NOT EXISTS solutions
+                                        (mode TEXT NOT NULL, state BLOB NOT NULL, solution TEXT NOT NULL,
+                                         PRIMARY KEY (mode, state))''')
+            self._connection.commit()
+        return self._connection
+
+    def _remember(self, key, solution):
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, state, mode='two_phase'):
+        """Cached solution (move names) of a state or any symmetric one, or None"""
+        canonical, sym = canonical_form(state)
+        key = (mode, canonical)
+        with self._lock:
+            solution = self.entries.get(key)
+            if solution is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            elif self.path is not None:
+                row = self._db().execute('SELECT solution FROM solutions WHERE mode = ? AND state = ?',
+                                         key).fetchone()
+                if row is not None:
+                    solution = row[0].split()
+                    self._remember(key, solution)
+                    self.disk_hits += 1
+            if solution is None:
+                self.misses += 1
+                return None
+        return map_solution(solution, SYM_INVERSE[sym])
+
+    def put(self, state, solution, mode='two_phase'):
+        """Store the solution of a state under its canonical form"""
+        canonical, sym = canonical_form(state)
+        key = (mode, canonical)
+        solution = map_solution(solution, sym)
+        with self._lock:
+            self._remember(key, solution)
+            if self.path is not None:
+                with self._db() as db:
+                    db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)',
+                               (mode, canonical, ' '.join(solution)))
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.entries),
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,164 @@
+import bisect
+import math
+import sqlite3
+import time
+from collections import deque
+from datetime import datetime
+
+# Solve history
+#
+# Timer results are stored per user in SQLite through one long-lived
+# connection in WAL mode; new solves are buffered and inserted in batches.
+# Statistics are kept in memory and updated per solve: every rolling
+# average keeps its window both in arrival order and sorted, so adding a
+# solve costs O(window) at worst, however many solves are stored.
+
+DB_PATH = 'cubifier.db'
+# (name, window size, solves trimmed at each end), as in WCA averages
+AVERAGES = (('ao5', 5, 1), ('ao12', 12, 1), ('ao100', 100, 5))
+
+def open_database(path=DB_PATH):
+    """Open the app database in WAL mode, creating the tables"""
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    # With WAL, NORMAL only risks the last commits on power loss, not corruption
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute('''CREATE TABLE IF NOT EXISTS users
+                          (username TEXT PRIMARY KEY, password TEXT)''')
+    connection.execute('''CREATE TABLE IF NOT EXISTS solves
+                          (id INTEGER PRIMARY KEY, username TEXT NOT NULL,
+                           seconds REAL, scramble TEXT, solved_at TEXT NOT NULL)''')
+    connection.execute('CREATE INDEX IF NOT EXISTS solves_by_user ON solves (username, id)')
+    connection.commit()
+    return connection
+
+def format_time(seconds):
+    """m:ss.hh, 'DNF' for a DNF (inf) and '-' for a missing value"""
+    if seconds is None:
+        return '-'
+    if math.isinf(seconds):
+        return 'DNF'
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:05.2f}"
+
+class RollingAverage:
+    """Trimmed mean of the last size solves, DNFs (inf) counting as slowest"""
+
+    def __init__(self, size, trim):
+        self.size = size
+        self.trim = trim
+        self.window = deque()
+        self.sorted = []
+        self.finite_total = 0.0
+        self.dnfs = 0
+
+    def add(self, seconds):
+        self.window.append(seconds)
+        bisect.insort(self.sorted, seconds)
+        self._count(seconds, 1)
+        if len(self.window) > self.size:
+            oldest = self.window.popleft()
+            del self.sorted[bisect.bisect_left(self.sorted, oldest)]
+            self._count(oldest, -1)
+
+    def _count(self, seconds, sign):
+        if math.isinf(seconds):
+            self.dnfs += sign
+        else:
+            self.finite_total += sign * seconds
+
+    def value(self):
+        """Current average; None until the window is full, inf if it is a DNF"""
+        if len(self.window) < self.size:
+            return None
+        if self.dnfs > self.trim:
+            return math.inf
+        # DNFs sort last, so they are among the trimmed slowest solves
+        trimmed = sum(self.sorted[:self.trim])
+        trimmed += sum(s for s in self.sorted[self.size - self.trim:] if not math.isinf(s))
+        return (self.finite_total - trimmed) / (self.size - 2 * self.trim)
+
+class SolveStats:
+    """Running averages, personal bests and mean of one user's solves"""
+
+    def __init__(self):
+        self.averages = {name: RollingAverage(size, trim) for name, size, trim in AVERAGES}
+        self.bests = {'single': None}
+        self.bests.update({name: None for name in self.averages})
+        self.count = 0
+        self.finite_count = 0
+        self.finite_total = 0.0
+
+    def add(self, seconds):
+        """Add a solve (None for a DNF); returns the names of improved bests"""
+        seconds = math.inf if seconds is None else seconds
+        self.count += 1
+        if not math.isinf(seconds):
+            self.finite_count += 1
+            self.finite_total += seconds
+        improved = []
+        current = {'single': seconds}
+        for name, average in self.averages.items():
+            average.add(seconds)
+            current[name] = average.value()
+        for name, value in current.items():
+            if value is not None and not math.isinf(value):
+                if self.bests[name] is None or value < self.bests[name]:
+                    self.bests[name] = value
+                    improved.append(name)
+        return improved
+
+    def current(self, name):
+        return self.averages[name].value()
+
+    def mean(self):
+        return self.finite_total / self.finite_count if self.finite_count else None
+
+    def summary(self):
+        """One line of current averages and bests for display"""
+        parts = [f"Solves: {self.count}"]
+        for name in self.averages:
+            parts.append(f"{name}: {format_time(self.current(name))}")
+        parts.append(f"PB: {format_time(self.bests['single'])}")
+        return " | ".join(parts)
+
+class SolveHistory:
+    def __init__(self, connection, batch_size=10, flush_interval=30.0):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.username = None
+        self.stats = SolveStats()
+        self._last_flush = time.monotonic()
+
+    def load_user(self, username):
+        """Switch to a user and rebuild the statistics from their stored solves"""
+        self.flush()
+        self.username = username
+        self.stats = SolveStats()
+        rows = self.connection.execute(
+            'SELECT seconds FROM solves WHERE username = ? ORDER BY id', (username,))
+        for (seconds,) in rows:
+            self.stats.add(seconds)
+        return self.stats
+
+    def record(self, seconds, scramble=None):
+        """Add a solve of the current user (None for a DNF); returns the improved bests"""
+        improved = self.stats.add(seconds)
+        self.pending.append((self.username, seconds, scramble,
+                             datetime.now().isoformat(timespec='milliseconds')))
+        if (len(self.pending) >= self.batch_size
+                or time.monotonic() - self._last_flush > self.flush_interval):
+            self.flush()
+        return improved
+
+    def flush(self):
+        """Write buffered solves in one transaction"""
+        if self.pending:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT INTO solves (username, seconds, scramble, solved_at) '
+                    'VALUES (?, ?, ?, ?)', self.pending)
+            self.pending = []
+        self._last_flush = time.monotonic()
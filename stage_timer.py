@@ -0,0 +1,137 @@
+import csv
+import json
+import time
+import numpy as np
+
+# Per-stage timing
+#
+# A StageTimer keeps the most recent durations of every named stage in a
+# fixed-size ring buffer, plus the times of recent frames for FPS. While
+# disabled, stage() hands out one shared do-nothing context manager, so
+# instrumented code costs a method call per stage.
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    """Reusable context manager timing one stage into its ring buffer"""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.ring.append(time.perf_counter() - self.start)
+        return False
+
+class RingBuffer:
+    """Fixed-size buffer of floats that overwrites its oldest values"""
+
+    def __init__(self, capacity):
+        self.values = np.zeros(capacity)
+        self.count = 0
+
+    def append(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+
+    def samples(self):
+        """Stored values from oldest to newest"""
+        capacity = len(self.values)
+        if self.count <= capacity:
+            return self.values[:self.count].copy()
+        start = self.count % capacity
+        return np.concatenate([self.values[start:], self.values[:start]])
+
+class StageTimer:
+    def __init__(self, capacity=300, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.rings = {}
+        self.frame_times = RingBuffer(capacity)
+        self._stages = {}
+
+    def stage(self, name):
+        """Context manager timing the enclosed block as one sample of stage name"""
+        if not self.enabled:
+            return _NULL_STAGE
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(self.ring(name))
+        return stage
+
+    def ring(self, name):
+        if name not in self.rings:
+            self.rings[name] = RingBuffer(self.capacity)
+        return self.rings[name]
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.ring(name).append(seconds)
+
+    def tick(self):
+        """Mark the end of a frame, for the FPS figure"""
+        if self.enabled:
+            self.frame_times.append(time.perf_counter())
+
+    def fps(self):
+        times = self.frame_times.samples()
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def reset(self):
+        self.rings = {}
+        self._stages = {}
+        self.frame_times = RingBuffer(self.capacity)
+
+    def summary(self):
+        """Sample count, mean, p50 and p95 in milliseconds of every stage"""
+        stages = {}
+        for name, ring in self.rings.items():
+            samples = ring.samples() * 1000
+            if len(samples):
+                p50, p95 = np.percentile(samples, [50, 95])
+                stages[name] = {'n': len(samples), 'mean_ms': samples.mean(),
+                                'p50_ms': p50, 'p95_ms': p95}
+        return {'fps': self.fps(), 'stages': stages}
+
+    def overlay_lines(self, label):
+        """Short text lines for drawing the summary on a video frame"""
+        summary = self.summary()
+        lines = [f"{label}: {summary['fps']:.1f} fps"]
+        for name, stage in summary['stages'].items():
+            lines.append(f"  {name} {stage['p50_ms']:.1f}/{stage['p95_ms']:.1f} ms")
+        return lines
+
+def dump_samples(timers, path):
+    """Write the raw samples of named timers ({label: StageTimer}) to CSV or JSON
+
+    The format follows the file extension; JSON also holds the summaries.
+    """
+    if path.endswith('.json'):
+        data = {label: {'summary': timer.summary(),
+                        'samples': {name: ring.samples().tolist()
+                                    for name, ring in timer.rings.items()}}
+                for label, timer in timers.items()}
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+    else:
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['timer', 'stage', 'sample', 'seconds'])
+            for label, timer in timers.items():
+                for name, ring in timer.rings.items():
+                    for index, seconds in enumerate(ring.samples()):
+                        writer.writerow([label, name, index, f'{seconds:.9f}'])
+    return path
@@ -0,0 +1,68 @@
+import json
+import os
+import struct
+import numpy as np
+
+# Versioned binary container for precomputed solver tables
+#
+# Layout: 8-byte magic, uint32 format version, uint32 header length, a JSON
+# header describing every table (dtype, shape, byte offset from the start of
+# the data section), then the raw table data with the data section and every
+# table aligned to 64 bytes. Tables are read back as read-only np.memmap
+# views, so opening a file costs almost nothing and the pages are shared
+# between every process that maps it.
+
+MAGIC = b'CUBETBL\0'
+ALIGNMENT = 64
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def write_tables(path, tables, version):
+    """Write a dict of NumPy arrays to path, atomically replacing any old file"""
+    layout = {}
+    offset = 0
+    for name, array in tables.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape),
+                        'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'tables': layout}).encode()
+    data_start = _align(16 + len(header))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', version, len(header)) + header)
+        for name, array in tables.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp_path, path)
+
+def open_tables(path, version):
+    """Memory-map the tables stored in path
+
+    Returns a dict of read-only np.memmap arrays, or None when the file is
+    missing, damaged or written with a different version.
+    """
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(16)
+            if len(prefix) < 16 or prefix[:8] != MAGIC:
+                return None
+            file_version, header_length = struct.unpack('<II', prefix[8:])
+            if file_version != version:
+                return None
+            layout = json.loads(f.read(header_length))['tables']
+        data_start = _align(16 + header_length)
+        file_size = os.path.getsize(path)
+        tables = {}
+        for name, info in layout.items():
+            dtype = np.dtype(info['dtype'])
+            shape = tuple(info['shape'])
+            offset = data_start + info['offset']
+            if offset + dtype.itemsize * int(np.prod(shape)) > file_size:
+                return None
+            tables[name] = np.memmap(path, dtype=dtype, mode='r',
+                                     offset=offset, shape=shape)
+        return tables
+    except (OSError, ValueError, KeyError):
+        return None
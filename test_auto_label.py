@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from auto_label import CENTER_INDICES, label_stickers
+from conftest import random_states
+
+# HSV (OpenCV ranges) of the U, R, F, D, L and B colors
+FACE_HSV = np.array([(0, 20, 230), (178, 220, 180), (60, 220, 170),
+                     (30, 200, 220), (12, 220, 230), (110, 220, 180)])
+
+def _sticker_hsv(state, rng, spread=(2, 8, 8)):
+    # Sticker medians vary little in hue, more in saturation and value
+    hsv = FACE_HSV[state] + rng.normal(0, spread, (54, 3))
+    hsv[:, 0] %= 180
+    return np.clip(hsv, 0, 255)
+
+def _assert_nine_per_face(labels):
+    assert labels.shape == (54,)
+    assert (np.bincount(labels, minlength=6) == 9).all()
+    assert (labels[CENTER_INDICES] == np.arange(6)).all()
+
+def test_recovers_scrambled_cubes():
+    rng = np.random.default_rng(0)
+    for _, state in random_states(10, seed=8):
+        labels = label_stickers(_sticker_hsv(state, rng))
+        _assert_nine_per_face(labels)
+        assert (labels == state).all()
+
+def test_lighting_shift_between_faces():
+    rng = np.random.default_rng(1)
+    _, state = random_states(1, seed=9)[0]
+    hsv = _sticker_hsv(state, rng)
+    # Every face scanned under different brightness
+    hsv[:, 2] *= np.repeat(np.linspace(0.7, 1.1, 6), 9)
+    assert (label_stickers(hsv) == state).all()
+
+def test_always_nine_per_face_with_centers_pinned():
+    rng = np.random.default_rng(2)
+    for _ in range(5):
+        # Colors that fit no cube at all still get a valid labeling
+        hsv = rng.uniform(0, [180, 256, 256], (54, 3))
+        _assert_nine_per_face(label_stickers(hsv))
+    # Every sticker the same color as the U center
+    _assert_nine_per_face(label_stickers(np.tile(FACE_HSV[0], (54, 1))))
+
+def test_rejects_other_sticker_counts():
+    with pytest.raises(ValueError):
+        label_stickers(np.zeros((45, 3)))
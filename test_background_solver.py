@@ -0,0 +1,49 @@
+from concurrent.futures import CancelledError
+import pytest
+from background_solver import BackgroundSolver
+from solution_cache import SolutionCache
+from conftest import assert_solves, random_states, scrambled
+
+@pytest.fixture
+def background_solver(tables_dir):
+    solver = BackgroundSolver(target_length=0, timeout=0.5)
+    yield solver
+    solver.close()
+
+def test_result_solves_the_state(background_solver):
+    _, state = random_states(1, seed=8)[0]
+    future = background_solver.submit(state)
+    solution = future.result(timeout=60)
+    assert future.done() and future.updates >= 1
+    assert_solves(state, solution)
+
+def test_submit_cancels_the_solve_in_flight(background_solver):
+    (_, first), (_, second) = random_states(2, seed=9)
+    stale = background_solver.submit(first)
+    current = background_solver.submit(second)
+    assert stale.cancelled()
+    with pytest.raises(CancelledError):
+        stale.result(timeout=1)
+    assert_solves(second, current.result(timeout=60))
+
+def test_worker_uses_the_given_cache(tables_dir, tmp_path):
+    path = str(tmp_path / 'solutions.db')
+    state = scrambled("R U F' L2 D B'")
+    solver = BackgroundSolver(timeout=0.5, cache_path=path)
+    try:
+        assert_solves(state, solver.submit(state).result(timeout=60))
+    finally:
+        solver.close()
+    cache = SolutionCache(path)
+    assert_solves(state, cache.get(state))
+    cache.close()
+
+def test_optimal_mode_searches_in_the_worker(tables_dir):
+    state = scrambled("F2 L D' B R2")
+    solver = BackgroundSolver('optimal', timeout=60)
+    try:
+        solution = solver.submit(state).result(timeout=120)
+    finally:
+        solver.close()
+    assert len(solution) == 5
+    assert_solves(state, solution)
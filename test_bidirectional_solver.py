@@ -0,0 +1,43 @@
+import pytest
+from bidirectional_solver import BidirectionalSolver
+from color_trainer import CubeSolver
+from solution_cache import SolutionCache
+from conftest import assert_solves, random_states, scrambled
+
+SHORT_SCRAMBLES = ["R", "U2 F'", "R U R' U'", "F2 L D' B R2", "L' U2 B D F' R2 U"]
+
+@pytest.mark.parametrize('scramble', SHORT_SCRAMBLES)
+def test_finds_shortest_solutions(scramble):
+    state = scrambled(scramble)
+    solution = BidirectionalSolver().solve(state)
+    assert len(solution) == len(scramble.split())
+    assert_solves(state, solution)
+
+def test_gives_up_past_max_length():
+    state = scrambled("R U F' L2 D B'")
+    assert BidirectionalSolver().solve(state, max_length=4) is None
+
+def test_respects_state_budget():
+    _, state = random_states(1, seed=4)[0]
+    with pytest.raises(MemoryError):
+        BidirectionalSolver(max_states=10_000).solve(state)
+
+def test_fallback_is_cached_under_two_phase(two_phase_solver):
+    cache = SolutionCache(path=None)
+    solver = CubeSolver('bidirectional', cache=cache)
+    solver.two_phase_solver = two_phase_solver
+    solver.bidirectional_solver = BidirectionalSolver(max_states=10_000)
+    _, state = random_states(1, seed=4)[0]
+    solution = solver.find_solution(state)
+    assert_solves(state, solution)
+    # Past the state budget the two-phase solution is not a shortest one
+    assert cache.get(state, 'bidirectional') is None
+    assert cache.get(state, 'two_phase') == solution
+
+def test_shortest_solutions_are_cached():
+    cache = SolutionCache(path=None)
+    solver = CubeSolver('bidirectional', cache=cache)
+    state = scrambled("F2 L D' B R2")
+    solution = solver.find_solution(state)
+    assert len(solution) == 5
+    assert cache.get(state, 'bidirectional') == solution
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+import cube_model
+from color_trainer import LUT_SHAPE, LUT_UNKNOWN, CubeColorTrainer, CubeSolver, get_cell_colors
+from conftest import assert_solves, scrambled
+
+# Typical HSV values (OpenCV ranges) of the six sticker colors
+STICKER_HSV = {
+    'white': (0, 20, 230), 'yellow': (30, 200, 220), 'red': (178, 220, 180),
+    'orange': (12, 220, 230), 'blue': (110, 220, 180), 'green': (60, 220, 170),
+}
+
+def _samples(hsv, count, rng, spread=6):
+    return np.clip(rng.normal(hsv, spread, (count, 3)), 0, [179, 255, 255]).astype(int)
+
+def _trained(model_type='gaussian', seed=0):
+    trainer = CubeColorTrainer(model_type)
+    rng = np.random.default_rng(seed)
+    for name, hsv in STICKER_HSV.items():
+        trainer.add_training_samples(name, list(_samples(hsv, 40, rng)))
+    return trainer
+
+def _grid_image(cell_colors, cell_size=20):
+    """HSV image of a 3x3 grid of uniform cells"""
+    cells = np.asarray(cell_colors, dtype=np.uint8).reshape(3, 3, 3)
+    return np.repeat(np.repeat(cells, cell_size, axis=0), cell_size, axis=1)
+
+def test_cell_colors_in_row_major_order():
+    colors = np.arange(27).reshape(9, 3) * 5
+    for statistic in ('median', 'trimmed'):
+        assert (get_cell_colors(_grid_image(colors), statistic=statistic) == colors).all()
+
+def test_cell_colors_ignore_outliers():
+    rng = np.random.default_rng(0)
+    colors = rng.integers(20, 230, (9, 3))
+    image = _grid_image(colors)
+    # Specular highlights and dirt on a tenth of the pixels
+    mask = rng.random(image.shape[:2]) < 0.1
+    image[mask] = rng.integers(0, 256, (mask.sum(), 3))
+    for statistic in ('median', 'trimmed'):
+        assert np.abs(get_cell_colors(image, statistic=statistic) - colors).max() <= 3
+
+def test_cell_colors_match_per_cell_statistics():
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 256, (61, 95, 3), dtype=np.uint8)
+    median = get_cell_colors(image, step=1)
+    trimmed = get_cell_colors(image, statistic='trimmed', trim=0.25, step=1)
+    # The remainder rows and columns of an uneven frame are left out
+    for i in range(9):
+        row, col = divmod(i, 3)
+        cell = image[row * 20:(row + 1) * 20, col * 31:(col + 1) * 31].reshape(-1, 3)
+        assert (median[i] == np.median(cell, axis=0).astype(int)).all()
+        ordered = np.sort(cell, axis=0)
+        k = int(len(cell) * 0.25)
+        assert (trimmed[i] == ordered[k:len(cell) - k].mean(axis=0).astype(int)).all()
+
+def test_cell_colors_of_other_grid_sizes():
+    image = np.zeros((40, 40, 3), dtype=np.uint8)
+    image[20:, 20:] = 200
+    colors = get_cell_colors(image, grid_size=2)
+    assert colors.shape == (4, 3)
+    assert (colors[:3] == 0).all() and (colors[3] == 200).all()
+
+def test_unknown_statistic():
+    with pytest.raises(ValueError):
+        get_cell_colors(np.zeros((30, 30, 3), dtype=np.uint8), statistic='mode')
+
+@pytest.mark.parametrize('scramble', ["R", "U2 F'", "R U R' U'"])
+def test_ida_finds_shortest_solutions(scramble):
+    state = scrambled(scramble)
+    solution = CubeSolver('ida').find_solution(state)
+    assert len(solution) == len(scramble.split())
+    assert_solves(state, solution)
+
+def test_solver_accepts_scanned_faces():
+    state = scrambled("F2 L")
+    faces = cube_model.faces_from_facelets(state)
+    solver = CubeSolver('ida')
+    assert_solves(state, solver.find_solution(faces))
+    assert solver.find_solution(cube_model.SOLVED_STATE) == []
+
+def test_solver_rejects_unknown_modes():
+    with pytest.raises(ValueError):
+        CubeSolver('greedy')
+
+@pytest.mark.parametrize('model_type', ['gaussian', 'knn'])
+def test_lookup_table_matches_the_model(tmp_path, monkeypatch, model_type):
+    monkeypatch.chdir(tmp_path)
+    trainer = _trained(model_type)
+    assert trainer.train_model(compile_lut=True)
+    assert trainer.color_lut.shape == LUT_SHAPE
+    # Values at the bin centers are classified exactly as the model does
+    rng = np.random.default_rng(1)
+    hsv = np.stack([rng.integers(0, 180, 500), rng.integers(0, 64, 500) * 4 + 2,
+                    rng.integers(0, 64, 500) * 4 + 2], axis=1)
+    assert trainer.predict_colors(hsv) == list(trainer.color_model.predict(hsv))
+    for name, value in STICKER_HSV.items():
+        assert trainer.predict_color(value) == name
+
+def test_lookup_table_is_reloaded_with_its_model(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _trained().train_model(compile_lut=True)
+    trainer = CubeColorTrainer()
+    assert trainer.load_model() and trainer.color_lut is not None
+
+def test_lookup_table_of_another_model_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trainer = _trained()
+    trainer.train_model(compile_lut=True)
+    lut = (tmp_path / trainer.lut_path).read_bytes()
+    # Retrain without a table, then put the old table back
+    trainer.add_training_samples('red', list(_samples((0, 200, 150), 40, np.random.default_rng(2))))
+    trainer.train_model()
+    (tmp_path / trainer.lut_path).write_bytes(lut)
+    trainer = CubeColorTrainer()
+    assert trainer.load_model() and trainer.color_lut is None
+
+def test_forgetting_a_color_drops_the_table(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trainer = _trained()
+    trainer.train_model(compile_lut=True)
+    trainer.forget_color('red')
+    assert trainer.color_lut is None
+    assert not (tmp_path / trainer.lut_path).exists()
+    assert (trainer.classify_hsv(np.zeros((2, 2, 3))) == LUT_UNKNOWN).all()
+
+def test_streamed_samples_keep_the_table_until_training(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trainer = _trained()
+    trainer.train_model(compile_lut=True)
+    lut = trainer.color_lut
+    rng = np.random.default_rng(3)
+    for _ in range(5):
+        trainer.add_training_samples('red', list(_samples(STICKER_HSV['red'], 10, rng)))
+    # The table still matches the saved model
+    assert trainer.color_lut is lut and (tmp_path / trainer.lut_path).exists()
+    trainer.train_model()
+    assert trainer.color_lut is None and not (tmp_path / trainer.lut_path).exists()
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import cube_model
+from conftest import random_states, scrambled
+
+def test_quarter_turns_have_order_four():
+    for face in cube_model.FACES:
+        state = scrambled(face)
+        assert not cube_model.is_solved(state)
+        assert cube_model.is_solved(scrambled(' '.join([face] * 4)))
+
+def test_moves_and_their_inverses_cancel():
+    for scramble, state in random_states(5, seed=1):
+        inverse = [name[0] + {'': "'", '2': '2', "'": ''}[name[1:]]
+                   for name in reversed(scramble.split())]
+        assert cube_model.is_solved(cube_model.apply_moves(state, inverse))
+
+def test_sexy_move_has_order_six():
+    assert not cube_model.is_solved(scrambled("R U R' U'"))
+    assert cube_model.is_solved(scrambled(' '.join(["R U R' U'"] * 6)))
+
+def test_batch_moves_match_single_moves():
+    states = np.stack([state for _, state in random_states(4, seed=2)])
+    expanded = cube_model.expand_batch(states)
+    for m, name in enumerate(cube_model.MOVE_NAMES):
+        batch = cube_model.apply_move_batch(states, name)
+        for i, state in enumerate(states):
+            single = cube_model.apply_move(state, name)
+            assert (batch[i] == single).all() and (expanded[i, m] == single).all()
+
+def test_cubie_round_trip():
+    for _, state in random_states(10, seed=3):
+        assert (cube_model.from_cubies(*cube_model.to_cubies(state)) == state).all()
+
+def test_move_cubies_of_a_quarter_turn():
+    cp, co, ep, eo = cube_model.MOVE_CUBIES[cube_model.MOVE_INDEX['U']]
+    # U turns keep every orientation and cycle four corners and edges
+    assert not co.any() and not eo.any()
+    assert sorted(i for i in range(8) if cp[i] != i) == [0, 1, 2, 3]
+    assert sorted(i for i in range(12) if ep[i] != i) == [0, 1, 2, 3]
+
+def test_to_cubies_rejects_impossible_pieces():
+    state = cube_model.SOLVED_STATE.copy()
+    state[cube_model.CORNER_FACELETS[0][0]] = 3
+    with pytest.raises(ValueError):
+        cube_model.to_cubies(state)
+
+def test_permutation_parity():
+    assert cube_model.permutation_parity(list(range(8))) == 0
+    assert cube_model.permutation_parity([1, 0, 2, 3]) == 1
+    assert cube_model.permutation_parity([1, 2, 0, 3]) == 0
+
+def test_faces_round_trip():
+    state = scrambled("R U2 F' L D B2")
+    faces = cube_model.faces_from_facelets(state)
+    assert faces[0][1][1] == 'white'
+    assert (cube_model.facelets_from_faces(faces) == state).all()
+    # Any color scheme works: colors are named by their centers
+    scheme = ('a', 'b', 'c', 'd', 'e', 'f')
+    assert (cube_model.facelets_from_faces(cube_model.faces_from_facelets(state, scheme))
+            == state).all()
@@ -0,0 +1,139 @@
+import cv2
+import numpy as np
+from cube_processor import CellTracker, CubeProcessor
+from frame_sources import STICKER_BGR, SyntheticSource
+from gaussian_model import hsv_features
+
+def _grid_frame(colors, cell_size=16):
+    """BGR frame of a 3x3 grid of uniform cells"""
+    cells = np.asarray(colors, dtype=np.uint8).reshape(3, 3, 3)
+    return np.repeat(np.repeat(cells, cell_size, axis=0), cell_size, axis=1)
+
+class _Classifier:
+    """Labels cells by their first channel, recording which cells were asked for"""
+
+    def __init__(self, frame, cell_size=16):
+        self.frame = frame
+        self.cell_size = cell_size
+        self.calls = []
+
+    def __call__(self, indices):
+        self.calls.append(list(indices))
+        size = self.cell_size
+        return [f"c{self.frame[(i // 3) * size, (i % 3) * size, 0]}" for i in indices]
+
+def _update(tracker, colors):
+    frame = _grid_frame(colors)
+    classify = _Classifier(frame)
+    return tracker.update(frame, classify), classify.calls
+
+def test_first_frame_classifies_every_cell():
+    colors = [(i * 20, 50, 50) for i in range(9)]
+    labels, calls = _update(CellTracker(), colors)
+    assert calls == [list(range(9))]
+    assert labels == [f"c{i * 20}" for i in range(9)]
+
+def test_unchanged_cells_are_skipped():
+    tracker = CellTracker()
+    colors = [(i * 20, 50, 50) for i in range(9)]
+    _update(tracker, colors)
+    # Below the change threshold: nothing is reclassified
+    labels, calls = _update(tracker, [(c[0] + 3, 50, 50) for c in colors])
+    assert calls == [] and tracker.reclassified == 0
+    assert labels == [f"c{i * 20}" for i in range(9)]
+    colors[4] = (200, 200, 200)
+    labels, calls = _update(tracker, colors)
+    assert calls == [[4]] and tracker.reclassified == 1
+    assert labels[4] == "c200"
+
+def test_votes_smooth_flickering_labels():
+    tracker = CellTracker(history=5)
+    labels = []
+    # Every step is a change; readings past 130 are misread as another color
+    for value in (100, 112, 124, 136, 124):
+        frame = _grid_frame([(value,) * 3] * 9)
+        labels.append(tracker.update(frame, lambda indices: ['red' if value < 130 else 'orange']
+                                     * len(indices))[0])
+    assert labels == ['red'] * 5
+    for value in (148, 160):
+        frame = _grid_frame([(value,) * 3] * 9)
+        labels.append(tracker.update(frame, lambda indices: ['orange'] * len(indices))[0])
+    # Ties go to the most recent label
+    assert labels[-2:] == ['red', 'orange']
+
+def test_large_change_clears_the_votes():
+    tracker = CellTracker()
+    _update(tracker, [(100, 100, 100)] * 9)
+    _update(tracker, [(110, 100, 100)] * 9)
+    # A different sticker: its label replaces the history at once
+    labels, _ = _update(tracker, [(250, 250, 250)] * 9)
+    assert labels == ["c250"] * 9
+
+def test_reset_forgets_everything():
+    tracker = CellTracker()
+    colors = [(i * 20, 50, 50) for i in range(9)]
+    _update(tracker, colors)
+    tracker.reset()
+    assert tracker.signatures is None
+    _, calls = _update(tracker, colors)
+    assert calls == [list(range(9))]
+
+def _processor(tmp_path, monkeypatch, **options):
+    """A CubeProcessor whose color model knows the synthetic sticker colors"""
+    monkeypatch.chdir(tmp_path)
+    processor = CubeProcessor(**options)
+    for name, bgr in STICKER_BGR.items():
+        patch = np.full((4, 4, 3), bgr, dtype=np.uint8)
+        processor.color_trainer.add_training_samples(
+            name, list(cv2.cvtColor(patch, cv2.COLOR_BGR2HSV).reshape(-1, 3)))
+    return processor
+
+def test_detected_stickers_are_tracked(tmp_path, monkeypatch):
+    source = SyntheticSource(seed=3, fps=None, side=300, frames_per_face=5)
+    frames = [source.read()[1] for _ in range(15)]
+    tracked = _processor(tmp_path, monkeypatch, detect_cube=True, incremental=True, pooled=True)
+    plain = _processor(tmp_path, monkeypatch, detect_cube=True, pooled=True)
+    reclassified = []
+    for i, frame in enumerate(frames):
+        _, names, detected = tracked.analyze_frame(frame)
+        assert detected
+        assert names == plain.analyze_frame(frame)[1]
+        assert names == [color for row in source.faces[i // 5] for color in row]
+        reclassified.append(tracked.sticker_tracker.reclassified)
+    # Stickers are only reclassified when another face is shown
+    assert reclassified[0] == 9
+    assert not any(reclassified[1:5]) and not any(reclassified[6:10])
+    assert reclassified[5] > 0 and reclassified[10] > 0
+
+def test_sticker_votes_are_dropped_when_the_face_is_lost(tmp_path, monkeypatch):
+    processor = _processor(tmp_path, monkeypatch, detect_cube=True, incremental=True)
+    face = SyntheticSource(seed=4, fps=None, side=300).read()[1]
+    processor.analyze_frame(face)
+    assert processor.sticker_tracker.signatures is not None
+    _, _, detected = processor.analyze_frame(np.full_like(face, 90))
+    assert not detected
+    assert processor.sticker_tracker.signatures is None
+
+def test_calibration_samples_the_robust_center_color(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    processor = CubeProcessor()
+    frame = np.full((120, 160, 3), STICKER_BGR['blue'], dtype=np.uint8)
+    # Glare on a few pixels of the sampled square
+    frame[55:60, 75:80] = 255
+    processor.calibrate_color(frame, 'blue')
+    model = processor.color_trainer.color_model
+    blue = cv2.cvtColor(frame[:1, :1], cv2.COLOR_BGR2HSV)[0, 0]
+    assert model.classes_ == ['blue'] and model.counts[0] == 1
+    assert np.allclose(model.means[0], hsv_features([blue])[0])
+
+def test_calibration_drops_the_lookup_table_once(tmp_path, monkeypatch):
+    processor = _processor(tmp_path, monkeypatch)
+    processor.color_trainer.train_model(compile_lut=True)
+    processor.start_calibration('red', reset=False)
+    assert processor.color_trainer.color_lut is None
+    frame = np.full((120, 160, 3), STICKER_BGR['red'], dtype=np.uint8)
+    for _ in range(3):
+        processor.analyze_frame(frame)
+    assert processor.calibration_samples > 0
+    assert processor.stop_calibration() == ('red', processor.calibration_samples)
+    assert processor.color_trainer.color_lut is not None
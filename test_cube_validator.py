@@ -0,0 +1,103 @@
+import pytest
+import cube_model
+from cube_validator import CubeStateError, check_faces, validate_faces, validate_state
+from conftest import random_states, scrambled
+
+def _twist_corner(state, corner):
+    facelets = list(cube_model.CORNER_FACELETS[corner])
+    state[facelets] = state[facelets[1:] + facelets[:1]]
+    return facelets
+
+def _flip_edge(state, edge):
+    facelets = list(cube_model.EDGE_FACELETS[edge])
+    state[facelets] = state[facelets[::-1]]
+    return facelets
+
+def test_accepts_solvable_states():
+    validate_state(cube_model.SOLVED_STATE)
+    for _, state in random_states(20, seed=6):
+        validate_state(state)
+
+def test_rejects_twisted_corner():
+    state = cube_model.SOLVED_STATE.copy()
+    facelets = _twist_corner(state, 2)
+    with pytest.raises(CubeStateError, match="Corner twist") as error:
+        validate_state(state)
+    assert error.value.stickers == sorted(facelets)
+    state = scrambled("R U F'")
+    _twist_corner(state, 2)
+    with pytest.raises(CubeStateError, match="Corner twist"):
+        validate_state(state)
+
+def test_rejects_flipped_edge():
+    state = cube_model.SOLVED_STATE.copy()
+    facelets = _flip_edge(state, 5)
+    with pytest.raises(CubeStateError, match="Edge flip") as error:
+        validate_state(state)
+    assert error.value.stickers == sorted(facelets)
+    state = scrambled("R U F'")
+    _flip_edge(state, 5)
+    with pytest.raises(CubeStateError, match="Edge flip"):
+        validate_state(state)
+
+def test_accepts_twists_that_cancel_out():
+    state = scrambled("D L2 B")
+    _twist_corner(state, 0)
+    _twist_corner(state, 1)
+    _twist_corner(state, 1)
+    # One clockwise and one counterclockwise twist is a solvable cube
+    validate_state(state)
+
+def test_rejects_swapped_edges():
+    state = scrambled("U R2 F")
+    first, second = (list(cube_model.EDGE_FACELETS[e]) for e in (0, 3))
+    state[first + second] = state[second + first]
+    with pytest.raises(CubeStateError, match="parities differ"):
+        validate_state(state)
+
+def test_rejects_swapped_corners():
+    state = cube_model.SOLVED_STATE.copy()
+    first, second = (list(cube_model.CORNER_FACELETS[c]) for c in (0, 1))
+    state[first + second] = state[second + first]
+    with pytest.raises(CubeStateError, match="parities differ"):
+        validate_state(state)
+
+def test_rejects_impossible_pieces():
+    state = cube_model.SOLVED_STATE.copy()
+    # The F sticker of the UF edge swapped with the D sticker of the DF edge
+    front, down = cube_model.EDGE_FACELETS[1][1], cube_model.EDGE_FACELETS[5][0]
+    state[[front, down]] = state[[down, front]]
+    with pytest.raises(CubeStateError, match="Edge UF shows the opposite colors U and D"):
+        validate_state(state)
+
+def test_rejects_wrong_color_counts():
+    state = cube_model.SOLVED_STATE.copy()
+    state[0] = 1
+    with pytest.raises(CubeStateError, match="nine stickers") as error:
+        validate_state(state)
+    assert 0 in error.value.stickers
+
+def test_errors_name_the_stickers():
+    state = cube_model.SOLVED_STATE.copy()
+    _flip_edge(state, 1)
+    with pytest.raises(CubeStateError) as error:
+        validate_state(state)
+    assert str(error.value).endswith("U7 F1")
+
+def test_validate_faces_round_trip():
+    state = scrambled("L F2 D'")
+    faces = cube_model.faces_from_facelets(state)
+    assert (validate_faces(faces) == state).all()
+
+def test_check_faces_rejects_repeated_center():
+    faces = cube_model.faces_from_facelets(cube_model.SOLVED_STATE)
+    faces[1] = faces[0]
+    with pytest.raises(CubeStateError, match="both have a"):
+        check_faces(faces)
+
+def test_check_faces_rejects_unreadable_stickers():
+    faces = cube_model.faces_from_facelets(cube_model.SOLVED_STATE)
+    faces[2][0][1] = None
+    with pytest.raises(CubeStateError, match="Unreadable") as error:
+        check_faces(faces)
+    assert error.value.stickers == [19]
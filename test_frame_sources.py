@@ -0,0 +1,133 @@
+import time
+import numpy as np
+import pytest
+from frame_sources import (FrameRecorder, RecordingSource, SyntheticSource, open_source,
+                           record, render_cube_face, random_cube_faces)
+
+def _frames(count, shape=(24, 32, 3), seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+def _write(path, frames, chunk_frames=4, append=False, timestamps=None):
+    recorder = FrameRecorder(SyntheticSource(fps=None), str(path), chunk_frames, append)
+    for i, frame in enumerate(frames):
+        recorder.write(frame, None if timestamps is None else timestamps[i])
+    recorder.release()
+
+def _replayed(path, pacing='fast'):
+    source = RecordingSource(str(path), pacing)
+    frames = []
+    while True:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames.append(frame.copy())
+    timestamps = source.timestamps.copy()
+    source.release()
+    return frames, timestamps
+
+def test_record_replay_round_trip(tmp_path):
+    path = tmp_path / 'frames.cfr'
+    frames = _frames(10)
+    # Ten frames in chunks of four: the last chunk is partial
+    _write(path, frames, timestamps=[i / 30 for i in range(10)])
+    replayed, timestamps = _replayed(path)
+    assert len(replayed) == 10
+    for original, frame in zip(frames, replayed):
+        assert (original == frame).all()
+    assert np.allclose(timestamps, [i / 30 for i in range(10)])
+
+def test_grayscale_round_trip(tmp_path):
+    path = tmp_path / 'gray.cfr'
+    frames = _frames(5, shape=(20, 30))
+    _write(path, frames)
+    replayed, _ = _replayed(path)
+    assert [frame.shape for frame in replayed] == [(20, 30)] * 5
+    assert all((a == b).all() for a, b in zip(frames, replayed))
+
+def test_recorder_rejects_other_shapes(tmp_path):
+    recorder = FrameRecorder(SyntheticSource(fps=None), str(tmp_path / 'x.cfr'))
+    recorder.write(_frames(1)[0])
+    with pytest.raises(ValueError):
+        recorder.write(_frames(1, shape=(10, 10, 3))[0])
+    recorder.release()
+
+def test_recording_a_source(tmp_path):
+    path = str(tmp_path / 'synthetic.cfr')
+    assert record('synthetic', path, frames=7) == 7
+    source = open_source(path, 'fast')
+    assert len(source) == 7
+    assert source.shape == (480, 640, 3)
+    assert (np.diff(source.timestamps) >= 0).all()
+    source.release()
+
+def test_append_continues_the_recording(tmp_path):
+    path = tmp_path / 'session.cfr'
+    first, second = _frames(6, seed=1), _frames(5, seed=2)
+    _write(path, first, timestamps=[i / 30 for i in range(6)])
+    _write(path, second, append=True)
+    replayed, timestamps = _replayed(path)
+    assert len(replayed) == 11
+    assert all((a == b).all() for a, b in zip(first + second, replayed))
+    assert (np.diff(timestamps) > 0).all()
+
+def test_append_to_missing_file_starts_a_recording(tmp_path):
+    path = tmp_path / 'new.cfr'
+    _write(path, _frames(3), append=True)
+    assert len(_replayed(path)[0]) == 3
+
+def test_recorder_through_open_source_appends(tmp_path):
+    path = str(tmp_path / 'reopened.cfr')
+    for append in (False, True):
+        source = open_source('synthetic', record_to=path, append=append)
+        for _ in range(3):
+            source.read()
+        source.release()
+    assert len(_replayed(path)[0]) == 6
+
+def test_truncated_recording_replays_complete_chunks(tmp_path):
+    path = tmp_path / 'cut.cfr'
+    frames = _frames(10)
+    _write(path, frames)
+    data = path.read_bytes()
+    # Cut into the third chunk, as a crash while writing it would
+    path.write_bytes(data[:-100])
+    replayed, _ = _replayed(path)
+    assert len(replayed) == 8
+    assert all((a == b).all() for a, b in zip(frames, replayed))
+    # Appending drops the incomplete chunk
+    _write(path, _frames(2, seed=3), append=True)
+    assert len(_replayed(path)[0]) == 10
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'bogus.cfr'
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        RecordingSource(str(path))
+
+def test_realtime_pacing_follows_timestamps(tmp_path):
+    path = tmp_path / 'paced.cfr'
+    _write(path, _frames(4), timestamps=[0.0, 0.05, 0.1, 0.15])
+    source = RecordingSource(str(path), 'realtime')
+    start = time.monotonic()
+    while source.read()[0]:
+        pass
+    assert time.monotonic() - start >= 0.14
+    source.release()
+
+def test_loop_restarts_replay(tmp_path):
+    path = tmp_path / 'loop.cfr'
+    frames = _frames(3)
+    _write(path, frames)
+    source = RecordingSource(str(path), 'fast', loop=True)
+    replayed = [source.read()[1].copy() for _ in range(7)]
+    source.release()
+    assert all((replayed[i] == frames[i % 3]).all() for i in range(7))
+
+def test_synthetic_source_shows_faces_in_turn():
+    faces = random_cube_faces(seed=1)
+    frame = render_cube_face(faces[0], 120, 120, gap=0)
+    assert frame.shape == (120, 120, 3)
+    source = SyntheticSource(faces, fps=None, noise=0, frames_per_face=2)
+    first = [source.read()[1] for _ in range(3)]
+    assert (first[0] == first[1]).all() and not (first[1] == first[2]).all()
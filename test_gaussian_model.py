@@ -0,0 +1,69 @@
+import numpy as np
+from gaussian_model import GaussianColorModel, hsv_features
+
+CENTERS = {'white': (0, 20, 230), 'red': (178, 220, 180), 'blue': (110, 220, 180)}
+
+def _samples(seed=0, count=60):
+    rng = np.random.default_rng(seed)
+    hsv, labels = [], []
+    for name, center in CENTERS.items():
+        hsv.append(np.clip(rng.normal(center, 6, (count, 3)), 0, [179, 255, 255]))
+        labels += [name] * count
+    return np.concatenate(hsv), np.array(labels)
+
+def _assert_same(model, other):
+    assert model.classes_ == other.classes_
+    assert np.allclose(model.counts, other.counts)
+    assert np.allclose(model.means, other.means)
+    assert np.allclose(model.scatters, other.scatters)
+
+def test_batches_match_a_single_fit():
+    hsv, labels = _samples()
+    whole = GaussianColorModel().partial_fit(hsv, labels)
+    streamed = GaussianColorModel()
+    order = np.random.default_rng(1).permutation(len(hsv))
+    for batch in np.array_split(order, 7):
+        streamed.partial_fit(hsv[batch], labels[batch])
+    _assert_same(whole, streamed)
+    for name in CENTERS:
+        features = hsv_features(hsv[labels == name])
+        k = streamed.classes_.index(name)
+        assert np.allclose(streamed.means[k], features.mean(axis=0))
+        assert np.allclose(streamed.covariances()[k] - np.eye(3) * streamed.variance_floor,
+                           np.cov(features, rowvar=False))
+
+def test_predicts_the_training_colors():
+    hsv, labels = _samples()
+    model = GaussianColorModel().partial_fit(hsv, labels)
+    test_hsv, test_labels = _samples(seed=2, count=20)
+    assert (model.predict(test_hsv) == test_labels).all()
+
+def test_red_hue_wraps_around():
+    model = GaussianColorModel().partial_fit([(178, 220, 180), (12, 220, 230)], ['red', 'orange'])
+    # Hue 1 is next to 178 on the circle, far from it on the line
+    assert list(model.predict([(1, 220, 180), (176, 220, 180)])) == ['red', 'red']
+
+def test_forget_drops_one_color():
+    hsv, labels = _samples()
+    model = GaussianColorModel().partial_fit(hsv, labels)
+    assert model.predict([CENTERS['red']])[0] == 'red'
+    model.forget('red')
+    assert model.classes_ == ['blue', 'white']
+    assert len(model.counts) == len(model.means) == len(model.scatters) == 2
+    assert model.predict([CENTERS['red']])[0] != 'red'
+    model.forget('red')
+    # Relearning starts from the new samples only
+    model.partial_fit([(170, 200, 100)] * 3, ['red'] * 3)
+    k = model.classes_.index('red')
+    assert model.counts[k] == 3
+    assert np.allclose(model.means[k], hsv_features([(170, 200, 100)])[0])
+
+def test_save_load_round_trip(tmp_path):
+    hsv, labels = _samples()
+    model = GaussianColorModel(variance_floor=9.0).partial_fit(hsv, labels)
+    path = tmp_path / 'model.npz'
+    model.save(path)
+    loaded = GaussianColorModel.load(path)
+    assert loaded.variance_floor == 9.0
+    _assert_same(model, loaded)
+    assert (loaded.predict(hsv) == model.predict(hsv)).all()
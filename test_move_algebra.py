@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import cube_model
+import move_algebra
+from move_algebra import emit, inverse, is_canonical, parse, reduce, simplify
+
+def _same_effect(a, b):
+    return (cube_model.sequence_perm(a) == cube_model.sequence_perm(b)).all()
+
+@pytest.mark.parametrize('moves, expected', [
+    ("R R", "R2"),
+    ("R R R", "R'"),
+    ("R R'", ""),
+    ("R2 R2", ""),
+    ("R L R", "R2 L"),
+    ("L R", "R L"),
+    ("L R L'", "R"),
+    ("U R R' U'", ""),
+    ("F B F B", "F2 B2"),
+    ("D U", "U D"),
+    ("R U R' U'", "R U R' U'"),
+])
+def test_simplify(moves, expected):
+    assert simplify(moves) == expected.split()
+
+def test_parse_notation_variants():
+    assert emit(parse("RU2F’ L2'")) == "R U2 F' L2"
+    assert parse(["R", 0, "U2 F"]) == parse("R U U2 F")
+    with pytest.raises(ValueError):
+        parse("R X")
+
+def test_inverse_undoes_the_sequence():
+    moves = parse("R U2 F' L D B2")
+    assert cube_model.is_solved(cube_model.apply_moves(
+        cube_model.apply_moves(cube_model.SOLVED_STATE, moves), inverse(moves)))
+    assert reduce(moves + inverse(moves)) == []
+
+def test_reduce_is_canonical_and_keeps_the_effect():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        # Short alphabets make merges and cancellations frequent
+        faces = rng.choice(6, size=2, replace=False)
+        moves = [int(f) * 3 + int(rng.integers(3)) for f in rng.choice(faces, rng.integers(0, 12))]
+        moves += [int(m) for m in rng.integers(0, 18, rng.integers(0, 6))]
+        reduced = reduce(moves)
+        assert is_canonical(reduced)
+        assert len(reduced) <= len(moves)
+        assert _same_effect(moves, reduced)
+        assert reduce(reduced) == reduced
+
+def test_allowed_successors():
+    # After R: neither R nor L again (L R is written R L), all others
+    after_r = move_algebra.ALLOWED_AFTER[cube_model.MOVE_INDEX['R']]
+    assert len(after_r) == 15
+    after_l = move_algebra.ALLOWED_AFTER[cube_model.MOVE_INDEX['L']]
+    assert len(after_l) == 12
+    assert len(move_algebra.ALLOWED_AFTER[move_algebra.NO_MOVE]) == 18
+
+def test_canonical_sequence_counts():
+    counts = move_algebra.canonical_sequence_counts(3)
+    assert counts[:3] == [1, 18, 243]
+    assert all(is_canonical(parse(s)) for s in ("R L", "U D'", "R U R' U'"))
+    assert not is_canonical(parse("L R"))
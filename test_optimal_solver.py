@@ -0,0 +1,68 @@
+import pytest
+import cube_model
+import move_algebra
+import optimal_solver
+from color_trainer import CubeSolver
+from solution_cache import SolutionCache
+from conftest import assert_solves, random_states, scrambled
+
+SHORT_SCRAMBLES = ["R", "U2 F'", "R U R' U'", "F2 L D' B R2", "L' U2 B D F' R2 U"]
+
+@pytest.mark.parametrize('scramble', SHORT_SCRAMBLES)
+def test_finds_shortest_solutions(tables_dir, scramble):
+    state = scrambled(scramble)
+    solution = optimal_solver.OptimalSolver(workers=0).solve(state)
+    assert len(solution) == len(scramble.split())
+    assert move_algebra.is_canonical(cube_model.parse_moves(solution))
+    assert_solves(state, solution)
+
+def test_parallel_search(tables_dir):
+    state = scrambled("L' U2 B D F' R2 U")
+    solver = optimal_solver.OptimalSolver(workers=2)
+    try:
+        solution = solver.solve(state, timeout=120.0)
+    finally:
+        solver.close()
+    assert len(solution) == 7
+    assert_solves(state, solution)
+
+def test_gives_up_at_deadline(tables_dir):
+    _, state = random_states(1, seed=5)[0]
+    assert optimal_solver.OptimalSolver(workers=0).solve(state, timeout=0.5) is None
+
+def test_gives_up_past_max_depth(tables_dir):
+    state = scrambled("F2 L D' B R2")
+    assert optimal_solver.OptimalSolver(workers=0).solve(state, max_depth=4) is None
+
+def test_close_stops_the_pool(tables_dir):
+    solver = CubeSolver('optimal')
+    solver.optimal_solver = optimal_solver.OptimalSolver(workers=2)
+    state = scrambled("L' U2 B D F' R2 U")
+    assert_solves(state, solver.find_solution(state))
+    workers = list(solver.optimal_solver._pool._pool)
+    assert workers and all(worker.is_alive() for worker in workers)
+    solver.close()
+    for worker in workers:
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+
+def test_fallback_is_cached_under_two_phase(two_phase_solver):
+    cache = SolutionCache(path=None)
+    solver = CubeSolver('optimal', cache=cache)
+    solver.two_phase_solver = two_phase_solver
+    solver.optimal_solver = optimal_solver.OptimalSolver(workers=0)
+    solver.optimal_timeout = 0.2
+    _, state = random_states(1, seed=6)[0]
+    solution = solver.find_solution(state)
+    assert_solves(state, solution)
+    # The timed out optimal search leaves no entry that would pass for an optimal one
+    assert cache.get(state, 'optimal') is None
+    assert cache.get(state, 'two_phase') == solution
+
+def test_optimal_solutions_are_cached(tables_dir):
+    cache = SolutionCache(path=None)
+    solver = CubeSolver('optimal', cache=cache)
+    solver.optimal_solver = optimal_solver.OptimalSolver(workers=0)
+    state = scrambled("F2 L D' B R2")
+    solution = solver.find_solution(state)
+    assert cache.get(state, 'optimal') == solution
@@ -0,0 +1,70 @@
+import cube_model
+from solution_cache import SolutionCache, canonical_form, conjugates
+from conftest import assert_solves, random_states, scrambled
+
+def test_conjugates_are_distinct_symmetries():
+    state = scrambled("R U2 F' L D B2")
+    assert len({row.tobytes() for row in conjugates(state)}) == 48
+    assert (conjugates(cube_model.SOLVED_STATE) == cube_model.SOLVED_STATE).all()
+
+def test_canonical_form_is_shared_by_all_conjugates():
+    state = scrambled("R U2 F' L D B2")
+    key, _ = canonical_form(state)
+    for conjugate in conjugates(state):
+        assert canonical_form(conjugate)[0] == key
+
+def test_symmetric_states_hit():
+    cache = SolutionCache(path=None)
+    state = scrambled("R U2 F' L D B2")
+    cache.put(state, "B2 D' L' F U2 R'".split())
+    for conjugate in conjugates(state):
+        solution = cache.get(conjugate)
+        assert solution is not None
+        assert_solves(conjugate, solution)
+    assert cache.stats()['hits'] == 48
+
+def test_put_stores_valid_solutions(two_phase_solver):
+    cache = SolutionCache(path=None)
+    for _, state in random_states(5, seed=7):
+        cache.put(state, two_phase_solver.solve(state, timeout=0.2))
+        for conjugate in conjugates(state)[::7]:
+            assert_solves(conjugate, cache.get(conjugate))
+
+def test_miss_and_mode():
+    cache = SolutionCache(path=None)
+    state = scrambled("F2 D")
+    assert cache.get(state) is None
+    cache.put(state, ["D'", "F2"], mode='optimal')
+    assert cache.get(state, mode='two_phase') is None
+    assert cache.get(state, mode='optimal') == ["D'", "F2"]
+    assert cache.stats()['misses'] == 2
+
+def test_solutions_survive_restarts(tmp_path):
+    path = str(tmp_path / 'solutions.db')
+    state = scrambled("L B' U2")
+    cache = SolutionCache(path)
+    cache.put(state, ["U2", "B", "L'"])
+    cache.close()
+    cache = SolutionCache(path)
+    mirrored = conjugates(state)[-1]
+    assert_solves(mirrored, cache.get(mirrored))
+    assert cache.stats()['disk_hits'] == 1
+    cache.close()
+
+def test_lru_eviction():
+    cache = SolutionCache(path=None, capacity=2)
+    scrambles = ("R", "R U", "R U F")
+    for scramble in scrambles:
+        cache.put(scrambled(scramble), cube_model.MOVE_NAMES[:1])
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] == 2
+    assert cache.get(scrambled(scrambles[0])) is None
+    assert cache.get(scrambled(scrambles[2])) is not None
+
+def test_quarter_turns_share_an_entry():
+    cache = SolutionCache(path=None)
+    cache.put(scrambled("R"), ["R'"])
+    for face in cube_model.FACES:
+        state = scrambled(face)
+        assert cache.get(state) == [face + "'"]
+    assert cache.stats()['size'] == 1
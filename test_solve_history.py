@@ -0,0 +1,90 @@
+import math
+import numpy as np
+import pytest
+from solve_history import (RollingAverage, SolveHistory, SolveStats, format_time,
+                           open_database)
+
+def _reference(solves, size, trim):
+    """Trimmed mean of the last size solves, computed from scratch"""
+    if len(solves) < size:
+        return None
+    window = sorted(solves[-size:])
+    kept = window[trim:size - trim]
+    return math.inf if math.isinf(kept[-1]) else sum(kept) / len(kept)
+
+def test_ao5_drops_best_and_worst():
+    average = RollingAverage(5, 1)
+    for seconds in (12.0, 10.0, 15.0, 11.0):
+        average.add(seconds)
+        assert average.value() is None
+    average.add(20.0)
+    assert average.value() == pytest.approx((12 + 15 + 11) / 3)
+    # The 12 leaves the window
+    average.add(9.0)
+    assert average.value() == pytest.approx((10 + 15 + 11) / 3)
+
+def test_one_dnf_is_trimmed_two_make_a_dnf():
+    average = RollingAverage(5, 1)
+    for seconds in (12.0, math.inf, 15.0, 11.0, 13.0):
+        average.add(seconds)
+    assert average.value() == pytest.approx((12 + 15 + 13) / 3)
+    average.add(math.inf)
+    assert math.isinf(average.value())
+    # The first DNF leaves the window, the second is trimmed
+    average.add(14.0)
+    assert average.value() == pytest.approx((13 + 14 + 15) / 3)
+
+@pytest.mark.parametrize('size, trim', [(5, 1), (12, 1), (100, 5)])
+def test_rolling_averages_match_recomputation(size, trim):
+    rng = np.random.default_rng(size)
+    average = RollingAverage(size, trim)
+    solves = []
+    for _ in range(400):
+        # Repeated times and a DNF rate that sometimes exceeds the trim
+        seconds = math.inf if rng.random() < 0.04 else float(rng.integers(800, 1600)) / 100
+        solves.append(seconds)
+        average.add(seconds)
+        expected = _reference(solves, size, trim)
+        if expected is None or math.isinf(expected):
+            assert average.value() == expected
+        else:
+            assert average.value() == pytest.approx(expected)
+
+def test_bests_skip_dnfs():
+    stats = SolveStats()
+    assert stats.add(None) == []
+    assert stats.bests['single'] is None
+    assert stats.add(14.0) == ['single']
+    assert stats.add(15.0) == []
+    for seconds in (13.0, 16.0):
+        stats.add(seconds)
+    # The first ao5 contains one DNF, which is trimmed
+    assert stats.add(12.5) == ['single', 'ao5']
+    assert stats.bests['ao5'] == pytest.approx((14 + 15 + 13) / 3)
+    assert stats.count == 6
+    assert stats.mean() == pytest.approx((14 + 15 + 13 + 16 + 12.5) / 5)
+
+def test_format_time():
+    assert format_time(None) == '-'
+    assert format_time(math.inf) == 'DNF'
+    assert format_time(9.5) == '0:09.50'
+    assert format_time(83.456) == '1:23.46'
+
+def test_history_is_batched_and_reloaded(tmp_path):
+    connection = open_database(str(tmp_path / 'history.db'))
+    history = SolveHistory(connection, batch_size=3, flush_interval=3600)
+    history.load_user('ana')
+    for seconds in (12.0, None):
+        history.record(seconds)
+    count = 'SELECT COUNT(*) FROM solves'
+    assert connection.execute(count).fetchone()[0] == 0
+    history.record(11.0, "R U")
+    assert connection.execute(count).fetchone()[0] == 3
+    history.record(13.0)
+    history.load_user('ben')
+    assert connection.execute(count).fetchone()[0] == 4
+    assert history.stats.count == 0
+    stats = history.load_user('ana')
+    assert stats.count == 4 and stats.bests['single'] == 11.0
+    assert math.isinf(stats.averages['ao5'].window[1])
+    connection.close()
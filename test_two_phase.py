@@ -0,0 +1,55 @@
+import pytest
+import cube_model
+import table_store
+import two_phase
+from conftest import assert_solves, random_states, scrambled
+
+def test_solves_random_scrambles(two_phase_solver):
+    for _, state in random_states(10, seed=1):
+        solution = two_phase_solver.solve(state, timeout=1.0)
+        assert len(solution) <= 22
+        assert_solves(state, solution)
+
+def test_stops_at_target_length(two_phase_solver):
+    state = scrambled("R U F' L2 D B'")
+    solution = two_phase_solver.solve(state, target_length=6, timeout=10.0)
+    assert len(solution) <= 6
+    assert_solves(state, solution)
+
+def test_reports_every_improvement(two_phase_solver):
+    _, state = random_states(1, seed=2)[0]
+    found = []
+    solution = two_phase_solver.solve(state, target_length=0, timeout=0.5,
+                                      on_solution=found.append)
+    assert found and found[-1] == solution
+    assert [len(moves) for moves in found] == sorted((len(moves) for moves in found), reverse=True)
+    for moves in found:
+        assert_solves(state, moves)
+
+def test_cancelled_before_a_solution(two_phase_solver):
+    class Cancelled:
+        def is_set(self):
+            return True
+    _, state = random_states(1, seed=3)[0]
+    assert two_phase_solver.solve(state, cancel=Cancelled()) is None
+
+def test_solved_and_phase_2_states(two_phase_solver):
+    assert two_phase_solver.solve(cube_model.SOLVED_STATE) == []
+    # Already in the subgroup <U, D, R2, L2, F2, B2>: phase 1 has nothing to do
+    state = scrambled("U R2 D' F2 L2 U2 B2")
+    assert_solves(state, two_phase_solver.solve(state))
+
+def test_rejects_impossible_states(two_phase_solver):
+    state = cube_model.SOLVED_STATE.copy()
+    # Flip the UF edge
+    facelets = list(cube_model.EDGE_FACELETS[1])
+    state[facelets] = state[facelets[::-1]]
+    with pytest.raises(ValueError):
+        two_phase_solver.solve(state)
+
+def test_tables_are_memory_mapped(tables_dir, two_phase_solver):
+    tables = table_store.open_tables(two_phase.TABLES_PATH, two_phase.TABLES_VERSION)
+    assert set(tables) == set(two_phase_solver.tables)
+    assert tables['twist_move'].shape == (two_phase.N_TWIST, two_phase.N_MOVES)
+    # Another version of the tables is not picked up
+    assert table_store.open_tables(two_phase.TABLES_PATH, two_phase.TABLES_VERSION + 1) is None
@@ -0,0 +1,318 @@
+import math
+import time
+import numpy as np
+import cube_model
+import move_algebra
+import table_store
+
+# Two-phase (Kociemba-style) solver
+#
+# Phase 1 brings the cube into the subgroup H = <U, D, R2, L2, F2, B2>
+# (all orientations solved, the four middle-slice edges in the middle
+# slice); phase 2 solves the cube using only moves from H. Both phases run
+# IDA* over small integer coordinates using precomputed move tables, with
+# pruning tables giving exact distances of coordinate pairs as heuristic.
+#
+# The tables take a few seconds to generate, so they are written once to a
+# versioned binary file and memory-mapped on every later start.
+
+TABLES_VERSION = 1
+TABLES_PATH = f'twophase_tables_v{TABLES_VERSION}.bin'
+
+N_MOVES = 18
+N_TWIST = 2187          # 3^7 corner orientations
+N_FLIP = 2048           # 2^11 edge orientations
+N_SLICE = 495           # 12 choose 4 positions of the slice edges
+N_SLICE_SORTED = 11880  # Positions and order of the slice edges
+N_SLICE_PERM = 24       # Order of the slice edges once they are in the slice
+N_CORNERS = 40320       # 8! corner permutations
+N_UD_EDGES = 40320      # 8! permutations of the U and D layer edges
+
+PHASE2_MOVES = [cube_model.MOVE_INDEX[name] for name in
+                ('U', 'U2', "U'", 'R2', 'F2', 'D', 'D2', "D'", 'L2', 'B2')]
+
+# Only canonical move sequences are searched (see move_algebra)
+ALLOWED_AFTER = move_algebra.ALLOWED_AFTER
+ALLOWED_AFTER_PHASE2 = [[m for m in moves if m in PHASE2_MOVES] for moves in ALLOWED_AFTER]
+
+# Coordinates
+#
+# Every function takes arrays with one cube per row and returns one integer
+# coordinate per row. The solved cube has coordinate 0 everywhere.
+
+_POWERS_OF_3 = 3 ** np.arange(6, -1, -1)
+_POWERS_OF_2 = 2 ** np.arange(10, -1, -1)
+_BINOMIAL = np.array([[math.comb(n, k) for k in range(6)] for n in range(12)])
+
+def _lehmer(perm):
+    """Rank permutations (one per row) by their Lehmer code"""
+    perm = np.atleast_2d(perm)
+    n = perm.shape[1]
+    index = np.zeros(len(perm), dtype=np.int64)
+    for i in range(n - 1):
+        smaller = (perm[:, i + 1:] < perm[:, i:i + 1]).sum(axis=1)
+        index = index * (n - i) + smaller
+    return index
+
+def twist_coord(co):
+    return np.atleast_2d(co)[:, :7] @ _POWERS_OF_3
+
+def flip_coord(eo):
+    return np.atleast_2d(eo)[:, :11] @ _POWERS_OF_2
+
+def slice_sorted_coord(ep):
+    """Positions of the FR, FL, BL, BR edges combined with their order"""
+    ep = np.atleast_2d(ep)
+    is_slice = ep >= 8
+    # Number of slice edges to the right of every position
+    after = np.cumsum(is_slice[:, ::-1], axis=1)[:, ::-1] - is_slice
+    positions = (is_slice * _BINOMIAL[11 - np.arange(12), after + 1]).sum(axis=1)
+    order = _lehmer(ep[is_slice].reshape(-1, 4))
+    return positions * N_SLICE_PERM + order
+
+def corners_coord(cp):
+    return _lehmer(cp)
+
+def ud_edges_coord(ep):
+    """Permutation of the eight U and D layer edges, only meaningful in H"""
+    return _lehmer(np.atleast_2d(ep)[:, :8])
+
+# Table generation
+
+def _move_table(size, encode, perm, ori, modulus, part, moves=range(N_MOVES)):
+    """Coordinate move table, by breadth-first search from the solved cube
+
+    The search keeps one cubie representative per coordinate value and
+    expands a whole layer at once with batched gathers.
+    """
+    table = np.zeros((size, N_MOVES), dtype=np.uint16)
+    seen = np.zeros(size, dtype=bool)
+    perm, ori = perm[np.newaxis], ori[np.newaxis]
+    coords = encode(perm, ori)
+    seen[coords] = True
+    while len(perm):
+        next_perm, next_ori = [], []
+        for m in moves:
+            move_perm, move_ori = cube_model.MOVE_CUBIES[m][part:part + 2]
+            new_perm = perm[:, move_perm]
+            new_ori = (ori[:, move_perm] + move_ori) % modulus
+            new_coords = encode(new_perm, new_ori)
+            table[coords, m] = new_coords
+            new_coords, first = np.unique(new_coords, return_index=True)
+            fresh = ~seen[new_coords]
+            seen[new_coords[fresh]] = True
+            next_perm.append(new_perm[first[fresh]])
+            next_ori.append(new_ori[first[fresh]])
+        perm, ori = np.concatenate(next_perm), np.concatenate(next_ori)
+        coords = encode(perm, ori)
+    assert seen.all(), "coordinate space not fully reached"
+    return table
+
+def _pruning_table(move_a, move_b, moves):
+    """Exact move distance to (0, 0) for every pair of two coordinates"""
+    size_b = move_b.shape[0]
+    move_a = move_a[:, moves].astype(np.int64)
+    move_b = move_b[:, moves].astype(np.int64)
+    distance = np.full(move_a.shape[0] * size_b, 255, dtype=np.uint8)
+    distance[0] = 0
+    frontier = np.zeros(1, dtype=np.int64)
+    depth = 0
+    while len(frontier):
+        a, b = np.divmod(frontier, size_b)
+        successors = (move_a[a] * size_b + move_b[b]).ravel()
+        successors = np.unique(successors[distance[successors] == 255])
+        depth += 1
+        distance[successors] = depth
+        frontier = successors
+    return distance
+
+def build_tables():
+    """Generate all move and pruning tables"""
+    cp, co, ep, eo = (np.array(part) for part in cube_model.to_cubies(cube_model.SOLVED_STATE))
+    corners, edges = 0, 2
+    twist_move = _move_table(N_TWIST, lambda p, o: twist_coord(o), cp, co, 3, corners)
+    flip_move = _move_table(N_FLIP, lambda p, o: flip_coord(o), ep, eo, 2, edges)
+    slice_sorted_move = _move_table(N_SLICE_SORTED, lambda p, o: slice_sorted_coord(p),
+                                    ep, eo, 2, edges)
+    corners_move = _move_table(N_CORNERS, lambda p, o: corners_coord(p), cp, co, 3, corners)
+    ud_edges_move = _move_table(N_UD_EDGES, lambda p, o: ud_edges_coord(p), ep, eo, 2, edges,
+                                moves=PHASE2_MOVES)
+
+    slice_move = slice_sorted_move[::N_SLICE_PERM] // N_SLICE_PERM
+    slice_perm_move = slice_sorted_move[:N_SLICE_PERM]
+    all_moves = list(range(N_MOVES))
+    return {
+        'twist_move': twist_move,
+        'flip_move': flip_move,
+        'slice_sorted_move': slice_sorted_move,
+        'corners_move': corners_move,
+        'ud_edges_move': ud_edges_move,
+        'slice_twist_prune': _pruning_table(slice_move, twist_move, all_moves),
+        'slice_flip_prune': _pruning_table(slice_move, flip_move, all_moves),
+        'corners_slice_prune': _pruning_table(corners_move, slice_perm_move, PHASE2_MOVES),
+        'ud_edges_slice_prune': _pruning_table(ud_edges_move, slice_perm_move, PHASE2_MOVES),
+    }
+
+def load_tables(path=TABLES_PATH):
+    """Memory-map the solver tables, generating and saving them on first use"""
+    tables = table_store.open_tables(path, TABLES_VERSION)
+    if tables is None:
+        tables = build_tables()
+        try:
+            table_store.write_tables(path, tables, TABLES_VERSION)
+        except OSError:
+            return tables
+        tables = table_store.open_tables(path, TABLES_VERSION) or tables
+    return tables
+
+def check_solvable(cubies):
+    """Raise ValueError unless (cp, co, ep, eo) describes a reachable cube"""
+    cp, co, ep, eo = cubies
+    if sorted(cp) != list(range(8)):
+        raise ValueError("Cube state has duplicate corners")
+    if sorted(ep) != list(range(12)):
+        raise ValueError("Cube state has duplicate edges")
+    if sum(co) % 3:
+        raise ValueError("Cube state has a twisted corner")
+    if sum(eo) % 2:
+        raise ValueError("Cube state has a flipped edge")
+    if cube_model.permutation_parity(cp) != cube_model.permutation_parity(ep):
+        raise ValueError("Cube state has a corner or edge swap parity error")
+
+class TwoPhaseSolver:
+    def __init__(self, tables_path=TABLES_PATH):
+        self.tables = load_tables(tables_path)
+        # Flat memoryviews give fast scalar indexing straight into the mmap
+        flat = {name: memoryview(np.ascontiguousarray(table).reshape(-1))
+                for name, table in self.tables.items()}
+        self._twist_move = flat['twist_move']
+        self._flip_move = flat['flip_move']
+        self._slice_sorted_move = flat['slice_sorted_move']
+        self._corners_move = flat['corners_move']
+        self._ud_edges_move = flat['ud_edges_move']
+        self._slice_twist_prune = flat['slice_twist_prune']
+        self._slice_flip_prune = flat['slice_flip_prune']
+        self._corners_slice_prune = flat['corners_slice_prune']
+        self._ud_edges_slice_prune = flat['ud_edges_slice_prune']
+        self.nodes = 0
+
+    def solve(self, state, max_length=22, target_length=None, timeout=1.0,
+              on_solution=None, cancel=None):
+        """Solve a facelet state, returning a list of move names
+
+        Only solutions of at most max_length moves are searched for (the
+        bound is relaxed if none exists). The search returns as soon as it
+        finds a solution of at most target_length moves, which defaults to
+        max_length; otherwise it keeps shortening the best solution until
+        timeout seconds have passed. on_solution, if given, is called with
+        every improved solution as it is found. cancel, if given, is an
+        object like a threading.Event whose is_set() ends the search early
+        with the best solution so far, or None if there is none yet. Raises
+        ValueError for states that cannot be solved.
+        """
+        cubies = cube_model.to_cubies(state)
+        check_solvable(cubies)
+        cp, co, ep, eo = cubies
+        twist = int(twist_coord(co)[0])
+        flip = int(flip_coord(eo)[0])
+        slice_sorted = int(slice_sorted_coord(ep)[0])
+
+        self._corners = int(corners_coord(cp)[0])
+        self._ep = ep
+        self._path = []
+        self._best = None
+        self._target_length = max_length if target_length is None else target_length
+        self._deadline = time.monotonic() + timeout
+        self._on_solution = on_solution
+        self._cancel = cancel
+        self._done = False
+        self.nodes = 0
+
+        slice_coord = slice_sorted // N_SLICE_PERM
+        distance = max(self._slice_twist_prune[slice_coord * N_TWIST + twist],
+                       self._slice_flip_prune[slice_coord * N_FLIP + flip])
+        while self._best is None and not self._done:
+            self._max_length = max_length
+            # Longer phase 1 solutions give phase 2 different starting points
+            for togo in range(distance, max_length + 1):
+                if self._best is not None and togo >= len(self._best):
+                    break
+                self._phase1(twist, flip, slice_sorted, distance, togo)
+                if self._done:
+                    break
+            max_length += 2
+        if self._best is None:
+            return None
+        return [cube_model.MOVE_NAMES[m] for m in self._best]
+
+    def _phase1(self, twist, flip, slice_sorted, distance, togo):
+        if togo == 0:
+            self._start_phase2(slice_sorted)
+            return
+        last = self._path[-1] if self._path else N_MOVES
+        for m in ALLOWED_AFTER[last]:
+            # Inside H with few moves left, phase 2 moves are left to phase 2
+            if distance == 0 and togo < 5 and m in PHASE2_MOVES:
+                continue
+            new_twist = self._twist_move[N_MOVES * twist + m]
+            new_flip = self._flip_move[N_MOVES * flip + m]
+            new_slice_sorted = self._slice_sorted_move[N_MOVES * slice_sorted + m]
+            slice_coord = new_slice_sorted // N_SLICE_PERM
+            new_distance = max(self._slice_twist_prune[slice_coord * N_TWIST + new_twist],
+                               self._slice_flip_prune[slice_coord * N_FLIP + new_flip])
+            if new_distance >= togo:
+                continue
+            self.nodes += 1
+            self._path.append(m)
+            self._phase1(new_twist, new_flip, new_slice_sorted, new_distance, togo - 1)
+            self._path.pop()
+            if self._done:
+                return
+
+    def _start_phase2(self, slice_sorted):
+        if ((self._best is not None and time.monotonic() > self._deadline)
+                or (self._cancel is not None and self._cancel.is_set())):
+            self._done = True
+            return
+        phase1_length = len(self._path)
+        # Phase 2 starting coordinates follow from the phase 1 maneuver
+        corners = self._corners
+        ep = self._ep
+        for m in self._path:
+            corners = self._corners_move[N_MOVES * corners + m]
+            move_ep = cube_model.MOVE_CUBIES[m][2]
+            ep = [ep[i] for i in move_ep]
+        ud_edges = int(ud_edges_coord(ep)[0])
+
+        distance = max(self._corners_slice_prune[corners * N_SLICE_PERM + slice_sorted],
+                       self._ud_edges_slice_prune[ud_edges * N_SLICE_PERM + slice_sorted])
+        limit = len(self._best) - 1 if self._best is not None else self._max_length
+        for togo in range(distance, limit - phase1_length + 1):
+            if self._phase2(corners, ud_edges, slice_sorted, togo):
+                self._best = list(self._path)
+                del self._path[phase1_length:]
+                if self._on_solution is not None:
+                    self._on_solution([cube_model.MOVE_NAMES[m] for m in self._best])
+                if len(self._best) <= self._target_length:
+                    self._done = True
+                break
+
+    def _phase2(self, corners, ud_edges, slice_sorted, togo):
+        if togo == 0:
+            return True
+        last = self._path[-1] if self._path else N_MOVES
+        for m in ALLOWED_AFTER_PHASE2[last]:
+            new_corners = self._corners_move[N_MOVES * corners + m]
+            new_ud_edges = self._ud_edges_move[N_MOVES * ud_edges + m]
+            new_slice_sorted = self._slice_sorted_move[N_MOVES * slice_sorted + m]
+            distance = max(
+                self._corners_slice_prune[new_corners * N_SLICE_PERM + new_slice_sorted],
+                self._ud_edges_slice_prune[new_ud_edges * N_SLICE_PERM + new_slice_sorted])
+            if distance >= togo:
+                continue
+            self.nodes += 1
+            self._path.append(m)
+            if self._phase2(new_corners, new_ud_edges, new_slice_sorted, togo - 1):
+                return True
+            self._path.pop()
+        return False